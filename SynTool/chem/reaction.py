@@ -1,7 +1,8 @@
 """Module containing classes and functions for manipulating reactions and
 reaction rules."""
 
-from typing import Any, Iterator, List, Optional
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Tuple
 
 from CGRtools.containers import MoleculeContainer, ReactionContainer
 from CGRtools.exceptions import InvalidAromaticRing
@@ -110,3 +111,100 @@ def apply_reaction_rule(
                 except InvalidAromaticRing:
                     yield None
         yield reactants
+
+
+class ReactionRuleCache:
+    """Bounded LRU cache of the validated products of reaction rules
+    application keyed by the canonical SMILES of the molecule and the reaction
+    rule id. The products are cached lazily: the application of the reaction
+    rule is continued only when the products not yet cached are requested,
+    so the reaction rule is never applied further than in the search without
+    the cache."""
+
+    def __init__(self, max_size: int = 10000):
+        """Initializes the reaction rules application cache.
+
+        :param max_size: The maximum number of cached (molecule,
+            reaction rule) pairs. The least recently used pairs are
+            removed first.
+        """
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # the products obtained so far and the unfinished application (or None)
+        self._cache: OrderedDict[Tuple[str, int], List[Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns the number of cached (molecule, reaction rule) pairs."""
+        return len(self._cache)
+
+    @property
+    def hit_rate(self) -> float:
+        """Returns the fraction of reaction rules applications taken from the
+        cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def apply(
+        self,
+        molecule: MoleculeContainer,
+        reaction_rule: Reactor,
+        rule_id: int,
+        molecule_key: str = None,
+    ) -> Iterator[Optional[Tuple[MoleculeContainer, ...]]]:
+        """Applies a reaction rule to a given molecule or takes the products
+        of the previous application of this reaction rule from the cache.
+
+        :param molecule: A molecule to which reaction rule will be applied.
+        :param reaction_rule: A reaction rule to be applied.
+        :param rule_id: The id of the reaction rule.
+        :param molecule_key: The canonical SMILES of the molecule. If
+            None, it is calculated from the molecule.
+        :return: An iterator yielding the products of reaction rule
+            application (as given by apply_reaction_rule). The product
+            molecules are shared with the cache and must not be modified
+            (they are copied when the retrons are created from them).
+        """
+
+        key = (molecule_key if molecule_key is not None else str(molecule), rule_id)
+        try:
+            entry = self._cache[key]
+            self._cache.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            entry = [[], apply_reaction_rule(molecule, reaction_rule)]
+            self._cache[key] = entry
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+            self.misses += 1
+
+        return self._iter_products(entry)
+
+    @staticmethod
+    def _iter_products(
+        entry: List[Any],
+    ) -> Iterator[Optional[Tuple[MoleculeContainer, ...]]]:
+        """Yields the cached products of the reaction rule application, and
+        then continues the application, caching the new products.
+
+        :param entry: The cached products and the unfinished application
+            of the reaction rule (None if it is finished).
+        :return: An iterator yielding the products.
+        """
+
+        all_products = entry[0]
+        i = 0
+        while True:
+            if i == len(all_products):
+                if entry[1] is None:
+                    return
+                try:
+                    products = next(entry[1])
+                except StopIteration:
+                    entry[1] = None
+                    return
+                all_products.append(tuple(products) if products is not None else None)
+
+            yield all_products[i]
+            i += 1
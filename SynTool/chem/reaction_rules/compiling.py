@@ -0,0 +1,198 @@
+"""Module containing functions for compiling the extracted reaction rules into
+the planning bundle and a class for the lazy loading of the compiled reaction
+rules."""
+
+import pickle
+from collections import Counter
+from collections.abc import Sequence
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from CGRtools.containers import MoleculeContainer, ReactionContainer
+from CGRtools.reactor.reactor import Reactor
+
+BUNDLE_FORMAT = "syntool_reaction_rules"
+BUNDLE_VERSION = 2
+
+RuleRequirements = Tuple[Tuple[Hashable, int], ...]
+
+
+def reaction_rule_requirements(reaction_rule: ReactionContainer) -> RuleRequirements:
+    """Calculates the features which the molecule must have for the reaction
+    rule to be matched to it. The features are the number of atoms of each
+    element with each charge (the key is the tuple of the atomic symbol and the
+    charge), the number of ring atoms of each element (the key is the tuple of
+    the atomic symbol and "ring") and the number of bonds of each order (the key
+    is the bond order). Only the query atoms and bonds with a single possible
+    value are counted, so the requirements are necessary, but not sufficient.
+
+    :param reaction_rule: The reaction rule.
+    :return: The tuple of the pairs of the feature and its minimal
+        number.
+    """
+
+    requirements = Counter()
+    for query in reaction_rule.reactants:
+        for _, atom in query.atoms():
+            if not atom.atomic_number:  # any element
+                continue
+            requirements[(atom.atomic_symbol, atom.charge)] += 1
+            if atom.ring_sizes and atom.ring_sizes[0]:  # ring atom expected
+                requirements[(atom.atomic_symbol, "ring")] += 1
+
+        for _, _, bond in query.bonds():
+            if len(bond.order) == 1:
+                requirements[bond.order[0]] += 1
+
+    return tuple(requirements.items())
+
+
+def molecule_features(molecule: MoleculeContainer) -> Dict[Hashable, int]:
+    """Calculates the features of the molecule compared with the reaction rule
+    requirements (see reaction_rule_requirements).
+
+    :param molecule: The molecule.
+    :return: The dictionary of the features and their numbers.
+    """
+
+    features = Counter()
+    for _, atom in molecule.atoms():
+        features[(atom.atomic_symbol, atom.charge)] += 1
+        if atom.ring_sizes:
+            features[(atom.atomic_symbol, "ring")] += 1
+
+    for _, _, bond in molecule.bonds():
+        features[bond.order] += 1
+
+    return features
+
+
+def satisfies_requirements(
+    features: Dict[Hashable, int], requirements: RuleRequirements
+) -> bool:
+    """Checks if the molecule features satisfy the reaction rule requirements.
+    If not, the reaction rule can not be applied to the molecule.
+
+    :param features: The molecule features.
+    :param requirements: The reaction rule requirements.
+    :return: True if the reaction rule can be applied to the molecule.
+    """
+
+    for feature, number in requirements:
+        if features.get(feature, 0) < number:
+            return False
+    return True
+
+
+class CompiledReactionRules(Sequence):
+    """The list of reaction rules loaded from the planning bundle. The reaction
+    rules are stored pickled and the Reactor of the reaction rule is built the
+    first time the reaction rule is requested."""
+
+    def __init__(self, bundle: dict) -> None:
+        """Initializes the list of reaction rules from the loaded bundle.
+
+        :param bundle: The planning bundle created with
+            compile_reaction_rules.
+        """
+
+        self._bundle = bundle
+        self._rules: List[bytes] = bundle["rules"]
+        self._reactors: List[Optional[Reactor]] = [None] * len(self._rules)
+
+        self.ids: List[int] = bundle["ids"]
+        self.popularity: List[int] = bundle["popularity"]
+        self.requirements: Optional[List[RuleRequirements]] = bundle.get("requirements")
+
+    def __reduce__(self):
+        """Pickles only the bundle, so that the built reactors are not copied
+        between the processes."""
+        return self.__class__, (self._bundle,)
+
+    def __len__(self) -> int:
+        """Returns the number of reaction rules."""
+        return len(self._rules)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Reactor, List[Reactor]]:
+        """Returns the Reactor of the reaction rule with the given index,
+        building it if it was not requested before.
+
+        :param index: The index (or slice) of the reaction rules.
+        :return: The Reactor (or the list of Reactors) of the reaction
+            rules.
+        """
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        reactor = self._reactors[index]
+        if reactor is None:
+            reactor = self._reactors[index] = Reactor(pickle.loads(self._rules[index]))
+        return reactor
+
+    def reaction_rule(self, index: int) -> ReactionContainer:
+        """Returns the reaction rule (query reaction) with the given index.
+
+        :param index: The index of the reaction rule.
+        :return: The reaction rule.
+        """
+        return pickle.loads(self._rules[index])
+
+
+def is_compiled_reaction_rules(reaction_rules: object) -> bool:
+    """Checks if the unpickled reaction rules are the planning bundle.
+
+    :param reaction_rules: The unpickled reaction rules.
+    :return: True if the reaction rules are the planning bundle.
+    """
+    return (
+        isinstance(reaction_rules, dict)
+        and reaction_rules.get("format") == BUNDLE_FORMAT
+    )
+
+
+def compile_reaction_rules(input_file: str, output_file: str) -> str:
+    """Compiles the extracted reaction rules into the planning bundle, which
+    keeps only the reaction rules, their ids (positions in the extracted
+    reaction rules file), popularity (the number of reactions from which
+    they were extracted) and requirements (the molecule features needed
+    for the reaction rule to be matched). The reaction rules are pickled
+    separately, so they are unpickled only when used in planning.
+
+    :param input_file: The path to the file with the extracted reaction
+        rules.
+    :param output_file: The path to the file where the planning bundle
+        will be stored.
+    :return: The path to the file with the planning bundle.
+    """
+
+    if input_file == output_file:
+        raise ValueError("input_file name and output_file name cannot be the same.")
+
+    with open(input_file, "rb") as f:
+        reaction_rules = pickle.load(f)
+
+    if is_compiled_reaction_rules(reaction_rules):
+        raise ValueError(f"Reaction rules in {input_file} are already compiled.")
+
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "rules": [],
+        "ids": [],
+        "popularity": [],
+        "requirements": [],
+    }
+    for rule_id, (rule, reactions_ids) in enumerate(reaction_rules):
+        if isinstance(rule, Reactor):
+            raise TypeError(
+                "Reaction rules must be stored as ReactionContainer to be compiled."
+            )
+        bundle["rules"].append(pickle.dumps(rule, protocol=pickle.HIGHEST_PROTOCOL))
+        bundle["ids"].append(rule_id)
+        bundle["popularity"].append(len(reactions_ids))
+        bundle["requirements"].append(reaction_rule_requirements(rule))
+
+    with open(output_file, "wb") as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return output_file
@@ -1,25 +1,167 @@
 """Module containing a class Retron that represents a retron (extend molecule
 object) in the search tree."""
 
-from typing import Set
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Set, Tuple, Union
 
 from CGRtools.containers import MoleculeContainer
 
 from SynTool.chem.utils import safe_canonicalization
+from SynTool.utils.building_blocks import BuildingBlocksIndex
+
+
+class RetronTable:
+    """Bounded LRU intern table of the canonical molecules of the retrons. The
+    retrons created with the table share the canonical molecule (and its
+    SMILES) with the identical retrons created before, so each molecule is
+    canonicalized only once. The molecules are looked up by their SMILES
+    before the canonicalization, so the already canonical molecules are
+    not copied."""
+
+    def __init__(self, max_size: int = 100000):
+        """Initializes the intern table.
+
+        :param max_size: The maximum number of stored molecules. The
+            least recently used molecules are removed first.
+        """
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._molecules: OrderedDict[str, Tuple[MoleculeContainer, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns the number of stored SMILES (both the canonical ones and the
+        ones before the canonicalization)."""
+        return len(self._molecules)
+
+    def canonicalize(
+        self, molecule: MoleculeContainer
+    ) -> Tuple[MoleculeContainer, str]:
+        """Returns the canonical molecule identical to the given one and its
+        SMILES, canonicalizing the molecule if it was not seen before.
+
+        :param molecule: The molecule.
+        :return: The canonical molecule and its SMILES.
+        """
+
+        key = str(molecule)
+        try:
+            record = self._molecules[key]
+            self._molecules.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            canonical = safe_canonicalization(molecule)
+            record = (canonical, str(canonical))
+            self._molecules[key] = record
+            self._molecules.setdefault(record[1], record)
+            while len(self._molecules) > self.max_size:
+                self._molecules.popitem(last=False)
+            self.misses += 1
+
+        return record
+
+
+class RetronChain:
+    """Immutable linked list of the retrons from which the retron was obtained
+    (starting from the retron itself up to the target). The chains of the
+    sibling retrons share their common part, so the chain is extended in
+    O(1) time and memory.
+
+    Each link keeps the 64-bit Bloom mask of the hashes of all the
+    retrons in the chain, so checking that the retron is not in the
+    chain usually takes O(1) time, and the chain is traversed only if
+    the bit of the retron is set in the mask.
+    """
+
+    __slots__ = ("retron", "parent", "length", "mask")
+
+    def __init__(self, retron: "Retron", parent: Optional["RetronChain"] = None):
+        """Extends the chain with the retron.
+
+        :param retron: The retron added at the head of the chain.
+        :param parent: The chain of the retron from which the retron was
+            obtained (None for the target).
+        """
+
+        self.retron = retron
+        self.parent = parent
+        self.length = 1 if parent is None else parent.length + 1
+        self.mask = 1 << (hash(retron) & 63)
+        if parent is not None:
+            self.mask |= parent.mask
+
+    def __len__(self) -> int:
+        """Returns the number of retrons in the chain."""
+        return self.length
+
+    def __iter__(self) -> Iterator["Retron"]:
+        """Iterates over the retrons in the chain starting from its head."""
+
+        link = self
+        while link is not None:
+            yield link.retron
+            link = link.parent
+
+    def __contains__(self, retron: "Retron") -> bool:
+        """Checks if the retron is in the chain.
+
+        :param retron: The retron.
+        :return: True if the retron is in the chain.
+        """
+
+        if not self.mask >> (hash(retron) & 63) & 1:
+            return False
+        return any(retron == x for x in self)
+
+    def isdisjoint(self, retrons: Iterable["Retron"]) -> bool:
+        """Checks if none of the retrons is in the chain.
+
+        :param retrons: The retrons.
+        :return: True if none of the retrons is in the chain.
+        """
+        return not any(retron in self for retron in retrons)
 
 
 class Retron:
     """Retron class is used to extend the molecule behavior needed for
-    interaction with a tree in MCTS."""
+    interaction with a tree in MCTS.
 
-    def __init__(self, molecule: MoleculeContainer, canonicalize: bool = True):
+    The canonical SMILES and the hash of the molecule are calculated
+    once, and the retrons are compared by them.
+    """
+
+    __slots__ = ("molecule", "prev_retrons", "_smiles", "_hash")
+
+    def __init__(
+        self,
+        molecule: MoleculeContainer,
+        canonicalize: bool = True,
+        table: RetronTable = None,
+    ):
         """It initializes a Retron object with a molecule container as a
         parameter.
 
         :param molecule: A molecule.
+        :param canonicalize: Whether the molecule is canonicalized. If
+            False, the molecule must be already canonical.
+        :param table: The intern table of the canonical molecules
+            (optional). If given, the canonical molecule is taken from
+            it.
         """
-        self.molecule = safe_canonicalization(molecule) if canonicalize else molecule
-        self.prev_retrons = []
+
+        if not canonicalize:
+            smiles = str(molecule)
+        elif table is not None:
+            molecule, smiles = table.canonicalize(molecule)
+        else:
+            molecule = safe_canonicalization(molecule)
+            smiles = str(molecule)
+
+        self.molecule = molecule
+        self.prev_retrons: Optional[RetronChain] = None
+        self._smiles = smiles
+        self._hash = hash(smiles)
 
     def __len__(self) -> int:
         """Return the number of atoms in Retron."""
@@ -27,25 +169,30 @@ class Retron:
 
     def __hash__(self) -> hash:
         """Returns the hash value of Retron."""
-        return hash(self.molecule)
+        return self._hash
 
     def __str__(self) -> str:
         """Returns a SMILES of the Retron."""
-        return str(self.molecule)
+        return self._smiles
 
     def __eq__(self, other: "Retron") -> bool:
         """Checks if the current Retron is equal to another Retron."""
-        return self.molecule == other.molecule
+        if not isinstance(other, Retron):
+            return NotImplemented
+        return self._hash == other._hash and self._smiles == other._smiles
 
     def __repr__(self) -> str:
         """Returns a SMILES of the Retron."""
-        return str(self.molecule)
+        return self._smiles
 
-    def is_building_block(self, bb_stock: Set, min_mol_size: int = 6) -> bool:
+    def is_building_block(
+        self, bb_stock: Union[Set, BuildingBlocksIndex], min_mol_size: int = 6
+    ) -> bool:
         """Checks if a Retron is a building block.
 
-        :param bb_stock: The list of building blocks. Each building
-            block is represented by a canonical SMILES.
+        :param bb_stock: The set of building blocks or the building
+            blocks index. Each building block is represented by a
+            canonical SMILES.
         :param min_mol_size: If the size of the Retron is equal or
             smaller than min_mol_size it is automatically classified as
             building block.
@@ -54,7 +201,48 @@ class Retron:
         if len(self.molecule) <= min_mol_size:
             return True
 
-        return str(self.molecule) in bb_stock
+        return self._smiles in bb_stock
+
+
+def composed_retrons(
+    retrons: list, exclude_small: bool = True, min_mol_size: int = 6
+) -> list:
+    """Returns the retrons composed into a single molecule by compose_retrons
+    (the small retrons are excluded from several retrons if specified).
+
+    :param retrons: The list of retrons to be composed.
+    :param exclude_small: Whether small retrons are excluded.
+    :param min_mol_size: The parameter used with exclude_small.
+    :return: The list of the composed retrons.
+    """
+
+    if len(retrons) > 1 and exclude_small:
+        big_retrons = [
+            retron for retron in retrons if len(retron.molecule) > min_mol_size
+        ]
+        if big_retrons:
+            return big_retrons
+    return list(retrons)
+
+
+def composed_part(molecule: MoleculeContainer) -> MoleculeContainer:
+    """Returns the molecule as it is added to the composed molecule by
+    compose_retrons after the first retron: only the atomic symbols of the
+    atoms and the bonds are copied, so the charges and the explicit hydrogens
+    of the atoms are dropped.
+
+    :param molecule: The molecule of the retron.
+    :return: The new molecule.
+    """
+
+    part = MoleculeContainer()
+    transition_mapping = {}
+    for n, atom in molecule.atoms():
+        transition_mapping[n] = part.add_atom(atom.atomic_symbol)
+    for atom, neighbor, bond in molecule.bonds():
+        part.add_bond(transition_mapping[atom], transition_mapping[neighbor], bond)
+
+    return part
 
 
 def compose_retrons(
@@ -76,12 +264,7 @@ def compose_retrons(
     if len(retrons) == 1:
         return retrons[0].molecule
     if len(retrons) > 1:
-        if exclude_small:
-            big_retrons = [
-                retron for retron in retrons if len(retron.molecule) > min_mol_size
-            ]
-            if big_retrons:
-                retrons = big_retrons
+        retrons = composed_retrons(retrons, exclude_small, min_mol_size)
         tmp_mol = retrons[0].molecule.copy()
         transition_mapping = {}
         for mol in retrons[1:]:
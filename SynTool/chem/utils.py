@@ -68,20 +68,23 @@ def unite_molecules(molecules: Iterable[MoleculeContainer]) -> MoleculeContainer
 def safe_canonicalization(molecule: MoleculeContainer) -> MoleculeContainer:
     """Attempts to canonicalize a molecule, handling any exceptions. If the
     canonicalization process fails due to an InvalidAromaticRing exception, it
-    safely returns the original molecule.
+    safely returns the original molecule. The given molecule is not modified,
+    so it can be shared (e.g. taken from the reaction rules application
+    cache).
 
     :param molecule: The given molecule to be canonicalized.
-    :return: The canonicalized molecule if successful, otherwise the
-        original molecule.
+    :return: The canonicalized molecule if successful, otherwise the copy
+        of the original molecule.
     """
-    molecule._atoms = dict(sorted(molecule._atoms.items()))
-
     molecule_copy = molecule.copy()
+    molecule_copy._atoms = dict(sorted(molecule_copy._atoms.items()))
     try:
         molecule_copy.canonicalize()
         return molecule_copy
     except InvalidAromaticRing:
-        return molecule
+        molecule_copy = molecule.copy()
+        molecule_copy._atoms = dict(sorted(molecule_copy._atoms.items()))
+        return molecule_copy
 
 
 def canonicalize_building_blocks(input_file: str, output_file: str) -> str:
@@ -7,18 +7,24 @@ from pathlib import Path
 
 import click
 import gdown
+import torch
 import yaml
 
 from SynTool.chem.data.filtering import (ReactionFilterConfig,
                                          filter_reactions_from_file)
 from SynTool.chem.data.standardizing import (ReactionStandardizationConfig,
                                              standardize_reactions_from_file)
+from SynTool.chem.reaction_rules.compiling import compile_reaction_rules
 from SynTool.chem.reaction_rules.extraction import extract_rules_from_reactions
 from SynTool.chem.utils import canonicalize_building_blocks
 from SynTool.mcts.search import run_search
+from SynTool.ml.networks.exported import export_network
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.networks.value import ValueNetwork
 from SynTool.ml.training.reinforcement import run_reinforcement_tuning
 from SynTool.ml.training.supervised import (create_policy_dataset,
                                             run_policy_training)
+from SynTool.utils.building_blocks import build_building_blocks_index
 from SynTool.utils.config import (PolicyNetworkConfig, ReinforcementConfig,
                                   RuleExtractionConfig, TreeConfig,
                                   ValueNetworkConfig)
@@ -74,6 +80,37 @@ def building_blocks_canonicalizing_cli(input_file: str, output_file: str) -> Non
     canonicalize_building_blocks(input_file=input_file, output_file=output_file)
 
 
+@syntool.command(name="building_blocks_indexing")
+@click.option(
+    "--input",
+    "input_file",
+    required=True,
+    type=click.Path(exists=True),
+    help="Path to the file with canonicalized building blocks.",
+)
+@click.option(
+    "--output",
+    "output_file",
+    required=True,
+    type=click.Path(),
+    help="Path to the file (.npy) where the building blocks index will be stored.",
+)
+@click.option(
+    "--bloom_fpr",
+    default=0.01,
+    type=float,
+    help="False positive rate of the Bloom filter built in front of the index (0 disables the filter).",
+)
+def building_blocks_indexing_cli(
+    input_file: str, output_file: str, bloom_fpr: float
+) -> None:
+    """Builds the memory-mapped building blocks index used in planning instead of
+    the building blocks file."""
+    build_building_blocks_index(
+        input_file=input_file, output_file=output_file, bloom_fpr=bloom_fpr
+    )
+
+
 @syntool.command(name="reaction_standardizing")
 @click.option(
     "--config",
@@ -190,6 +227,26 @@ def rule_extracting_cli(
     )
 
 
+@syntool.command(name="rule_compiling")
+@click.option(
+    "--input",
+    "input_file",
+    required=True,
+    type=click.Path(exists=True),
+    help="Path to the file with extracted reaction rules.",
+)
+@click.option(
+    "--output",
+    "output_file",
+    required=True,
+    type=click.Path(),
+    help="Path to the file where compiled reaction rules will be stored.",
+)
+def rule_compiling_cli(input_file: str, output_file: str) -> None:
+    """Compiles the extracted reaction rules into the bundle used in planning."""
+    compile_reaction_rules(input_file=input_file, output_file=output_file)
+
+
 @syntool.command(name="supervised_ranking_policy_training")
 @click.option(
     "--config",
@@ -385,6 +442,51 @@ def reinforcement_value_network_training_cli(
     )
 
 
+@syntool.command(name="network_exporting")
+@click.option(
+    "--weights",
+    "weights_path",
+    required=True,
+    type=click.Path(exists=True),
+    help="Path to the file with trained policy or value network (checkpoint).",
+)
+@click.option(
+    "--network_type",
+    default="policy",
+    type=click.Choice(["policy", "value"]),
+    help="The type of the network.",
+)
+@click.option(
+    "--output",
+    "output_file",
+    required=True,
+    type=click.Path(),
+    help="Path to the file where exported network will be stored.",
+)
+@click.option(
+    "--quantize",
+    is_flag=True,
+    default=False,
+    help="Quantize the weights of the output layers to int8.",
+)
+def network_exporting_cli(
+    weights_path: str, network_type: str, output_file: str, quantize: bool
+) -> None:
+    """Exports the trained policy or value network for the CPU inference in
+    planning without PyTorch Lightning."""
+
+    if network_type == "policy":
+        network = PolicyNetwork.load_from_checkpoint(
+            weights_path, map_location=torch.device("cpu"), batch_size=1, dropout=0
+        )
+    else:
+        network = ValueNetwork.load_from_checkpoint(
+            weights_path, map_location=torch.device("cpu")
+        )
+
+    export_network(network.eval(), output_file=output_file, quantize=quantize)
+
+
 @syntool.command(name="planning")
 @click.option(
     "--config",
@@ -429,6 +531,30 @@ def reinforcement_value_network_training_cli(
     type=click.Path(exists=False),
     help="Path to the file where retrosynthesis planning results will be stored.",
 )
+@click.option(
+    "--num_cpus",
+    default=1,
+    type=int,
+    help="The number of worker processes planning the target molecules in parallel.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Skip the target molecules already planned in the results directory.",
+)
+@click.option(
+    "--retron_memo",
+    default=None,
+    type=click.Path(exists=False),
+    help="Path to the database of the precursors solved in the previous planning runs.",
+)
+@click.option(
+    "--time_budget",
+    default=None,
+    type=float,
+    help="Wall-clock time (in seconds) given to each target molecule.",
+)
 def planning_cli(
     config_path: str,
     targets: str,
@@ -437,6 +563,10 @@ def planning_cli(
     policy_network: str,
     value_network: str,
     results_dir: str,
+    num_cpus: int,
+    resume: bool,
+    retron_memo: str,
+    time_budget: float,
 ):
     """Retrosynthesis planning."""
 
@@ -456,6 +586,10 @@ def planning_cli(
         building_blocks_path=building_blocks,
         value_network_path=value_network,
         results_root=results_dir,
+        num_cpus=num_cpus,
+        resume=resume,
+        retron_memo_path=retron_memo,
+        time_budget=time_budget,
     )
 
 
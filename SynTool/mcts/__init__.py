@@ -1,8 +1,9 @@
 from CGRtools.containers import MoleculeContainer
+from .andor import AndOrGraph
 from .node import *
 from .tree import *
 
 
 MoleculeContainer.depict_settings(aam=False)
 
-__all__ = ["Tree", "Node"]
+__all__ = ["Tree", "Node", "AndOrGraph"]
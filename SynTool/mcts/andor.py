@@ -0,0 +1,576 @@
+"""Module containing a class AndOrGraph that is used for the AND-OR graph search
+of retrosynthetic routes."""
+
+from itertools import islice, product
+from math import inf, log
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from CGRtools import Reactor, smiles
+from CGRtools.containers import MoleculeContainer
+from tqdm.auto import tqdm
+
+from SynTool.chem.reaction import ReactionRuleCache
+from SynTool.chem.retron import Retron
+from SynTool.mcts.base import SearchBase
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.utils.config import TreeConfig
+
+
+class MoleculeNode:
+    """Molecule (OR) node of the AND-OR graph. The molecule is solved if it is
+    a building block or if any of its reactions is solved."""
+
+    __slots__ = (
+        "retron",
+        "depth",
+        "in_stock",
+        "expanded",
+        "parents",
+        "reactions",
+        "cost",
+        "solved",
+        "open",
+    )
+
+    def __init__(self, retron: Retron, depth: int, in_stock: bool) -> None:
+        """Initializes the molecule node.
+
+        :param retron: The retron of the node.
+        :param depth: The depth of the node (the minimal number of
+            reactions from the target).
+        :param in_stock: Whether the retron is a building block.
+        """
+
+        self.retron = retron
+        self.depth = depth
+        self.in_stock = in_stock
+        self.expanded = False
+
+        self.parents: List[int] = []  # ids of the reactions producing the retron
+        self.reactions: List[int] = []  # ids of the reactions decomposing the retron
+
+        # the estimated cost of the cheapest route, whether the retron is solved,
+        # and whether the subgraph of the node has the molecules to be expanded
+        self.cost = 0.0
+        self.solved = in_stock
+        self.open = not in_stock
+
+
+class ReactionNode:
+    """Reaction (AND) node of the AND-OR graph. The reaction is solved if all
+    its precursors (child molecules) are solved."""
+
+    __slots__ = (
+        "parent",
+        "children",
+        "rule_id",
+        "cost",
+        "total_cost",
+        "solved",
+        "open",
+    )
+
+    def __init__(
+        self, parent: int, children: Tuple[int, ...], rule_id: int, prob: float
+    ) -> None:
+        """Initializes the reaction node.
+
+        :param parent: The id of the molecule node decomposed by the
+            reaction.
+        :param children: The ids of the molecule nodes of the
+            precursors.
+        :param rule_id: The id of the applied reaction rule.
+        :param prob: The probability of the reaction rule predicted by
+            the policy function.
+        """
+
+        self.parent = parent
+        self.children = children
+        self.rule_id = rule_id
+
+        self.cost = -log(max(prob, 1e-10))  # the cost of the reaction itself
+        self.total_cost = self.cost  # including the costs of the precursors
+        self.solved = False
+        self.open = True
+
+
+class AndOrGraph(SearchBase):
+    """AndOrGraph class with attributes and methods for the AND-OR graph search
+    of retrosynthetic routes.
+
+    Each molecule is represented by a single molecule node, so it is
+    expanded and solved once, and the reaction nodes combine the routes
+    of their precursors. The molecule node with the cheapest estimated
+    route is expanded in each iteration (the cost of the reaction is the
+    negative logarithm of its reaction rule probability).
+    """
+
+    def __init__(
+        self,
+        target: Union[MoleculeContainer, str],
+        config: TreeConfig,
+        reaction_rules: List[Reactor],
+        building_blocks: Set[str],
+        expansion_function: PolicyNetworkFunction,
+        reaction_cache: ReactionRuleCache = None,
+        deadline: float = None,
+    ):
+        """Initializes the AND-OR graph for the target molecule.
+
+        :param target: A target molecule for retrosynthesis routes
+            search.
+        :param config: A tree configuration (max_iterations,
+            max_tree_size, max_time, max_routes, max_depth, min_mol_size,
+            silent and reaction_cache_size are used).
+        :param reaction_rules: A loaded reaction rules.
+        :param building_blocks: A loaded building blocks.
+        :param expansion_function: A loaded policy function.
+        :param reaction_cache: The cache of reaction rules application
+            results, can be shared between graphs. If None, the graph
+            creates its own cache of reaction_cache_size.
+        :param deadline: The wall-clock time (as returned by time.time)
+            at which the graph search is stopped, even if max_time is
+            not exceeded.
+        """
+
+        self.config = config
+
+        if isinstance(target, str):
+            target = smiles(target)
+        assert bool(
+            target
+        ), "Target is not defined, is not a MoleculeContainer or have no atoms"
+        target.canonicalize()
+
+        # graph structure
+        self.molecules: List[MoleculeNode] = []
+        self.reactions: List[ReactionNode] = []
+        self.molecules_ids: Dict[str, int] = {}  # SMILES to molecule node id
+
+        # search limits and statistics
+        self.curr_iteration: int = 0
+        self.start_time: float = 0
+        self.curr_time: float = 0
+        self.deadline = deadline
+        self.first_solution_iteration: Optional[int] = None
+
+        # building blocks and reaction rules
+        self.building_blocks = building_blocks
+        self._init_reaction_rules(reaction_rules, reaction_cache)
+
+        self.policy_network = expansion_function
+
+        self._add_molecule(
+            Retron(target, canonicalize=False), depth=0
+        )  # the target node id is 0
+
+        # utils
+        self._tqdm = True  # needed to disable tqdm with multiprocessing module
+
+    def __len__(self) -> int:
+        """Returns the number of molecule nodes in the graph."""
+
+        return len(self.molecules)
+
+    def __iter__(self) -> "AndOrGraph":
+        """The function is defining an iterator for an AndOrGraph object.
+
+        Also needed for the bar progress display.
+        """
+
+        self.start_time = time()
+        if self._tqdm:
+            self._tqdm = tqdm(
+                total=self.config.max_iterations, disable=self.config.silent
+            )
+        return self
+
+    def __repr__(self) -> str:
+        """Returns a string representation of the graph (target SMILES, graph
+        size, and the number of found routes)."""
+        return self.report()
+
+    def __next__(self) -> [bool, List[int]]:
+        """Does one iteration of the graph search: selects the molecule node
+        with the cheapest estimated route, expands it and updates the costs
+        of its ancestors.
+
+        :return: Returns True if the target is solved and the id of the
+            expanded molecule node. Otherwise, returns False and the id
+            of the expanded molecule node.
+        """
+
+        target_node = self.molecules[0]
+        if target_node.in_stock:
+            raise StopIteration("Target is building block.")
+
+        if self.curr_iteration >= self.config.max_iterations:
+            raise StopIteration("Iterations limit exceeded.")
+        if len(self.molecules) >= self.config.max_tree_size:
+            raise StopIteration("Max tree size exceeded.")
+        if self._time_is_up():
+            raise StopIteration("Time limit exceeded.")
+        if (
+            self.config.max_routes
+            and target_node.solved
+            and self.count_routes(self.config.max_routes) >= self.config.max_routes
+        ):
+            raise StopIteration("Routes limit reached.")
+        if not target_node.open:
+            raise StopIteration("All possible routes found.")
+
+        # start new iteration
+        self.curr_iteration += 1
+        self.curr_time = time() - self.start_time
+
+        if self._tqdm:
+            self._tqdm.update()
+
+        molecule_id = self._select_molecule()
+        self._expand_molecule(molecule_id)
+        self._update(molecule_id)
+
+        if target_node.solved and self.first_solution_iteration is None:
+            self.first_solution_iteration = self.curr_iteration
+
+        return target_node.solved, [molecule_id]
+
+    def _add_molecule(self, retron: Retron, depth: int) -> int:
+        """Returns the id of the molecule node of the retron, adding the new
+        molecule node if the retron is not in the graph yet.
+
+        :param retron: The retron.
+        :param depth: The depth of the retron in the current route.
+        :return: The id of the molecule node.
+        """
+
+        molecule_id = self.molecules_ids.get(str(retron))
+        if molecule_id is not None:
+            molecule = self.molecules[molecule_id]
+            if depth < molecule.depth:  # can be expanded if reached earlier
+                molecule.depth = depth
+                if not molecule.expanded and not molecule.in_stock:
+                    self._update(molecule_id)
+            return molecule_id
+
+        molecule_id = len(self.molecules)
+        molecule = MoleculeNode(
+            retron,
+            depth,
+            in_stock=retron.is_building_block(
+                self.building_blocks, self.config.min_mol_size
+            ),
+        )
+        self.molecules.append(molecule)
+        self.molecules_ids[str(retron)] = molecule_id
+        self._evaluate_molecule(molecule)
+
+        return molecule_id
+
+    def _select_molecule(self) -> int:
+        """Selects the molecule node to be expanded. The graph is descended
+        from the target through the reactions with the cheapest estimated
+        routes which still have the molecules to be expanded.
+
+        :return: The id of the selected molecule node.
+        """
+
+        molecule_id = 0
+        while self.molecules[molecule_id].expanded:
+            open_reactions = [
+                reaction_id
+                for reaction_id in self.molecules[molecule_id].reactions
+                if self.reactions[reaction_id].open
+            ]
+            reaction_id = min(
+                open_reactions, key=lambda i: self.reactions[i].total_cost
+            )
+            molecule_id = next(
+                child_id
+                for child_id in self.reactions[reaction_id].children
+                if self.molecules[child_id].open
+            )
+
+        return molecule_id
+
+    def _ancestors(self, molecule_id: int) -> Set[int]:
+        """Returns the ids of the molecule node and all the molecule nodes from
+        which it can be reached.
+
+        :param molecule_id: The id of the molecule node.
+        :return: The set of the molecule node ids.
+        """
+
+        ancestors, stack = {molecule_id}, [molecule_id]
+        while stack:
+            for reaction_id in self.molecules[stack.pop()].parents:
+                parent_id = self.reactions[reaction_id].parent
+                if parent_id not in ancestors:
+                    ancestors.add(parent_id)
+                    stack.append(parent_id)
+
+        return ancestors
+
+    def _expand_molecule(self, molecule_id: int) -> None:
+        """Expands the molecule node by applying the reaction rules predicted
+        by the policy function and adding the reaction nodes. The reactions
+        producing the ancestors of the molecule are skipped, so the graph
+        remains acyclic.
+
+        :param molecule_id: The id of the molecule node to be expanded.
+        :return: None.
+        """
+
+        molecule = self.molecules[molecule_id]
+        molecule.expanded = True
+
+        ancestors = {
+            str(self.molecules[i].retron) for i in self._ancestors(molecule_id)
+        }
+
+        applied_reactions = set()
+        for prob, rule, rule_id in self.policy_network.predict_reaction_rules(
+            molecule.retron, self.reaction_rules
+        ):
+            if self._time_is_up():  # the molecule keeps the reactions found so far
+                break
+
+            for products in self._apply_reaction_rule(molecule.retron, rule, rule_id):
+                if not products:
+                    continue
+
+                new_retrons = tuple(
+                    Retron(mol, table=self.retron_table) for mol in products
+                )
+                reaction_key = frozenset(str(retron) for retron in new_retrons)
+                if reaction_key in applied_reactions or not ancestors.isdisjoint(
+                    reaction_key
+                ):
+                    continue
+                applied_reactions.add(reaction_key)
+
+                children = tuple(
+                    self._add_molecule(retron, molecule.depth + 1)
+                    for retron in new_retrons
+                )
+                reaction_id = len(self.reactions)
+                self.reactions.append(
+                    ReactionNode(molecule_id, children, rule_id, prob)
+                )
+                molecule.reactions.append(reaction_id)
+                for child_id in set(children):
+                    self.molecules[child_id].parents.append(reaction_id)
+                self._evaluate_reaction(self.reactions[reaction_id])
+
+    def _evaluate_molecule(self, molecule: MoleculeNode) -> None:
+        """Recalculates the cost, the solved and open status of the molecule
+        node from its reactions.
+
+        :param molecule: The molecule node.
+        :return: None.
+        """
+
+        if molecule.in_stock:
+            return
+
+        if not molecule.expanded:  # the molecules beyond max_depth are dead ends
+            expandable = molecule.depth < self.config.max_depth
+            molecule.cost = 0.0 if expandable else inf
+            molecule.open = expandable
+            return
+
+        reactions = [self.reactions[i] for i in molecule.reactions]
+        molecule.cost = min((r.total_cost for r in reactions), default=inf)
+        molecule.solved = any(r.solved for r in reactions)
+        molecule.open = any(r.open for r in reactions)
+
+    def _evaluate_reaction(self, reaction: ReactionNode) -> None:
+        """Recalculates the cost, the solved and open status of the reaction
+        node from its precursors.
+
+        :param reaction: The reaction node.
+        :return: None.
+        """
+
+        children = [self.molecules[i] for i in reaction.children]
+        reaction.total_cost = reaction.cost + sum(m.cost for m in children)
+        reaction.solved = all(m.solved for m in children)
+        reaction.open = reaction.total_cost < inf and any(m.open for m in children)
+
+    def _update(self, molecule_id: int) -> None:
+        """Updates the molecule node and propagates the changes of its cost,
+        solved and open status to all its ancestors.
+
+        :param molecule_id: The id of the changed molecule node.
+        :return: None.
+        """
+
+        stack = [(molecule_id, True)]
+        while stack:
+            molecule_id, forced = stack.pop()
+            molecule = self.molecules[molecule_id]
+
+            status = (molecule.cost, molecule.solved, molecule.open)
+            self._evaluate_molecule(molecule)
+            if not forced and status == (molecule.cost, molecule.solved, molecule.open):
+                continue
+
+            for reaction_id in molecule.parents:
+                self._evaluate_reaction(self.reactions[reaction_id])
+                stack.append((self.reactions[reaction_id].parent, False))
+
+    @property
+    def solved(self) -> bool:
+        """Returns True if at least one route for the target is found. The
+        building block target is not searched and has no routes (as in the
+        tree)."""
+
+        return self.molecules[0].solved and not self.molecules[0].in_stock
+
+    def _solved_reactions(self, molecule: MoleculeNode) -> List[ReactionNode]:
+        """Returns the solved reactions of the molecule node from the cheapest
+        one.
+
+        :param molecule: The molecule node.
+        :return: The list of the solved reaction nodes.
+        """
+
+        return sorted(
+            (self.reactions[i] for i in molecule.reactions if self.reactions[i].solved),
+            key=lambda r: r.total_cost,
+        )
+
+    def _molecule_routes(
+        self,
+        molecule_id: int,
+        max_routes: Optional[int],
+        routes_memo: Dict[int, List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Returns the routes of the solved molecule node from the cheapest
+        one. The routes of each molecule node are built once and shared by
+        the routes of all its parents.
+
+        :param molecule_id: The id of the solved molecule node.
+        :param max_routes: The maximum number of the routes of the
+            molecule. If None, all the routes are returned.
+        :param routes_memo: The routes of the already visited molecule
+            nodes.
+        :return: The routes of the molecule.
+        """
+
+        routes = routes_memo.get(molecule_id)
+        if routes is not None:
+            return routes
+
+        molecule = self.molecules[molecule_id]
+        smiles_str = str(molecule.retron)
+        in_stock = smiles_str in self.building_blocks
+
+        if molecule.in_stock:
+            routes = [{"smiles": smiles_str, "type": "mol", "in_stock": in_stock}]
+        else:
+            routes = []
+            for reaction in self._solved_reactions(molecule):
+                children_routes = [
+                    self._molecule_routes(child_id, max_routes, routes_memo)
+                    for child_id in reaction.children
+                ]
+                limit = None if max_routes is None else max_routes - len(routes)
+                for children in islice(product(*children_routes), limit):
+                    routes.append(
+                        {
+                            "smiles": smiles_str,
+                            "type": "mol",
+                            "in_stock": in_stock,
+                            "children": [
+                                {"type": "reaction", "children": list(children)}
+                            ],
+                        }
+                    )
+                if max_routes is not None and len(routes) >= max_routes:
+                    break
+
+        routes_memo[molecule_id] = routes
+        return routes
+
+    def count_routes(self, max_routes: Optional[int] = None) -> int:
+        """Counts the found routes of the target (up to max_routes). The number
+        of the routes of each molecule node is calculated once.
+
+        :param max_routes: The maximum number of the counted routes. If
+            None, all the routes are counted.
+        :return: The number of the routes.
+        """
+
+        counts: Dict[int, int] = {}
+
+        def count(molecule_id: int) -> int:
+            if molecule_id not in counts:
+                molecule = self.molecules[molecule_id]
+                if molecule.in_stock:
+                    counts[molecule_id] = 1
+                else:
+                    total = 0
+                    for reaction in self._solved_reactions(molecule):
+                        routes = 1
+                        for child_id in reaction.children:
+                            routes *= count(child_id)
+                            if max_routes is not None:
+                                routes = min(routes, max_routes)
+                        total += routes
+                        if max_routes is not None:
+                            total = min(total, max_routes)
+                    counts[molecule_id] = total
+            return counts[molecule_id]
+
+        return count(0) if self.solved else 0
+
+    def extract_routes(self, max_routes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Extracts the found routes of the target in the same format as
+        extract_routes for the tree.
+
+        :param max_routes: The maximum number of the extracted routes. If
+            None, the max_routes of the search configuration is used (all
+            the routes are extracted if it is 0).
+        :return: The list of the routes (from the cheapest one).
+        """
+
+        if max_routes is None:
+            max_routes = self.config.max_routes or None
+
+        target = self.molecules[0].retron
+        target_in_stock = target.is_building_block(self.building_blocks)
+
+        if not self.solved:
+            return [
+                {
+                    "type": "mol",
+                    "smiles": str(target),
+                    "in_stock": target_in_stock,
+                    "children": [],
+                }
+            ]
+
+        return [
+            {
+                "type": "mol",
+                "smiles": str(target),
+                "in_stock": target_in_stock,
+                "children": route["children"],
+            }
+            for route in self._molecule_routes(0, max_routes, {})
+        ]
+
+    def report(self) -> str:
+        """Returns the string representation of the graph."""
+
+        return (
+            f"AND-OR graph for: {str(self.molecules[0].retron)}\n"
+            f"Time: {round(self.curr_time, 1)} seconds\n"
+            f"Number of molecule nodes: {len(self.molecules)}\n"
+            f"Number of reaction nodes: {len(self.reactions)}\n"
+            f"Number of iterations: {self.curr_iteration}\n"
+            f"Number of iterations to the first route: {self.first_solution_iteration}\n"
+            f"Target is solved: {self.solved}"
+        )
@@ -0,0 +1,102 @@
+"""Module containing a class SearchBase with the methods shared by the search
+engines (the tree and the AND-OR graph)."""
+
+from time import time
+from typing import Iterable, List, Optional, Sequence
+
+from CGRtools import Reactor
+from CGRtools.containers import MoleculeContainer
+
+from SynTool.chem.reaction import ReactionRuleCache, apply_reaction_rule
+from SynTool.chem.reaction_rules.compiling import (molecule_features,
+                                                   satisfies_requirements)
+from SynTool.chem.retron import Retron, RetronTable
+from SynTool.utils.config import TreeConfig
+
+
+class SearchBase:
+    """Base class of the search engines with the application of the reaction
+    rules and the search time limits. The search engine must set config,
+    start_time and deadline."""
+
+    config: TreeConfig
+    start_time: float
+    curr_time: float
+    deadline: Optional[float]
+
+    def _init_reaction_rules(
+        self, reaction_rules: List[Reactor], reaction_cache: ReactionRuleCache = None
+    ) -> None:
+        """Initializes the reaction rules and the helpers of their application:
+        the reaction rules application cache, the intern table of the
+        canonical retrons and the reaction rules prefilter.
+
+        :param reaction_rules: A loaded reaction rules.
+        :param reaction_cache: The cache of reaction rules application
+            results, can be shared between the searches. If None, the
+            search creates its own cache of reaction_cache_size.
+        :return: None.
+        """
+
+        self.reaction_rules = reaction_rules
+
+        # reaction rules application cache
+        if reaction_cache is None and self.config.reaction_cache_size > 0:
+            reaction_cache = ReactionRuleCache(self.config.reaction_cache_size)
+        self.reaction_cache = reaction_cache
+
+        # intern table of the canonical retrons
+        self.retron_table: Optional[RetronTable] = None
+        if self.config.retron_table_size > 0:
+            self.retron_table = RetronTable(self.config.retron_table_size)
+
+        # reaction rules prefilter (the requirements are stored in the compiled reaction rules)
+        self.rules_requirements = getattr(reaction_rules, "requirements", None)
+        self.prefilter_checks: int = 0
+        self.prefilter_skips: int = 0
+        self._retron_features = (None, None)  # the last checked retron and its features
+
+    def _time_is_up(self) -> bool:
+        """Checks if the time limit of the search (max_time or the deadline) is
+        exceeded.
+
+        :return: True if the search must be stopped.
+        """
+
+        now = time()
+        self.curr_time = now - self.start_time
+        return self.curr_time >= self.config.max_time or (
+            self.deadline is not None and now >= self.deadline
+        )
+
+    def _apply_reaction_rule(
+        self, retron: Retron, rule: Reactor, rule_id: int
+    ) -> Iterable[Optional[Sequence[MoleculeContainer]]]:
+        """Applies the reaction rule to the retron, using the reaction rules
+        application cache if it is enabled. The reaction rule is not applied
+        if the retron lacks the atoms or bonds required by it.
+
+        :param retron: The retron to which the reaction rule is applied.
+        :param rule: The reaction rule to be applied.
+        :param rule_id: The id of the reaction rule.
+        :return: The products of the reaction rule application (the
+            molecules must not be modified, see ReactionRuleCache).
+        """
+
+        if self.rules_requirements is not None:
+            if self._retron_features[0] is not retron:
+                self._retron_features = (retron, molecule_features(retron.molecule))
+
+            self.prefilter_checks += 1
+            if not satisfies_requirements(
+                self._retron_features[1], self.rules_requirements[rule_id]
+            ):
+                self.prefilter_skips += 1
+                return []
+
+        if self.reaction_cache is None:
+            return apply_reaction_rule(retron.molecule, rule)
+
+        return self.reaction_cache.apply(
+            retron.molecule, rule, rule_id, molecule_key=str(retron)
+        )
@@ -1,30 +1,85 @@
 """Module containing a class that represents a value function for prediction of
 synthesisablity of new nodes in the tree search."""
 
-from typing import List
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
+import numpy as np
 import torch
+from torch.nn import Module
 
-from SynTool.chem.retron import Retron, compose_retrons
-from SynTool.ml.networks.value import ValueNetwork
-from SynTool.ml.training import mol_to_pyg
+from SynTool.chem.retron import (Retron, compose_retrons, composed_part,
+                                 composed_retrons)
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.ml.featurization import (arrays_to_pyg_batch,
+                                      graphs_to_batch_arrays, mol_to_arrays,
+                                      mols_to_pyg_batch, prepare_molecule)
+from SynTool.ml.networks.exported import (is_exported_network,
+                                          load_exported_network)
+from SynTool.utils.config import PolicyNetworkConfig
 
 
 class ValueNetworkFunction:
     """Value function implemented as a value neural network for node evaluation
     (synthesisability prediction) in tree search."""
 
-    def __init__(self, weights_path: str) -> None:
+    def __init__(self, weights_path: str, graph_cache_size: int = 10000) -> None:
         """The value function predicts the probability to synthesize the target
         molecule with available building blocks starting from a given retron.
 
-        :param weights_path: The value network weights file path.
+        :param weights_path: The value network weights file path (the
+            PyTorch Lightning checkpoint or the value network exported
+            with export_network).
+        :param graph_cache_size: The maximum number of retrons for which
+            the graphs are cached and reused in the evaluation of the
+            nodes. If 0, the cache is disabled.
         """
 
-        value_net = ValueNetwork.load_from_checkpoint(
-            weights_path, map_location=torch.device("cpu")
-        )
-        self.value_network = value_net.eval()
+        self.exported = is_exported_network(weights_path)
+        if self.exported:
+            self.value_network, _ = load_exported_network(weights_path)
+        else:
+            # imported here, so the exported network is used without PyTorch Lightning
+            from SynTool.ml.networks.value import ValueNetwork
+
+            value_net = ValueNetwork.load_from_checkpoint(
+                weights_path, map_location=torch.device("cpu")
+            )
+            self.value_network = value_net.eval()
+
+        self.graph_cache_size = graph_cache_size
+        self.graph_cache = OrderedDict() if graph_cache_size > 0 else None
+
+    def _retron_graph(
+        self, retron: Retron, first: bool = True
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Converts the retron molecule, as it is composed into the molecule of
+        the node by compose_retrons, to the graph arrays (see mol_to_arrays),
+        taking them from the cache if the retron was already converted.
+
+        :param retron: The retron.
+        :param first: Whether the retron is the first one composed into the
+            molecule of the node (it is copied with the charges and the
+            explicit hydrogens of the atoms, see composed_part).
+        :return: The atoms features matrix and the edge index of the
+            retron, or None if the retron can not be converted.
+        """
+
+        key = (str(retron), first)
+        if self.graph_cache is not None and key in self.graph_cache:
+            self.graph_cache.move_to_end(key)
+            return self.graph_cache[key]
+
+        molecule = retron.molecule if first else composed_part(retron.molecule)
+        tmp_molecule = prepare_molecule(molecule)
+        graph = None if tmp_molecule is None else mol_to_arrays(tmp_molecule)
+
+        if self.graph_cache is not None:
+            self.graph_cache[key] = graph
+            if len(self.graph_cache) > self.graph_cache_size:
+                self.graph_cache.popitem(last=False)
+
+        return graph
 
     def predict_value(self, retrons: List[Retron,]) -> float:
         """Predicts a value based on the given retrons from the node. For
@@ -35,12 +90,193 @@ class ValueNetworkFunction:
             node.
         """
 
-        molecule = compose_retrons(retrons=retrons, exclude_small=True)
-        pyg_graph = mol_to_pyg(molecule)
-        if pyg_graph:
+        return self.predict_values([retrons])[0]
+
+    def predict_values(self, retrons_list: List[Tuple[Retron, ...]]) -> List[float]:
+        """Predicts the values of several nodes with a single forward pass of
+        the value network. The graph of each node is the disjoint union of
+        the (cached) graphs of the retrons composed into a single molecule
+        (product) by compose_retrons, so the values are the same as for the
+        composed molecules.
+
+        :param retrons_list: The list of the retrons of the nodes.
+        :return: The list of the predicted float values
+            ("synthesisability") of the nodes in the same order.
+        """
+
+        graphs_list, graph_ids = [], []
+        for i, retrons in enumerate(retrons_list):
+            retrons = composed_retrons(retrons)
+            if len(retrons) == 1 and len(retrons[0].molecule) == 1:
+                continue  # the single atom is not converted to graph
+
+            graphs = [
+                self._retron_graph(retron, first=n == 0)
+                for n, retron in enumerate(retrons)
+            ]
+            if all(graph is not None for graph in graphs):
+                graphs_list.append(graphs)
+                graph_ids.append(i)
+
+        values = [-1e6] * len(retrons_list)  # for molecules not converted to graphs
+        if not graphs_list:
+            return values
+
+        x, edge_index, batch, ptr = graphs_to_batch_arrays(graphs_list)
+        if self.exported:
             with torch.no_grad():
-                value_pred = self.value_network.forward(pyg_graph)[0].item()
+                value_preds = self.value_network(
+                    torch.from_numpy(x),
+                    torch.from_numpy(edge_index),
+                    torch.from_numpy(batch),
+                    len(graph_ids),
+                )[0][:, 0].tolist()
         else:
-            value_pred = -1e6
+            pyg_batch = arrays_to_pyg_batch(x, edge_index, batch, ptr)
+            with torch.no_grad():
+                value_preds = self.value_network.forward(pyg_batch)[:, 0].tolist()
+
+        for graph_id, value_pred in zip(graph_ids, value_preds):
+            values[graph_id] = value_pred
+
+        return values
+
+
+class PolicyValueNetworkFunction(PolicyNetworkFunction):
+    """Policy and value function implemented as the policy and value network
+    with the shared graph embedding (PolicyValueNetwork). The same object is
+    used in the tree search as the expansion and the evaluation function.
+
+    The graph embedding of the composed molecule (the disjoint union of the
+    retrons) is the sum of the graph embeddings of its retrons. So in the node
+    evaluation each retron is embedded once, the value of the node is
+    predicted from the sum of the embeddings of its retrons, and the reaction
+    rules predicted from the same embeddings are cached for the expansion of
+    the node (if the prediction cache is enabled).
+    """
+
+    def __init__(self, policy_config: PolicyNetworkConfig) -> None:
+        """Initializes the policy and value function.
+
+        :param policy_config: An expansion policy configuration. The
+            weights_path is the PyTorch Lightning checkpoint of the
+            PolicyValueNetwork.
+        """
+
+        super().__init__(policy_config)
+        if self.exported:
+            raise ValueError(
+                "The policy and value network must be loaded from the checkpoint."
+            )
+
+    @staticmethod
+    def _load_checkpoint(weights_path: str) -> Module:
+        """Loads the policy and value network from the PyTorch Lightning
+        checkpoint.
+
+        :param weights_path: The path to the checkpoint.
+        :return: The policy and value network.
+        """
+
+        from SynTool.ml.networks.policy_value import PolicyValueNetwork
+
+        return PolicyValueNetwork.load_from_checkpoint(
+            weights_path, map_location=torch.device("cpu"), batch_size=1, dropout=0
+        )
+
+    def predict_value(self, retrons: List[Retron,]) -> float:
+        """Predicts a value based on the given retrons from the node.
+
+        :param retrons: The list of retrons.
+        :return: The predicted float value ("synthesisability") of the
+            node.
+        """
+
+        return self.predict_values([retrons])[0]
+
+    def predict_values(self, retrons_list: List[Tuple[Retron, ...]]) -> List[float]:
+        """Predicts the values of several nodes with a single forward pass of
+        the graph embedding over the unique retrons of the nodes. The retrons
+        are embedded as they are composed into the molecule of the node by
+        compose_retrons (see composed_part), so the values are the same as
+        for the composed molecules.
+
+        :param retrons_list: The list of the retrons of the nodes.
+        :return: The list of the predicted float values
+            ("synthesisability") of the nodes in the same order.
+        """
+
+        # the keys of the retrons composed into the molecule of each node
+        nodes_keys, parts, first_retrons = [], {}, {}
+        for retrons in retrons_list:
+            keys = []
+            for n, retron in enumerate(composed_retrons(retrons)):
+                key = (str(retron), n == 0)
+                if key not in parts:
+                    if n == 0:
+                        parts[key] = retron.molecule
+                        first_retrons[key] = retron
+                    else:
+                        parts[key] = composed_part(retron.molecule)
+                        parts[key].canonicalize()
+                keys.append(key)
+            nodes_keys.append(keys)
+        keys = list(parts)
+
+        embeddings = {}
+        pyg_batch, graph_ids = mols_to_pyg_batch(
+            [parts[key] for key in keys], canonicalize=False
+        )
+        if pyg_batch is not None:
+            with torch.no_grad():
+                x = self.policy_net.embed(pyg_batch)
+            del pyg_batch
+
+            not_cached = []
+            for row, graph_id in enumerate(graph_ids):
+                key = keys[graph_id]
+                embeddings[key] = x[row]
+                # the rules are predicted for the retrons as they are
+                if key[1] and self.cache is not None and key[0] not in self.cache:
+                    not_cached.append(row)
+
+            if not_cached:
+                for row, ranked_rules in zip(
+                    not_cached, self._rank_embeddings(x[not_cached])
+                ):
+                    self._put_cached(first_retrons[keys[graph_ids[row]]], ranked_rules)
+
+        values = [-1e6] * len(retrons_list)  # for molecules not converted to graphs
+        summed_ids, fallback_ids = [], []
+        for i, keys in enumerate(nodes_keys):
+            if all(key in embeddings for key in keys):
+                summed_ids.append(i)
+            else:  # the composed molecule is converted to graph instead
+                fallback_ids.append(i)
+
+        if summed_ids:
+            x = torch.stack(
+                [
+                    torch.stack([embeddings[key] for key in nodes_keys[i]]).sum(0)
+                    for i in summed_ids
+                ]
+            )
+            with torch.no_grad():
+                value_preds = self.policy_net.predict_value(x)[:, 0].tolist()
+            for i, value_pred in zip(summed_ids, value_preds):
+                values[i] = value_pred
+
+        if fallback_ids:
+            pyg_batch, graph_ids = mols_to_pyg_batch(
+                [
+                    compose_retrons(retrons=retrons_list[i], exclude_small=True)
+                    for i in fallback_ids
+                ]
+            )
+            if pyg_batch is not None:
+                with torch.no_grad():
+                    value_preds = self.policy_net.forward(pyg_batch)[2][:, 0].tolist()
+                for graph_id, value_pred in zip(graph_ids, value_preds):
+                    values[fallback_ids[graph_id]] = value_pred
 
-        return value_pred
+        return values
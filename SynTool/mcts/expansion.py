@@ -1,15 +1,26 @@
 """Module containing a class that represents a policy function for node
 expansion in the tree search."""
 
-from typing import Iterator, List, Tuple, Union
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import torch
 import torch_geometric
+from CGRtools.containers import MoleculeContainer
 from CGRtools.reactor.reactor import Reactor
+from torch import Tensor
+from torch.nn import Module
+from torch_geometric.data.batch import Batch
 
 from SynTool.chem.retron import Retron
-from SynTool.ml.networks.policy import PolicyNetwork
-from SynTool.ml.training import mol_to_pyg
+from SynTool.ml.featurization import (mol_to_pyg, mols_to_batch_arrays,
+                                      mols_to_pyg_batch)
+from SynTool.ml.networks.exported import (is_exported_network,
+                                          load_exported_network,
+                                          quantize_output_layers)
+from SynTool.ml.rule_index import RuleIndex
 from SynTool.utils.config import PolicyNetworkConfig
 
 
@@ -23,26 +34,70 @@ class PolicyNetworkFunction:
         """Initializes the expansion function (ranking or filter policy
         network).
 
-        :param policy_config: An expansion policy configuration.
+        :param policy_config: An expansion policy configuration. The
+            weights_path can be the PyTorch Lightning checkpoint or the
+            policy network exported with export_network.
         :param compile: Is supposed to speed up the training with model
-            compilation.
+            compilation (only for the checkpoint).
         """
 
         self.config = policy_config
 
-        policy_net = PolicyNetwork.load_from_checkpoint(
-            self.config.weights_path,
-            map_location=torch.device("cpu"),
-            batch_size=1,
-            dropout=0,
-        )
-
-        policy_net = policy_net.eval()
-        if compile:
-            self.policy_net = torch_geometric.compile(policy_net, dynamic=True)
+        self.exported = is_exported_network(self.config.weights_path)
+        if self.exported:
+            self.policy_net, meta = load_exported_network(self.config.weights_path)
+            self.policy_type = meta["policy_type"]
+            if self.config.quantize and not meta.get("quantized"):
+                raise ValueError(
+                    "The exported policy network is not quantized, export it "
+                    "with quantize=True to use it with quantize option."
+                )
+            if self.config.mips_clusters:
+                raise ValueError(
+                    "The reaction rules index can not be used with the exported "
+                    "policy network."
+                )
         else:
+            policy_net = self._load_checkpoint(self.config.weights_path).eval()
+            self.policy_type = policy_net.policy_type
+            if self.config.quantize:
+                policy_net = quantize_output_layers(
+                    policy_net, ["y_predictor", "priority_predictor"]
+                )
+            if compile:
+                policy_net.embedder = torch_geometric.compile(
+                    policy_net.embedder, dynamic=True
+                )
             self.policy_net = policy_net
 
+        # approximate search of the reaction rules with the highest logits
+        self.rule_indexes: Optional[List[RuleIndex]] = None
+        if self.config.mips_clusters:
+            self.rule_indexes = [
+                RuleIndex(
+                    predictor.weight,
+                    predictor.bias,
+                    num_clusters=self.config.mips_clusters,
+                    num_probes=self.config.mips_probes,
+                )
+                for predictor in (
+                    [self.policy_net.y_predictor, self.policy_net.priority_predictor]
+                    if self.policy_type == "filtering"
+                    else [self.policy_net.y_predictor]
+                )
+            ]
+
+        # cache of the predicted reaction rules
+        self.cache = OrderedDict() if self.config.cache_size > 0 else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        if (
+            self.cache is not None
+            and self.config.cache_path
+            and os.path.exists(self.config.cache_path)
+        ):
+            self.load_cache(self.config.cache_path)
+
     def predict_reaction_rules(
         self, retron: Retron, reaction_rules: List[Reactor]
     ) -> Iterator[Union[Iterator, Iterator[Tuple[float, Reactor, int]]]]:
@@ -57,36 +112,388 @@ class PolicyNetworkFunction:
             rule, reaction rule and reaction rule id.
         """
 
-        pyg_graph = mol_to_pyg(retron.molecule, canonicalize=False)
-        if pyg_graph:
-            with torch.no_grad():
-                if self.policy_net.policy_type == "filtering":
-                    probs, priority = self.policy_net.forward(pyg_graph)
-                if self.policy_net.policy_type == "ranking":
-                    probs = self.policy_net.forward(pyg_graph)
-            del pyg_graph
-        else:
-            return []
-
-        probs = probs[0].double()
-        if self.policy_net.policy_type == "filtering":
-            priority = priority[0].double()
-            priority_coef = self.config.priority_rules_fraction
-            probs = (1 - priority_coef) * probs + priority_coef * priority
-
-        sorted_probs, sorted_rules = torch.sort(probs, descending=True)
-        sorted_probs, sorted_rules = (
-            sorted_probs[: self.config.top_rules],
-            sorted_rules[: self.config.top_rules],
-        )
+        ranked_rules = self._get_cached(retron)
+        if ranked_rules is None and self.exported:
+            ranked_rules = self._predict_exported([retron.molecule])[0] or []
+            self._put_cached(retron, ranked_rules)
+        elif ranked_rules is None:
+            pyg_graph = mol_to_pyg(retron.molecule, canonicalize=False)
+            if pyg_graph:
+                ranked_rules = self._predict_graphs(pyg_graph)[0]
+                del pyg_graph
+            else:
+                ranked_rules = []
+            self._put_cached(retron, ranked_rules)
 
-        if self.policy_net.policy_type == "filtering":
-            sorted_probs = torch.softmax(sorted_probs, -1)
-
-        sorted_probs, sorted_rules = sorted_probs.tolist(), sorted_rules.tolist()
-
-        for prob, rule_id in zip(sorted_probs, sorted_rules):
+        for prob, rule_id in ranked_rules:
             if (
                 prob > self.config.rule_prob_threshold
             ):  # search may fail if rule_prob_threshold is too low (recommended value is 0.5)
                 yield prob, reaction_rules[rule_id], rule_id
+
+    def predict_reaction_rules_batch(
+        self, retrons: List[Retron], reaction_rules: List[Reactor]
+    ) -> List[List[Tuple[float, Reactor, int]]]:
+        """The policy function predicts the lists of reaction rules for a batch
+        of retrons with a single forward pass of the policy network.
+
+        :param retrons: The list of retrons for which the reaction rules
+            are predicted.
+        :param reaction_rules: The list of reaction rules from which
+            applicable reaction rules are predicted and selected.
+        :return: The list (one per retron, in the same order) of lists
+            with the predicted probability for the reaction rule,
+            reaction rule and reaction rule id.
+        """
+
+        all_ranked_rules = [self._get_cached(retron) for retron in retrons]
+        not_cached = [i for i, rules in enumerate(all_ranked_rules) if rules is None]
+
+        if self.exported:
+            predicted_rules = self._predict_exported(
+                [retrons[i].molecule for i in not_cached]
+            )
+            for i, ranked_rules in zip(not_cached, predicted_rules):
+                all_ranked_rules[i] = ranked_rules
+            pyg_batch = None
+        else:
+            pyg_batch, graph_ids = mols_to_pyg_batch(
+                [retrons[i].molecule for i in not_cached], canonicalize=False
+            )
+            graph_ids = [not_cached[i] for i in graph_ids]
+
+        if pyg_batch is not None:
+            for graph_id, ranked_rules in zip(
+                graph_ids, self._predict_graphs(pyg_batch)
+            ):
+                all_ranked_rules[graph_id] = ranked_rules
+            del pyg_batch
+
+        for i in not_cached:
+            if all_ranked_rules[i] is None:  # molecule can not be converted to graph
+                all_ranked_rules[i] = []
+            self._put_cached(retrons[i], all_ranked_rules[i])
+
+        return [
+            [
+                (prob, reaction_rules[rule_id], rule_id)
+                for prob, rule_id in ranked_rules
+                if prob > self.config.rule_prob_threshold
+            ]
+            for ranked_rules in all_ranked_rules
+        ]
+
+    @staticmethod
+    def _load_checkpoint(weights_path: str) -> Module:
+        """Loads the policy network from the PyTorch Lightning checkpoint.
+
+        :param weights_path: The path to the checkpoint.
+        :return: The policy network.
+        """
+
+        # imported here, so the exported network is used without PyTorch Lightning
+        from SynTool.ml.networks.policy import PolicyNetwork
+
+        return PolicyNetwork.load_from_checkpoint(
+            weights_path, map_location=torch.device("cpu"), batch_size=1, dropout=0
+        )
+
+    def _predict_graphs(self, pyg_batch: Batch) -> List[List[Tuple[float, int]]]:
+        """Predicts the reaction rules for the batch of graphs with the policy
+        network loaded from the checkpoint.
+
+        :param pyg_batch: The batch of molecular graphs (or a single
+            graph).
+        :return: The list (one per graph) of lists of the predicted
+            probability and reaction rule id.
+        """
+
+        with torch.no_grad():
+            x = self.policy_net.embed(pyg_batch)
+        return self._rank_embeddings(x)
+
+    def _rank_embeddings(self, x: Tensor) -> List[List[Tuple[float, int]]]:
+        """Predicts the reaction rules from the graph embeddings. Only the
+        logits of the output layers are calculated, and the activation is
+        applied to the selected reaction rules (see _rank_rules). With the
+        reaction rules index, the logits are calculated only for the
+        candidate reaction rules found in the index.
+
+        :param x: The graph embeddings.
+        :return: The list (one per graph embedding) of lists of the
+            predicted probability and reaction rule id.
+        """
+
+        with torch.no_grad():
+            if self.rule_indexes is None:
+                y = self.policy_net.y_predictor(x)
+                priority = None
+                if self.policy_type == "filtering":
+                    priority = self.policy_net.priority_predictor(x)
+                return [
+                    self._rank_rules(
+                        y[row], priority[row] if priority is not None else None
+                    )
+                    for row in range(len(x))
+                ]
+
+            all_ranked_rules = []
+            for x_row in x:
+                candidates = [
+                    index.candidates(x_row, self.config.top_rules)
+                    for index in self.rule_indexes
+                ]
+                rule_ids = torch.unique(torch.cat([ids for ids, _ in candidates]))
+                logits = [index.logits(x_row, rule_ids) for index in self.rule_indexes]
+                all_ranked_rules.append(
+                    self._rank_rules(
+                        logits[0],
+                        logits[1] if len(logits) > 1 else None,
+                        rule_ids=rule_ids,
+                        rest_logsumexp=candidates[0][1],
+                    )
+                )
+            return all_ranked_rules
+
+    def _predict_exported(
+        self, molecules: List[MoleculeContainer]
+    ) -> List[Optional[List[Tuple[float, int]]]]:
+        """Predicts the reaction rules for a batch of molecules with a single
+        forward pass of the exported policy network.
+
+        :param molecules: The molecules of the retrons.
+        :return: The list (one per molecule, in the same order) of lists
+            of the predicted probability and reaction rule id (None if the
+            molecule can not be converted to graph).
+        """
+
+        all_ranked_rules = [None] * len(molecules)
+
+        arrays, graph_ids = mols_to_batch_arrays(molecules, canonicalize=False)
+        if arrays is None:
+            return all_ranked_rules
+
+        x, edge_index, batch, _ = arrays
+        with torch.no_grad():
+            outputs = self.policy_net(
+                torch.from_numpy(x),
+                torch.from_numpy(edge_index),
+                torch.from_numpy(batch),
+                len(graph_ids),
+            )
+        probs = outputs[0]
+        priority = outputs[1] if self.policy_type == "filtering" else None
+
+        for row, graph_id in enumerate(graph_ids):
+            all_ranked_rules[graph_id] = self._rank_rules(
+                probs[row],
+                priority[row] if priority is not None else None,
+                probabilities=True,
+            )
+
+        return all_ranked_rules
+
+    def _rank_rules(
+        self,
+        y: Tensor,
+        priority: Optional[Tensor] = None,
+        probabilities: bool = False,
+        rule_ids: Optional[Tensor] = None,
+        rest_logsumexp: Optional[Tensor] = None,
+    ) -> List[Tuple[float, int]]:
+        """Selects the top reaction rules for a single retron with the partial
+        sort (top-k) instead of sorting all the reaction rules. For the ranking
+        policy, the reaction rules with the highest logits are selected, and
+        the softmax is applied only to them (with the log-sum-exp of all the
+        logits). For the filtering policy, the reaction rules with the
+        highest blended probabilities are selected (see _top_blended).
+
+        :param y: The predicted logits (or probabilities) of reaction
+            rules.
+        :param priority: The predicted logits (or probabilities) of
+            priority reaction rules (only for filtering policy).
+        :param probabilities: If True, the predictions are the
+            probabilities (the outputs of the exported network).
+        :param rule_ids: The ids of the reaction rules of the predictions,
+            if they are given only for the candidate reaction rules.
+        :param rest_logsumexp: The (estimated) log-sum-exp of the logits
+            of the reaction rules out of the candidates, with which the
+            probabilities of the ranking policy are normalized.
+        :return: The list of the predicted probability and reaction rule
+            id sorted by the probability.
+        """
+
+        top_rules = min(self.config.top_rules, len(y))
+        if self.policy_type == "ranking":
+            top_probs, top_ids = torch.topk(y, top_rules)
+            top_probs = top_probs.double()
+            if not probabilities:
+                log_norm = torch.logsumexp(y, -1)
+                if rest_logsumexp is not None:
+                    log_norm = torch.logaddexp(log_norm, rest_logsumexp)
+                top_probs = torch.exp(top_probs - log_norm.double())
+        else:
+            top_probs, top_ids = self._top_blended(
+                y, priority, top_rules, probabilities
+            )
+            top_probs = torch.softmax(top_probs, -1)
+
+        if rule_ids is not None:
+            top_ids = rule_ids[top_ids]
+
+        return list(zip(top_probs.tolist(), top_ids.tolist()))
+
+    def _top_blended(
+        self, y: Tensor, priority: Tensor, top_rules: int, probabilities: bool
+    ) -> Tuple[Tensor, Tensor]:
+        """Selects the reaction rules with the highest blended probabilities of
+        the filtering policy. If only one of the outputs is blended, the blend
+        is monotonic in its logits, and the reaction rules are selected before
+        the sigmoid is applied. Otherwise, the blend is calculated for all the
+        reaction rules (the exact pruning of the reaction rules by the bound
+        of the blend is not faster than the vectorized blend).
+
+        :param y: The predicted logits (or probabilities) of reaction
+            rules.
+        :param priority: The predicted logits (or probabilities) of
+            priority reaction rules.
+        :param top_rules: The number of selected reaction rules.
+        :param probabilities: If True, the predictions are the
+            probabilities.
+        :return: The blended probabilities and the ids of the selected
+            reaction rules sorted by the probability.
+        """
+
+        priority_coef = self.config.priority_rules_fraction
+        if priority_coef in (0, 1):
+            top_ids = torch.topk(y if priority_coef == 0 else priority, top_rules)[1]
+            top_probs = self._blend(y[top_ids], priority[top_ids], probabilities)
+            return top_probs, top_ids
+
+        return torch.topk(self._blend(y, priority, probabilities), top_rules)
+
+    def _blend(self, y: Tensor, priority: Tensor, probabilities: bool) -> Tensor:
+        """Blends the probabilities of the regular and priority reaction rules
+        of the filtering policy.
+
+        :param y: The predicted logits (or probabilities) of reaction
+            rules.
+        :param priority: The predicted logits (or probabilities) of
+            priority reaction rules.
+        :param probabilities: If True, the predictions are the
+            probabilities.
+        :return: The blended probabilities.
+        """
+
+        if not probabilities:
+            y, priority = torch.sigmoid(y), torch.sigmoid(priority)
+        priority_coef = self.config.priority_rules_fraction
+        return (1 - priority_coef) * y.double() + priority_coef * priority.double()
+
+    def _get_cached(self, retron: Retron) -> Optional[List[Tuple[float, int]]]:
+        """Returns the reaction rules predicted earlier for the given retron.
+
+        :param retron: The retron for which the reaction rules are
+            predicted.
+        :return: The list of the predicted probability and reaction rule
+            id, or None if the retron is not in the cache.
+        """
+
+        if self.cache is None:
+            return None
+
+        key = str(retron)
+        ranked_rules = self.cache.get(key)
+        if ranked_rules is None:
+            self.cache_misses += 1
+        else:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+
+        return ranked_rules
+
+    def _put_cached(self, retron: Retron, ranked_rules: List[Tuple[float, int]]):
+        """Stores the predicted reaction rules for the given retron in the
+        cache, removing the least recently used retron if the cache is full.
+
+        :param retron: The retron for which the reaction rules are
+            predicted.
+        :param ranked_rules: The list of the predicted probability and
+            reaction rule id.
+        :return: None.
+        """
+
+        if self.cache is None:
+            return
+
+        self.cache[str(retron)] = ranked_rules
+        if len(self.cache) > self.config.cache_size:
+            self.cache.popitem(last=False)
+
+    def cache_settings(self) -> Dict[str, Any]:
+        """Returns the policy settings the cached predictions depend on."""
+
+        return {
+            "weights_path": os.path.abspath(self.config.weights_path),
+            "exported": self.exported,
+            "quantize": self.config.quantize,
+            "top_rules": self.config.top_rules,
+            "priority_rules_fraction": self.config.priority_rules_fraction,
+            "mips_clusters": self.config.mips_clusters,
+            "mips_probes": self.config.mips_probes if self.config.mips_clusters else 0,
+        }
+
+    def load_cache(self, cache_path: str) -> None:
+        """Loads the predicted reaction rules saved by the previous runs. The
+        saved predictions are ignored if they were obtained with another
+        policy network or selection settings.
+
+        :param cache_path: The path to the file with the saved
+            predictions.
+        :return: None.
+        """
+
+        with open(cache_path, "rb") as f:
+            saved_cache = pickle.load(f)
+
+        if saved_cache["settings"] != self.cache_settings():
+            return
+
+        for key, ranked_rules in saved_cache["predictions"].items():
+            self.cache[key] = ranked_rules
+            if len(self.cache) > self.config.cache_size:
+                self.cache.popitem(last=False)
+
+    def save_cache(self, cache_path: str = None) -> None:
+        """Saves the predicted reaction rules, so they can be reused by other
+        runs. The predictions already stored in the file are kept and updated.
+
+        :param cache_path: The path to the file with the saved
+            predictions. If None, the cache_path from the policy
+            configuration is used.
+        :return: None.
+        """
+
+        cache_path = cache_path or self.config.cache_path
+        if self.cache is None or not cache_path:
+            return
+
+        predictions = OrderedDict()
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                saved_cache = pickle.load(f)
+            if saved_cache["settings"] == self.cache_settings():
+                predictions.update(saved_cache["predictions"])
+
+        for key, ranked_rules in self.cache.items():
+            predictions.pop(key, None)
+            predictions[key] = ranked_rules
+        while len(predictions) > self.config.cache_size:
+            predictions.popitem(last=False)
+
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"settings": self.cache_settings(), "predictions": predictions}, f
+            )
+        os.replace(tmp_path, cache_path)
@@ -4,6 +4,8 @@
 class Node:
     """Node class represents a node in the tree search."""
 
+    __slots__ = ("retrons_to_expand", "new_retrons", "curr_retron", "next_retrons")
+
     def __init__(
         self, retrons_to_expand: tuple = None, new_retrons: tuple = None
     ) -> None:
@@ -3,25 +3,113 @@ molecules."""
 
 import csv
 import json
+import logging
 import os.path
 from pathlib import Path
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
+import ray
 from CGRtools import smiles
+from CGRtools.reactor.reactor import Reactor
+from ray.util import ActorPool
 from tqdm import tqdm
 
-from SynTool.mcts.evaluation import ValueNetworkFunction
+from SynTool.chem.reaction import ReactionRuleCache
+from SynTool.mcts.andor import AndOrGraph
+from SynTool.mcts.evaluation import (PolicyValueNetworkFunction,
+                                     ValueNetworkFunction)
 from SynTool.mcts.expansion import PolicyNetworkFunction
 from SynTool.mcts.tree import Tree, TreeConfig
 from SynTool.utils.config import PolicyNetworkConfig
 from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+from SynTool.utils.retron_memo import RetronMemo
 from SynTool.utils.visualisation import extract_routes, generate_results_html
 
 
-def extract_tree_stats(tree, target):
+def load_search_functions(
+    tree_config: TreeConfig,
+    policy_config: PolicyNetworkConfig,
+    value_network_path: Optional[str] = None,
+) -> Tuple[PolicyNetworkFunction, Optional[ValueNetworkFunction]]:
+    """Loads the expansion and evaluation functions of the tree search. If the
+    policy network has the value head (policy_config.value_head), the same
+    policy and value function is used for the expansion and the evaluation.
+
+    :param tree_config: The tree search configuration.
+    :param policy_config: The policy network configuration.
+    :param value_network_path: The path to the file containing value
+        weights (not used with the value head of the policy network).
+    :return: The expansion function and the evaluation function (None if
+        the nodes are not evaluated with the value network).
+    """
+
+    if policy_config.value_head:
+        policy_function = PolicyValueNetworkFunction(policy_config=policy_config)
+    else:
+        policy_function = PolicyNetworkFunction(policy_config=policy_config)
+
+    value_function = None
+    if tree_config.evaluation_type == "gcn":
+        if policy_config.value_head:
+            value_function = policy_function
+        else:
+            value_function = ValueNetworkFunction(
+                weights_path=value_network_path,
+                graph_cache_size=tree_config.graph_cache_size,
+            )
+
+    return policy_function, value_function
+
+
+def load_retron_memo(
+    retron_memo_path: Optional[str],
+    tree_config: TreeConfig,
+    policy_function: PolicyNetworkFunction,
+    reaction_rules_path: str,
+    building_blocks_path: str,
+) -> Optional[RetronMemo]:
+    """Opens the retron memo with the settings of the search its records
+    depend on: the policy function settings and the probability threshold of
+    the predicted reaction rules (they decide which reaction rules are applied
+    to the retrons), the reaction rules and building blocks files (the path and
+    the modification time) and the minimal size of the molecules to be
+    expanded. The records of the memo obtained with other settings are
+    removed.
+
+    :param retron_memo_path: The path to the retron memo database. If
+        None, the retron memo is not used.
+    :param tree_config: The tree search configuration.
+    :param policy_function: The policy function of the search.
+    :param reaction_rules_path: The path to the file containing reaction
+        rules.
+    :param building_blocks_path: The path to the file containing
+        building blocks.
+    :return: The retron memo or None.
+    """
+
+    if not retron_memo_path:
+        return None
+
+    settings = {
+        "policy": policy_function.cache_settings(),
+        "rule_prob_threshold": policy_function.config.rule_prob_threshold,
+        "min_mol_size": tree_config.min_mol_size,
+    }
+    for name, path in (
+        ("reaction_rules", reaction_rules_path),
+        ("building_blocks", building_blocks_path),
+    ):
+        settings[name] = [os.path.abspath(path), os.path.getmtime(path)]
+
+    return RetronMemo(retron_memo_path, settings=settings)
+
+
+def extract_tree_stats(tree: Union[Tree, AndOrGraph], target):
     """Collects various statistics from a tree and returns them in a dictionary
     format.
 
-    :param tree: The built search tree.
+    :param tree: The built search tree (or AND-OR graph).
     :param target: The target molecule associated with the tree.
     :return: A dictionary with the calculated statistics.
     """
@@ -31,6 +119,19 @@ def extract_tree_stats(tree, target):
         target = smiles(target)
         target.meta["init_smiles"] = target_smi
 
+    if isinstance(tree, AndOrGraph):  # the graph can not be written in newick format
+        return {
+            "target_smiles": target.meta["init_smiles"],
+            "num_routes": tree.count_routes(tree.config.max_routes or None),
+            "num_nodes": len(tree),
+            "num_iter": tree.curr_iteration,
+            "first_solution_iter": tree.first_solution_iteration,
+            "search_time": round(tree.curr_time, 1),
+            "newick_tree": "",
+            "newick_meta": "",
+            "debug_info": "IS_SOLVED" if tree.solved else "NOT_SOLVED",
+        }
+
     newick_tree, newick_meta = tree.newickify(visits_threshold=0)
     newick_meta_line = ";".join(
         [f"{nid},{v[0]},{v[1]},{v[2]}" for nid, v in newick_meta.items()]
@@ -46,6 +147,7 @@ def extract_tree_stats(tree, target):
         "num_routes": len(tree.winning_nodes),
         "num_nodes": len(tree),
         "num_iter": tree.curr_iteration,
+        "first_solution_iter": tree.first_solution_iteration,
         "search_time": round(tree.curr_time, 1),
         "newick_tree": newick_tree,
         "newick_meta": newick_meta_line,
@@ -53,6 +155,229 @@ def extract_tree_stats(tree, target):
     }
 
 
+def search_target(
+    target_id: int,
+    target_smi: str,
+    tree_config: TreeConfig,
+    reaction_rules: List[Reactor],
+    building_blocks: Set[str],
+    policy_function: PolicyNetworkFunction,
+    value_function: ValueNetworkFunction = None,
+    routes_folder: str = None,
+    reaction_cache: ReactionRuleCache = None,
+    retron_memo: RetronMemo = None,
+    time_budget: float = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], bool]:
+    """Performs a tree search for a single target molecule and collects its
+    results.
+
+    :param target_id: The index of the target molecule in the targets
+        file.
+    :param target_smi: The SMILES of the target molecule.
+    :param tree_config: The tree search configuration.
+    :param reaction_rules: The loaded reaction rules.
+    :param building_blocks: The loaded building blocks.
+    :param policy_function: The loaded policy function.
+    :param value_function: The loaded value function (optional).
+    :param routes_folder: The path to the folder where the html file
+        with the found routes will be saved.
+    :param reaction_cache: The cache of reaction rules application
+        results shared between the target molecules.
+    :param retron_memo: The memo of the solved and dead retrons shared
+        between the target molecules (used only by the tree). The routes
+        found for the target are added to it.
+    :param time_budget: The wall-clock time (in seconds) given to the
+        target molecule, including the initialization of the tree. The
+        search is stopped when it is exceeded, even in the middle of the
+        iteration (optional).
+    :return: The tree search statistics, the extracted routes and
+        whether the target is solved.
+    """
+
+    deadline = time() + time_budget if time_budget is not None else None
+    try:
+        if tree_config.search_engine == "and_or":
+            tree = AndOrGraph(
+                target=target_smi,
+                config=tree_config,
+                reaction_rules=reaction_rules,
+                building_blocks=building_blocks,
+                expansion_function=policy_function,
+                reaction_cache=reaction_cache,
+                deadline=deadline,
+            )
+        else:
+            tree = Tree(
+                target=target_smi,
+                config=tree_config,
+                reaction_rules=reaction_rules,
+                building_blocks=building_blocks,
+                expansion_function=policy_function,
+                evaluation_function=value_function,
+                reaction_cache=reaction_cache,
+                retron_memo=retron_memo,
+                deadline=deadline,
+            )
+
+        _ = list(tree)
+
+        # save routes
+        if routes_folder is not None and isinstance(tree, Tree):
+            generate_results_html(
+                tree,
+                os.path.join(routes_folder, f"retroroutes_target_{target_id}.html"),
+                extended=True,
+            )
+
+        routes = extract_routes(tree)
+        solved = (
+            tree.solved if isinstance(tree, AndOrGraph) else bool(tree.winning_nodes)
+        )
+        stats = {"target_id": target_id, **extract_tree_stats(tree, target_smi)}
+
+    except Exception as e:
+        routes = [
+            {
+                "type": "mol",
+                "smiles": target_smi,
+                "in_stock": False,
+                "children": [],
+            }
+        ]
+        stats = {
+            "target_id": target_id,
+            "target_smiles": target_smi,
+            "debug_info": str(e),
+        }
+        return stats, routes, False
+
+    # save the solved retrons for the next target molecules
+    if retron_memo is not None:
+        if solved:
+            retron_memo.add_routes(routes)
+        retron_memo.flush()
+
+    return stats, routes, solved
+
+
+@ray.remote
+class SearchWorker:
+    """Worker process for the parallel tree search. Reaction rules, building
+    blocks and policy/value functions are loaded once per worker."""
+
+    def __init__(
+        self,
+        tree_config: TreeConfig,
+        policy_config: PolicyNetworkConfig,
+        reaction_rules_path: str,
+        building_blocks_path: str,
+        value_network_path: str = None,
+        routes_folder: str = None,
+        retron_memo_path: str = None,
+        time_budget: float = None,
+    ) -> None:
+        """Initializes the worker and loads the data needed for the tree
+        search.
+
+        :param tree_config: The tree search configuration.
+        :param policy_config: The policy network configuration.
+        :param reaction_rules_path: The path to the file containing
+            reaction rules.
+        :param building_blocks_path: The path to the file containing
+            building blocks.
+        :param value_network_path: The path to the file containing value
+            weights (optional).
+        :param routes_folder: The path to the folder where the html files
+            with the found routes will be saved.
+        :param retron_memo_path: The path to the retron memo database
+            (optional).
+        :param time_budget: The wall-clock time (in seconds) given to
+            each target molecule (optional).
+        """
+
+        self.tree_config = tree_config
+        self.routes_folder = routes_folder
+
+        self.policy_function, self.value_function = load_search_functions(
+            tree_config, policy_config, value_network_path
+        )
+
+        self.reaction_rules = load_reaction_rules(reaction_rules_path)
+        self.building_blocks = load_building_blocks(building_blocks_path)
+        self.reaction_cache = (
+            ReactionRuleCache(tree_config.reaction_cache_size)
+            if tree_config.reaction_cache_size > 0
+            else None
+        )
+        self.retron_memo = load_retron_memo(
+            retron_memo_path,
+            tree_config,
+            self.policy_function,
+            reaction_rules_path,
+            building_blocks_path,
+        )
+        self.time_budget = time_budget
+
+    def search(
+        self, target_id: int, target_smi: str
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], bool]:
+        """Performs a tree search for the given target molecule.
+
+        :param target_id: The index of the target molecule in the targets
+            file.
+        :param target_smi: The SMILES of the target molecule.
+        :return: The tree search statistics, the extracted routes and
+            whether the target is solved.
+        """
+
+        return search_target(
+            target_id,
+            target_smi,
+            tree_config=self.tree_config,
+            reaction_rules=self.reaction_rules,
+            building_blocks=self.building_blocks,
+            policy_function=self.policy_function,
+            value_function=self.value_function,
+            routes_folder=self.routes_folder,
+            reaction_cache=self.reaction_cache,
+            retron_memo=self.retron_memo,
+            time_budget=self.time_budget,
+        )
+
+    def save_cache(self) -> None:
+        """Saves the reaction rules predicted by the policy function of the
+        worker, so they can be shared with other workers and runs."""
+
+        self.policy_function.save_cache()
+
+
+def load_completed_targets(routes_file: Path) -> Dict[int, bool]:
+    """Reads the routes file of the interrupted tree search and returns the
+    completed targets. The incomplete record written at the moment of the
+    interruption is removed from the file.
+
+    :param routes_file: The path to the JSON Lines file with the
+        extracted routes.
+    :return: The dictionary of the completed target ids and whether they
+        are solved.
+    """
+
+    completed_targets, records = {}, []
+    with open(routes_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # incomplete record
+                break
+            completed_targets[record["target_id"]] = record["solved"]
+            records.append(line.rstrip("\n"))
+
+    with open(routes_file, "w", encoding="utf-8") as f:
+        f.writelines(f"{record}\n" for record in records)
+
+    return completed_targets
+
+
 def run_search(
     targets_path: str,
     search_config: dict,
@@ -61,6 +386,10 @@ def run_search(
     building_blocks_path: str,
     value_network_path: str = None,
     results_root: str = "search_results",
+    num_cpus: int = 1,
+    resume: bool = False,
+    retron_memo_path: str = None,
+    time_budget: float = None,
 ) -> None:
     """Performs a tree search on a set of target molecules using specified
     configuration and reaction rules, logging the results and statistics.
@@ -79,6 +408,21 @@ def run_search(
         weights (optional).
     :param results_root: The name of the folder where the results of the
         tree search will be saved.
+    :param num_cpus: The number of worker processes for the tree search.
+        If more than 1, the target molecules are planned in parallel and
+        the results are gathered in the order of targets.
+    :param resume: If True, the target molecules already present in the
+        results of the interrupted tree search are skipped, and the new
+        results are appended to them.
+    :param retron_memo_path: The path to the retron memo database
+        (created if it does not exist). The retrons solved in the
+        previous searches (of this and the previous runs) are treated as
+        building blocks, and their routes are added to the extracted
+        routes. The records obtained with other reaction rules, building
+        blocks or policy network are removed.
+    :param time_budget: The wall-clock time (in seconds) given to each
+        target molecule. The search of the target is stopped when it is
+        exceeded, even in the middle of the iteration (optional).
     :return: None.
     """
 
@@ -89,100 +433,147 @@ def run_search(
 
     # output files
     stats_file = results_root.joinpath("tree_search_stats.csv")
-    routes_file = results_root.joinpath("extracted_routes.json")
+    routes_file = results_root.joinpath("extracted_routes.jsonl")
     routes_folder = results_root.joinpath("extracted_routes_html")
     routes_folder.mkdir(exist_ok=True)
 
     # stats header
     stats_header = [
+        "target_id",
         "target_smiles",
         "num_routes",
         "num_nodes",
         "num_iter",
+        "first_solution_iter",
         "search_time",
         "newick_tree",
         "newick_meta",
         "debug_info",
     ]
 
-    # config
-    policy_function = PolicyNetworkFunction(policy_config=policy_config)
-    if search_config["evaluation_type"] == "gcn":
-        value_function = ValueNetworkFunction(weights_path=value_network_path)
-    else:
-        value_function = None
+    tree_config = TreeConfig.from_dict(search_config)
+    tree_config.silent = True
+
+    with open(targets_path, "r", encoding="utf-8") as targets:
+        targets = [target_smi.strip() for target_smi in targets]
+
+    # completed targets of the interrupted search
+    completed_targets, stats_rows = {}, []
+    if resume and routes_file.exists():
+        completed_targets = load_completed_targets(routes_file)
+        if stats_file.exists():
+            with open(stats_file, "r", encoding="utf-8") as csvfile:
+                stats_rows = [
+                    row
+                    for row in csv.DictReader(csvfile)
+                    if int(row.get("target_id") or -1) in completed_targets
+                ]
+        print(f"Number of completed target molecules: {len(completed_targets)}")
+    elif routes_file.exists():
+        routes_file.unlink()
 
-    reaction_rules = load_reaction_rules(reaction_rules_path)
-    building_blocks = load_building_blocks(building_blocks_path)
+    targets = [
+        (ti, target_smi)
+        for ti, target_smi in enumerate(targets)
+        if ti not in completed_targets
+    ]
 
     # run search
-    n_solved = 0
-    extracted_routes = []
+    if num_cpus > 1:
+        ray.init(
+            num_cpus=num_cpus, ignore_reinit_error=True, logging_level=logging.ERROR
+        )
+        workers = [
+            SearchWorker.remote(
+                tree_config,
+                policy_config,
+                reaction_rules_path,
+                building_blocks_path,
+                value_network_path,
+                str(routes_folder),
+                retron_memo_path,
+                time_budget,
+            )
+            for _ in range(num_cpus)
+        ]
+        search_results = ActorPool(workers).map(
+            lambda worker, target: worker.search.remote(*target), targets
+        )
+    else:
+        policy_function, value_function = load_search_functions(
+            tree_config, policy_config, value_network_path
+        )
 
-    tree_config = TreeConfig.from_dict(search_config)
-    tree_config.silent = True
-    with open(targets_path, "r", encoding="utf-8") as targets, open(
-        stats_file, "w", encoding="utf-8", newline="\n"
-    ) as csvfile:
+        reaction_rules = load_reaction_rules(reaction_rules_path)
+        building_blocks = load_building_blocks(building_blocks_path)
+        reaction_cache = (
+            ReactionRuleCache(tree_config.reaction_cache_size)
+            if tree_config.reaction_cache_size > 0
+            else None
+        )
+        retron_memo = load_retron_memo(
+            retron_memo_path,
+            tree_config,
+            policy_function,
+            reaction_rules_path,
+            building_blocks_path,
+        )
+
+        search_results = (
+            search_target(
+                ti,
+                target_smi,
+                tree_config=tree_config,
+                reaction_rules=reaction_rules,
+                building_blocks=building_blocks,
+                policy_function=policy_function,
+                value_function=value_function,
+                routes_folder=routes_folder,
+                reaction_cache=reaction_cache,
+                retron_memo=retron_memo,
+                time_budget=time_budget,
+            )
+            for ti, target_smi in targets
+        )
+
+    n_solved = sum(completed_targets.values())
+    with open(stats_file, "w", encoding="utf-8", newline="\n") as csvfile, open(
+        routes_file, "a", encoding="utf-8"
+    ) as routesfile:
 
         statswriter = csv.DictWriter(csvfile, delimiter=",", fieldnames=stats_header)
         statswriter.writeheader()
+        statswriter.writerows(stats_rows)
 
-        for ti, target_smi in tqdm(
-            enumerate(targets),
+        for tree_stats, routes, solved in tqdm(
+            search_results,
             leave=True,
             desc="Number of target molecules processed: ",
             bar_format="{desc}{n} [{elapsed}]",
         ):
-            target_smi = target_smi.strip()
-            try:
-                # run search
-                tree = Tree(
-                    target=target_smi,
-                    config=tree_config,
-                    reaction_rules=reaction_rules,
-                    building_blocks=building_blocks,
-                    expansion_function=policy_function,
-                    evaluation_function=value_function,
-                )
-
-                _ = list(tree)
-
-            except Exception as e:
-                extracted_routes.append(
-                    [
-                        {
-                            "type": "mol",
-                            "smiles": target_smi,
-                            "in_stock": False,
-                            "children": [],
-                        }
-                    ]
-                )
-                statswriter.writerow({"target_smiles": target_smi, "debug_info": e})
-
-                csvfile.flush()
-                continue
-
             # is solved
-            n_solved += bool(tree.winning_nodes)
-
-            # extract routes
-            extracted_routes.append(extract_routes(tree))
-
-            # save routes
-            generate_results_html(
-                tree,
-                os.path.join(routes_folder, f"retroroutes_target_{ti}.html"),
-                extended=True,
-            )
+            n_solved += solved
 
             # save stats
-            statswriter.writerow(extract_tree_stats(tree, target_smi))
+            statswriter.writerow(tree_stats)
             csvfile.flush()
 
-            # save json routes
-            with open(routes_file, "w", encoding="utf-8") as f:
-                json.dump(extracted_routes, f)
+            # save routes (the target is completed when its routes are saved)
+            routes_record = {
+                "target_id": tree_stats["target_id"],
+                "target_smiles": tree_stats["target_smiles"],
+                "solved": bool(solved),
+                "routes": routes,
+            }
+            routesfile.write(json.dumps(routes_record) + "\n")
+            routesfile.flush()
+
+    # save policy predictions
+    if num_cpus > 1:
+        for worker in workers:  # one by one, each worker updates the saved cache
+            ray.get(worker.save_cache.remote())
+        ray.shutdown()
+    else:
+        policy_function.save_cache()
 
     print(f"Number of solved target molecules: {n_solved}")
@@ -0,0 +1,324 @@
+"""Module containing a class TreeStorage that stores the nodes of the search
+tree and their statistics in the growable arrays."""
+
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Type, Union
+
+import numpy as np
+
+from SynTool.mcts.node import Node
+
+
+class TreeStorage:
+    """Struct-of-arrays storage of the search tree.
+
+    The node statistics are kept in the NumPy arrays indexed by the node
+    id, and the child lists are kept in the CSR style: the ids of the
+    children of the node are stored contiguously in the edges array
+    starting from the child_starts position of the node. The children
+    created by a single expansion have consecutive ids, so their
+    statistics can be read as the slices of the node arrays. The node id
+    0 is reserved for the parent of the root node.
+
+    A node can be linked to several parent nodes (the search tree becomes
+    a directed acyclic graph). The parents array keeps the first parent
+    of the node, and the other parents are kept in extra_parents.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        """Initializes an empty tree storage.
+
+        :param capacity: The initial number of nodes the arrays are
+            allocated for. The arrays are grown automatically.
+        """
+
+        self.size = 1  # the next node id
+        self.edges_size = 0  # the number of stored edges
+
+        self.nodes: List[Optional[Node]] = [None]
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.virtual_losses = np.zeros(capacity, dtype=np.int32)
+        self.total_values = np.zeros(capacity, dtype=np.float64)
+        self.init_values = np.zeros(capacity, dtype=np.float64)
+        self.probs = np.zeros(capacity, dtype=np.float64)
+        self.depths = np.zeros(capacity, dtype=np.int16)
+        self.parents = np.zeros(capacity, dtype=np.int32)
+        self.rules = np.full(capacity, -1, dtype=np.int32)
+        self.child_starts = np.zeros(capacity, dtype=np.int64)
+        self.child_counts = np.zeros(capacity, dtype=np.int32)
+        self.consecutive_children = np.ones(capacity, dtype=bool)
+        self.edges = np.zeros(capacity, dtype=np.int32)
+        self.extra_parents: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        """Returns the number of nodes in the storage."""
+        return self.size - 1
+
+    @staticmethod
+    def _grown(array: np.ndarray, fill_value: Any = 0) -> np.ndarray:
+        """Returns a twice larger copy of the array.
+
+        :param array: The array to be grown.
+        :param fill_value: The value of the new elements.
+        :return: The grown array.
+        """
+
+        grown_array = np.full(2 * len(array), fill_value, dtype=array.dtype)
+        grown_array[: len(array)] = array
+        return grown_array
+
+    def _grow_nodes(self) -> None:
+        """Doubles the capacity of the node arrays."""
+
+        self.visits = self._grown(self.visits)
+        self.virtual_losses = self._grown(self.virtual_losses)
+        self.total_values = self._grown(self.total_values)
+        self.init_values = self._grown(self.init_values)
+        self.probs = self._grown(self.probs)
+        self.depths = self._grown(self.depths)
+        self.parents = self._grown(self.parents)
+        self.rules = self._grown(self.rules, fill_value=-1)
+        self.child_starts = self._grown(self.child_starts)
+        self.child_counts = self._grown(self.child_counts)
+        self.consecutive_children = self._grown(
+            self.consecutive_children, fill_value=True
+        )
+
+    def add_node(
+        self,
+        node: Node,
+        parent_id: int = 0,
+        prob: float = 0.0,
+        rule_id: int = -1,
+        depth: int = 0,
+    ) -> int:
+        """Adds a new node to the storage and links it to the parent node.
+
+        :param node: The new node.
+        :param parent_id: The id of the parent node (0 for the root
+            node).
+        :param prob: The probability of the reaction rule that leads to
+            the node predicted by the policy function.
+        :param rule_id: The id of the reaction rule that leads to the
+            node.
+        :param depth: The depth of the node in the tree.
+        :return: The id of the new node.
+        """
+
+        node_id = self.size
+        if node_id == len(self.visits):
+            self._grow_nodes()
+
+        self.nodes.append(node)
+        self.probs[node_id] = prob
+        self.rules[node_id] = rule_id
+        self.depths[node_id] = depth
+        self.parents[node_id] = parent_id
+        self.size += 1
+
+        if parent_id:
+            self.add_edge(parent_id, node_id)
+
+        return node_id
+
+    def add_edge(self, parent_id: int, child_id: int) -> None:
+        """Appends the child node to the child list of the parent node. The
+        child list is moved to the end of the edges array if it is not the last
+        one.
+
+        :param parent_id: The id of the parent node.
+        :param child_id: The id of the child node.
+        :return: None.
+        """
+
+        start, count = self.child_starts[parent_id], self.child_counts[parent_id]
+        if count and start + count != self.edges_size:  # move the child list
+            self._reserve_edges(count + 1)
+            self.edges[self.edges_size : self.edges_size + count] = self.edges[
+                start : start + count
+            ]
+            start = self.child_starts[parent_id] = self.edges_size
+            self.edges_size += count
+        elif not count:
+            start = self.child_starts[parent_id] = self.edges_size
+
+        if count and self.edges[start + count - 1] + 1 != child_id:
+            self.consecutive_children[parent_id] = False
+
+        self._reserve_edges(1)
+        self.edges[start + count] = child_id
+        self.child_counts[parent_id] += 1
+        self.edges_size += 1
+
+    def add_parent(self, parent_id: int, child_id: int) -> None:
+        """Links the existing node to one more parent node.
+
+        :param parent_id: The id of the new parent node.
+        :param child_id: The id of the existing node.
+        :return: None.
+        """
+
+        self.extra_parents.setdefault(child_id, []).append(parent_id)
+        self.add_edge(parent_id, child_id)
+
+    def parent_ids(self, node_id: int) -> List[int]:
+        """Returns the ids of all the parents of the node (the first parent and
+        the extra parents).
+
+        :param node_id: The id of the node.
+        :return: The list of the parent node ids (empty for the root
+            node).
+        """
+
+        parent_id = int(self.parents[node_id])
+        if not parent_id:
+            return []
+        return [parent_id, *self.extra_parents.get(node_id, ())]
+
+    def ancestors(self, node_id: int) -> List[int]:
+        """Returns the ids of the node and all its ancestors up to the root
+        node. Each ancestor is returned once, even if it is reachable through
+        several parents.
+
+        :param node_id: The id of the node.
+        :return: The list of the node ids.
+        """
+
+        nodes_ids = []
+        if not self.extra_parents:  # the tree, the single chain of parents
+            while node_id:
+                nodes_ids.append(node_id)
+                node_id = self.parents[node_id]
+            return nodes_ids
+
+        visited, stack = {node_id}, [node_id]
+        while stack:
+            node_id = stack.pop()
+            nodes_ids.append(node_id)
+            for parent_id in self.parent_ids(node_id):
+                if parent_id not in visited:
+                    visited.add(parent_id)
+                    stack.append(parent_id)
+
+        return nodes_ids
+
+    def _reserve_edges(self, num_edges: int) -> None:
+        """Grows the edges array if it can not store the given number of new
+        edges.
+
+        :param num_edges: The number of the new edges.
+        :return: None.
+        """
+
+        while self.edges_size + num_edges > len(self.edges):
+            self.edges = self._grown(self.edges)
+
+    def children(self, node_id: int) -> np.ndarray:
+        """Returns the ids of the children of the given node.
+
+        :param node_id: The id of the node.
+        :return: The array of the child node ids.
+        """
+
+        start = self.child_starts[node_id]
+        return self.edges[start : start + self.child_counts[node_id]]
+
+    def children_index(self, node_id: int) -> Union[slice, np.ndarray]:
+        """Returns the index of the children of the given node in the node
+        arrays. It is a slice if the children have consecutive ids, so that
+        their statistics are read without copying.
+
+        :param node_id: The id of the node.
+        :return: The slice or the array of the child node ids.
+        """
+
+        if self.consecutive_children[node_id] and self.child_counts[node_id]:
+            first_child = self.edges[self.child_starts[node_id]]
+            return slice(first_child, first_child + self.child_counts[node_id])
+
+        return self.children(node_id)
+
+    def nbytes(self) -> int:
+        """Returns the memory (in bytes) used by the arrays of the storage."""
+
+        return sum(
+            array.nbytes
+            for array in (
+                self.visits,
+                self.virtual_losses,
+                self.total_values,
+                self.init_values,
+                self.probs,
+                self.depths,
+                self.parents,
+                self.rules,
+                self.child_starts,
+                self.child_counts,
+                self.consecutive_children,
+                self.edges,
+            )
+        )
+
+
+class NodesView(Mapping):
+    """Read-only mapping of the node ids to the nodes of the tree storage."""
+
+    def __init__(self, storage: TreeStorage) -> None:
+        """Initializes the view of the tree storage nodes.
+
+        :param storage: The tree storage.
+        """
+        self._storage = storage
+
+    def __getitem__(self, node_id: int) -> Node:
+        if not 0 < node_id < self._storage.size:
+            raise KeyError(node_id)
+        return self._storage.nodes[node_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(1, self._storage.size))
+
+    def __len__(self) -> int:
+        return len(self._storage)
+
+
+class ChildrenView(NodesView):
+    """Read-only mapping of the node ids to the lists of their child node
+    ids."""
+
+    def __getitem__(self, node_id: int) -> List[int]:
+        if not 0 < node_id < self._storage.size:
+            raise KeyError(node_id)
+        return self._storage.children(node_id).tolist()
+
+
+class NodesStatView(NodesView, MutableMapping):
+    """Mapping of the node ids to the values of one of the node statistics
+    arrays of the tree storage."""
+
+    def __init__(
+        self, storage: TreeStorage, array_name: str, value_type: Type = float
+    ) -> None:
+        """Initializes the view of the node statistics array.
+
+        :param storage: The tree storage.
+        :param array_name: The name of the statistics array in the tree
+            storage.
+        :param value_type: The type of the returned values.
+        """
+        super().__init__(storage)
+        self._array_name = array_name
+        self._value_type = value_type
+
+    def __getitem__(self, node_id: int) -> Any:
+        if not 0 < node_id < self._storage.size:
+            raise KeyError(node_id)
+        return self._value_type(getattr(self._storage, self._array_name)[node_id])
+
+    def __setitem__(self, node_id: int, value: Any) -> None:
+        if not 0 < node_id < self._storage.size:
+            raise KeyError(node_id)
+        getattr(self._storage, self._array_name)[node_id] = value
+
+    def __delitem__(self, node_id: int) -> None:
+        raise TypeError("Nodes can not be removed from the tree.")
@@ -2,24 +2,30 @@
 paths."""
 
 from collections import defaultdict, deque
-from math import sqrt
+from heapq import heappop, heappush
+from math import log, sqrt
 from random import choice, uniform
 from time import time
-from typing import Dict, List, Set, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
+import numpy as np
 from CGRtools import Reactor, smiles
 from CGRtools.containers import MoleculeContainer
 from tqdm.auto import tqdm
 
-from SynTool.chem.reaction import Reaction, apply_reaction_rule
-from SynTool.chem.retron import Retron
+from SynTool.chem.reaction import Reaction, ReactionRuleCache
+from SynTool.chem.retron import Retron, RetronChain
+from SynTool.mcts.base import SearchBase
 from SynTool.mcts.evaluation import ValueNetworkFunction
 from SynTool.mcts.expansion import PolicyNetworkFunction
 from SynTool.mcts.node import Node
+from SynTool.mcts.storage import (ChildrenView, NodesStatView, NodesView,
+                                  TreeStorage)
 from SynTool.utils.config import TreeConfig
+from SynTool.utils.retron_memo import RetronMemo
 
 
-class Tree:
+class Tree(SearchBase):
     """Tree class with attributes and methods for Monte-Carlo tree search."""
 
     def __init__(
@@ -30,6 +36,9 @@ class Tree:
         building_blocks: Set[str],
         expansion_function: PolicyNetworkFunction,
         evaluation_function: ValueNetworkFunction = None,
+        reaction_cache: ReactionRuleCache = None,
+        retron_memo: RetronMemo = None,
+        deadline: float = None,
     ):
         """Initializes a tree object with optional parameters for tree search
         for target molecule.
@@ -42,6 +51,18 @@ class Tree:
         :param expansion_function: A loaded policy function.
         :param evaluation_function: A loaded value function. If None,
             the rollout is used as a default for node evaluation.
+        :param reaction_cache: The cache of reaction rules application
+            results, can be shared between trees. If None, the tree
+            creates its own cache of reaction_cache_size.
+        :param retron_memo: The memo of the retrons solved or proven
+            dead in the previous searches. The solved retrons (except
+            the target) are treated as building blocks, and the dead
+            retrons are not added to the tree.
+        :param deadline: The wall-clock time (as returned by time.time)
+            at which the tree search is stopped, even if max_time is not
+            exceeded. The time limits are also checked inside the node
+            expansion and rollout, which are stopped when the time is
+            up.
         """
 
         # config parameters
@@ -56,35 +77,65 @@ class Tree:
         if target:
             target.canonicalize()
 
-        target_retron = Retron(target)
-        target_retron.prev_retrons.append(Retron(target))
+        target_retron = Retron(target, canonicalize=False)
+        target_retron.prev_retrons = RetronChain(target_retron)
         target_node = Node(
             retrons_to_expand=(target_retron,), new_retrons=(target_retron,)
         )
 
         # tree structure init
-        self.nodes: Dict[int, Node] = {1: target_node}
-        self.parents: Dict[int, int] = {1: 0}
-        self.children: Dict[int, Set[int]] = {1: set()}
+        self.storage = TreeStorage()
+        self.storage.add_node(target_node)
         self.winning_nodes: List[int] = []
+        self.first_solution_iteration: Optional[int] = None
         self.visited_nodes: Set[int] = set()
         self.expanded_nodes: Set[int] = set()
-        self.nodes_visit: Dict[int, int] = {1: 0}
-        self.nodes_depth: Dict[int, int] = {1: 0}
-        self.nodes_prob: Dict[int, float] = {1: 0.0}
-        self.nodes_rules: Dict[int, float] = {}
-        self.nodes_init_value: Dict[int, float] = {1: 0.0}
-        self.nodes_total_value: Dict[int, float] = {1: 0.0}
+
+        # dict-like views of the tree storage
+        self.nodes = NodesView(self.storage)
+        self.parents = NodesStatView(self.storage, "parents", int)
+        self.children = ChildrenView(self.storage)
+        self.nodes_visit = NodesStatView(self.storage, "visits", int)
+        self.nodes_depth = NodesStatView(self.storage, "depths", int)
+        self.nodes_prob = NodesStatView(self.storage, "probs", float)
+        self.nodes_rules = NodesStatView(self.storage, "rules", int)
+        self.nodes_init_value = NodesStatView(self.storage, "init_values", float)
+        self.nodes_total_value = NodesStatView(self.storage, "total_values", float)
+        self.nodes_virtual_loss = NodesStatView(self.storage, "virtual_losses", int)
+
+        # transposition table of the nodes with the same retrons to expand
+        self.transpositions: Optional[Dict[Tuple[int, Tuple[str, ...]], int]] = None
+        self.transposition_hits: int = 0
+        if self.config.transpositions:
+            self.transpositions = {self._node_key(target_node.retrons_to_expand, 0): 1}
+
+        # sizes of the batches of leaves expanded with a single policy call
+        self.policy_batches: List[int] = []
+
+        # priority queue of the nodes to be expanded in the best-first search
+        # (estimated route cost, node id) and the route costs of the queued nodes
+        self.best_first_queue: List[Tuple[float, int]] = [(0.0, 1)]
+        self.route_costs: Dict[int, float] = {1: 0.0}
 
         # tree building limits
         self.curr_iteration: int = 0
-        self.curr_tree_size: int = 2
         self.start_time: float = 0
         self.curr_time: float = 0
+        self.deadline = deadline
 
-        # building blocks and reaction reaction_rules
-        self.reaction_rules = reaction_rules
+        # building blocks and reaction rules
         self.building_blocks = building_blocks
+        self._init_reaction_rules(reaction_rules, reaction_cache)
+
+        # retrons solved or proven dead in the previous searches
+        self.retron_memo = retron_memo
+        self.memo_solved_hits: int = 0
+        self.memo_dead_hits: int = 0
+
+        # nodes expanded with all the products of the predicted reaction rules and
+        # nodes proven dead within the remaining depth (tracked with the retron memo)
+        self.complete_nodes: Set[int] = set()
+        self.dead_nodes: Set[int] = set()
 
         # policy and value functions
         self.policy_network = expansion_function
@@ -95,13 +146,27 @@ class Tree:
                 )
             self.value_network = evaluation_function
 
+        # reaction rules tried in the rollout with the popularity rollout policy
+        self.rollout_rules: Optional[List[int]] = None
+        if (
+            self.config.evaluation_type == "rollout"
+            and self.config.rollout_policy == "popularity"
+        ):
+            self.rollout_rules = self._popular_rules(self.config.rollout_top_rules)
+
         # utils
         self._tqdm = True  # needed to disable tqdm with multiprocessing module
 
     def __len__(self) -> int:
         """Returns the current size (the number of nodes) in the tree."""
 
-        return self.curr_tree_size - 1
+        return len(self.storage)
+
+    @property
+    def curr_tree_size(self) -> int:
+        """Returns the id of the next node to be added to the tree."""
+
+        return self.storage.size
 
     def __iter__(self) -> "Tree":
         """The function is defining an iterator for a Tree object.
@@ -139,15 +204,18 @@ class Tree:
             raise StopIteration("Iterations limit exceeded.")
         if self.curr_tree_size >= self.config.max_tree_size:
             raise StopIteration("Max tree size exceeded or all possible paths found.")
-        if self.curr_time >= self.config.max_time:
+        if self._time_is_up():
             raise StopIteration("Time limit exceeded.")
+        if self.config.max_routes and len(self.winning_nodes) >= self.config.max_routes:
+            raise StopIteration("Routes limit reached.")
 
-        # start new iteration
-        self.curr_iteration += 1
-        self.curr_time = time() - self.start_time
+        if self.config.search_strategy == "best_first":
+            return self._next_best_first()
 
-        if self._tqdm:
-            self._tqdm.update()
+        if self.config.search_batch_size > 1:
+            return self._next_batch()
+
+        self._start_iteration()
 
         curr_depth, node_id = 0, 1  # start from the root node_id
 
@@ -155,100 +223,310 @@ class Tree:
         while explore_route:
             self.visited_nodes.add(node_id)
 
-            if self.nodes_visit[node_id]:  # already visited
-                if not self.children[node_id]:  # dead node
+            if self.storage.visits[node_id]:  # already visited
+                if not self.storage.child_counts[node_id]:  # dead node
                     self._update_visits(node_id)
                     explore_route = False
                 else:
                     node_id = self._select_node(node_id)  # select the child node
                     curr_depth += 1
             else:
-                if self.nodes[node_id].is_solved():  # found path
+                if self.storage.nodes[node_id].is_solved():  # found path
                     self._update_visits(
                         node_id
                     )  # this prevents expanding of bb node_id
-                    self.winning_nodes.append(node_id)
+                    self._add_winning_node(node_id)
                     return True, [node_id]
 
                 if (
                     curr_depth < self.config.max_depth
                 ):  # expand node if depth limit is not reached
                     self._expand_node(node_id)
-                    if not self.children[node_id]:  # node was not expanded
-                        value_to_backprop = -1.0
-                    else:
-                        self.expanded_nodes.add(node_id)
+                    found_after_expansion = self._evaluate_expanded_node(node_id)
+                    explore_route = False
 
-                        if self.config.search_strategy == "evaluation_first":
-                            # recalculate node value based on children synthesisability and backpropagation
-                            child_values = [
-                                self.nodes_init_value[child_id]
-                                for child_id in self.children[node_id]
-                            ]
+                    if found_after_expansion:
+                        return True, list(found_after_expansion)
 
-                            if self.config.evaluation_agg == "max":
-                                value_to_backprop = max(child_values)
+                else:
+                    self._backpropagate(node_id, self.storage.total_values[node_id])
+                    self._update_visits(node_id)
+                    explore_route = False
 
-                            elif self.config.evaluation_agg == "average":
-                                value_to_backprop = sum(child_values) / len(
-                                    self.children[node_id]
-                                )
+        return False, [node_id]
 
-                        elif self.config.search_strategy == "expansion_first":
-                            value_to_backprop = self._get_node_value(node_id)
+    def _start_iteration(self) -> None:
+        """Starts a new iteration of the tree building.
 
-                    # backpropagation
-                    self._backpropagate(node_id, value_to_backprop)
-                    self._update_visits(node_id)
-                    explore_route = False
+        :return: None.
+        """
+
+        self.curr_iteration += 1
+        self.curr_time = time() - self.start_time
+
+        if self._tqdm:
+            self._tqdm.update()
+
+    def _next_batch(self) -> [bool, List[int]]:
+        """Does one round of the batched tree building. Up to
+        search_batch_size leaves are selected, the virtual loss is applied to
+        the selected routes to diversify the selection, and the reaction
+        rules for all the selected leaves are predicted with a single policy
+        network call. If the selection reaches the leaf already selected in
+        this round, the virtual loss of the leaf is increased and the
+        selection is retried (up to search_batch_size times per round). Each
+        leaf is counted as an iteration when it is expanded, and the other
+        selections (except the retried ones) are counted as in the search
+        without batches.
+
+        :return: Returns True if the route was found and the node ids of
+            the last nodes in the found routes. Otherwise, returns False
+            and the id of the last visited node.
+        """
+
+        leaves, collided, found_nodes = [], [], []
+        node_id = 1
+        while (
+            len(leaves) < self.config.search_batch_size
+            and len(collided) < self.config.search_batch_size
+        ):
+            if (
+                self.curr_iteration + len(leaves) >= self.config.max_iterations
+                or self._time_is_up()
+            ):
+                break
 
-                    if self.children[node_id]:
-                        # found after expansion
-                        found_after_expansion = set()
-                        for child_id in iter(self.children[node_id]):
-                            if self.nodes[child_id].is_solved():
-                                found_after_expansion.add(child_id)
-                                self.winning_nodes.append(child_id)
+            curr_depth, node_id = 0, 1  # start from the root node_id
 
-                        if found_after_expansion:
-                            return True, list(found_after_expansion)
+            explore_route = True
+            while explore_route:
+                self.visited_nodes.add(node_id)
 
+                if self.storage.visits[node_id]:  # already visited
+                    if not self.storage.child_counts[node_id]:  # dead node
+                        self._start_iteration()
+                        self._update_visits(node_id)
+                        explore_route = False
+                    else:
+                        node_id = self._select_node(node_id)  # select the child node
+                        curr_depth += 1
+                elif node_id in leaves:  # the leaf is already selected in this round
+                    self._add_virtual_loss(node_id, 1)
+                    collided.append(node_id)
+                    explore_route = False
+                elif self.storage.nodes[node_id].is_solved():  # found path
+                    self._start_iteration()
+                    self._update_visits(node_id)
+                    self._add_winning_node(node_id)
+                    found_nodes.append(node_id)
+                    explore_route = False
+                elif curr_depth < self.config.max_depth:  # leaf to be expanded
+                    self._add_virtual_loss(node_id, 1)
+                    leaves.append(node_id)
+                    explore_route = False
                 else:
-                    self._backpropagate(node_id, self.nodes_total_value[node_id])
+                    self._start_iteration()
+                    self._backpropagate(node_id, self.storage.total_values[node_id])
                     self._update_visits(node_id)
                     explore_route = False
 
+        for leaf_id in collided:
+            self._add_virtual_loss(leaf_id, -1)
+
+        if leaves:
+            self.policy_batches.append(len(leaves))
+            predicted_rules = self.policy_network.predict_reaction_rules_batch(
+                [self.storage.nodes[leaf_id].curr_retron for leaf_id in leaves],
+                self.reaction_rules,
+            )
+            # the virtual loss is removed before the expansions, which can link
+            # the existing nodes to the new parents (with transpositions)
+            for leaf_id in leaves:
+                self._add_virtual_loss(leaf_id, -1)
+            for leaf_id, leaf_rules in zip(leaves, predicted_rules):
+                if self._time_is_up():  # the rest of the leaves stay unexpanded
+                    break
+                self._start_iteration()
+                self._expand_node(leaf_id, leaf_rules)
+                found_nodes.extend(self._evaluate_expanded_node(leaf_id))
+
+        if found_nodes:
+            return True, found_nodes
+
         return False, [node_id]
 
-    def _ucb(self, node_id: int) -> float:
-        """Calculates the Upper Confidence Bound (UCB) statistics for a given
-        node.
+    def _next_best_first(self) -> [bool, List[int]]:
+        """Does one round of the best-first tree building. The nodes with the
+        lowest estimated cost of the route through them are taken from the
+        priority queue (up to search_batch_size nodes, each expansion is
+        counted as an iteration) and expanded, and their children are put to
+        the queue. The estimated cost is the cost of the route to the node
+        (the sum of the negative logarithms of the reaction rules
+        probabilities) plus the heuristic (the negative logarithm of the
+        node value, estimated by the evaluation function).
+
+        :return: Returns True if the route was found and the node ids of
+            the last nodes in the found routes. Otherwise, returns False
+            and the id of the last expanded node.
+        """
 
-        :param node_id: The id of the node.
-        :return: The calculated UCB.
+        leaves, queued = [], []
+        while (
+            self.best_first_queue
+            and len(leaves) < self.config.search_batch_size
+            and self.curr_iteration < self.config.max_iterations
+        ):
+            cost, node_id = heappop(self.best_first_queue)
+            if self.storage.depths[node_id] >= self.config.max_depth:
+                continue  # depth limit is reached
+
+            self._start_iteration()
+            self.visited_nodes.add(node_id)
+            leaves.append(node_id)
+            queued.append((cost, node_id))
+
+        if not leaves:
+            raise StopIteration("All possible nodes are expanded.")
+
+        predicted_rules = [None] * len(leaves)
+        if self.config.search_batch_size > 1:
+            self.policy_batches.append(len(leaves))
+            predicted_rules = self.policy_network.predict_reaction_rules_batch(
+                [self.storage.nodes[leaf_id].curr_retron for leaf_id in leaves],
+                self.reaction_rules,
+            )
+
+        found_nodes = []
+        for i, (leaf_id, leaf_rules) in enumerate(zip(leaves, predicted_rules)):
+            if self._time_is_up():  # the unexpanded leaves are returned to the queue
+                for item in queued[i:]:
+                    heappush(self.best_first_queue, item)
+                leaves = leaves[: max(i, 1)]
+                break
+
+            self._expand_node(leaf_id, leaf_rules)
+            found_nodes.extend(self._evaluate_expanded_node(leaf_id))
+
+            for child_id in self.storage.children(leaf_id).tolist():
+                if child_id in self.route_costs:  # already queued (transposition)
+                    continue
+                if self.storage.nodes[child_id].is_solved():
+                    continue
+
+                prob = min(max(float(self.storage.probs[child_id]), 1e-10), 1.0)
+                value = min(max(float(self.storage.init_values[child_id]), 1e-10), 1.0)
+                route_cost = self.route_costs[leaf_id] - log(prob)
+                self.route_costs[child_id] = route_cost
+                heappush(self.best_first_queue, (route_cost - log(value), child_id))
+
+        if found_nodes:
+            return True, found_nodes
+
+        return False, [leaves[-1]]
+
+    def _add_winning_node(self, node_id: int) -> None:
+        """Adds the node to the winning nodes (the last nodes of the found
+        routes) and records the iteration at which the first route was found.
+
+        :param node_id: The id of the solved node.
+        :return: None.
         """
 
-        prob = self.nodes_prob[node_id]  # predicted by policy network score
-        visit = self.nodes_visit[node_id]
+        if not self.winning_nodes:
+            self.first_solution_iteration = self.curr_iteration
+        self.winning_nodes.append(node_id)
 
-        if self.config.ucb_type == "puct":
-            u = (
-                self.config.c_ucb * prob * sqrt(self.nodes_visit[self.parents[node_id]])
-            ) / (visit + 1)
-            ucb_value = self.nodes_total_value[node_id] + u
+    def _evaluate_expanded_node(self, node_id: int) -> Set[int]:
+        """Evaluates the just expanded node, backpropagates its value and
+        updates the visits of the nodes in the route to it.
 
-        if self.config.ucb_type == "uct":
-            u = (
-                self.config.c_ucb
-                * sqrt(self.nodes_visit[self.parents[node_id]])
-                / (visit + 1)
-            )
-            ucb_value = self.nodes_total_value[node_id] + u
+        :param node_id: The id of the expanded node.
+        :return: The set of ids of the child nodes with found routes.
+        """
+
+        children = self.storage.children(node_id).tolist()
+        if not children:  # node was not expanded
+            value_to_backprop = -1.0
+        else:
+            self.expanded_nodes.add(node_id)
+
+            if self.config.search_strategy in ("evaluation_first", "best_first"):
+                # recalculate node value based on children synthesisability and backpropagation
+                child_values = [
+                    float(value) for value in self.storage.init_values[children]
+                ]
+
+                if self.config.evaluation_agg == "max":
+                    value_to_backprop = max(child_values)
+
+                elif self.config.evaluation_agg == "average":
+                    value_to_backprop = sum(child_values) / len(children)
+
+            elif self.config.search_strategy == "expansion_first":
+                value_to_backprop = self._get_node_value(node_id)
+
+        # backpropagation
+        self._backpropagate(node_id, value_to_backprop)
+        self._update_visits(node_id)
+
+        # found after expansion
+        found_after_expansion = set()
+        for child_id in children:
+            if self.storage.nodes[child_id].is_solved():
+                found_after_expansion.add(child_id)
+                self._add_winning_node(child_id)
+
+        return found_after_expansion
+
+    def _add_virtual_loss(self, node_id: int, loss: int) -> None:
+        """Adds (or removes with the negative loss) the virtual loss to the
+        nodes from the current node to the root node. The virtual loss
+        temporarily makes the route look visited and worse, so that the
+        next selections in the same batch round prefer other routes.
+
+        :param node_id: The id of the current node.
+        :param loss: The number of virtual losses to add.
+        :return: None.
+        """
+
+        for node_id in self.storage.ancestors(node_id):
+            self.storage.virtual_losses[node_id] += loss
+
+    def _children_ucb(self, node_id: int) -> np.ndarray:
+        """Calculates the Upper Confidence Bound (UCB) statistics for all the
+        children of a given node at once.
+
+        :param node_id: The id of the parent node.
+        :return: The array of the calculated UCB of the children in the
+            order of the children of the node.
+        """
+
+        storage = self.storage
+        children = storage.children_index(node_id)
+
+        visits = storage.visits[children]
+        parent_visit = int(storage.visits[node_id])
+        total_values = storage.total_values[children]
+
+        if self.config.search_batch_size > 1:  # batched search
+            virtual_losses = storage.virtual_losses[children]
+            visits = visits + virtual_losses
+            parent_visit += int(storage.virtual_losses[node_id])
+            total_values = total_values - self.config.virtual_loss * virtual_losses
+
+        ucb_type = self.config.ucb_type
+        if ucb_type == "puct":
+            u = self.config.c_ucb * storage.probs[children] * sqrt(parent_visit)
+            ucb_values = total_values + u / (visits + 1)
+
+        elif ucb_type == "uct":
+            u = self.config.c_ucb * sqrt(parent_visit)
+            ucb_values = total_values + u / (visits + 1)
 
-        if self.config.ucb_type == "value":
-            ucb_value = self.nodes_init_value[node_id] / (visit + 1)
+        elif ucb_type == "value":
+            ucb_values = storage.init_values[children] / (visits + 1)
 
-        return ucb_value
+        return ucb_values
 
     def _select_node(self, node_id: int) -> int:
         """Selects a node based on its UCB value and returns the id of the node
@@ -261,67 +539,244 @@ class Tree:
         if self.config.epsilon > 0:
             n = uniform(0, 1)
             if n < self.config.epsilon:
-                return choice(list(self.children[node_id]))
+                return choice(self.storage.children(node_id).tolist())
 
-        best_score, best_children = None, []
-        for child_id in self.children[node_id]:
-            score = self._ucb(child_id)
-            if best_score is None or score > best_score:
-                best_score, best_children = score, [child_id]
-            elif score == best_score:
-                best_children.append(child_id)
+        # argmax returns the first child with the highest score, which is needed for
+        # tree search reproducibility, when all child nodes has the same score
+        best_child = np.argmax(self._children_ucb(node_id))
+        return int(self.storage.children(node_id)[best_child])
 
-        # is needed for tree search reproducibility, when all child nodes has the same score
-        return best_children[0]
-
-    def _expand_node(self, node_id: int) -> None:
+    def _expand_node(
+        self, node_id: int, predicted_rules: List[Tuple[float, Reactor, int]] = None
+    ) -> None:
         """Expands the node by generating new retrons with policy (expansion)
         function.
 
         :param node_id: The id the node to be expanded.
+        :param predicted_rules: The reaction rules already predicted for
+            the current retron of the node (in the batched search). If
+            None, they are predicted with the policy function.
         :return: None.
         """
-        curr_node = self.nodes[node_id]
+        curr_node = self.storage.nodes[node_id]
         prev_retrons = curr_node.curr_retron.prev_retrons
+        child_depth = int(self.storage.depths[node_id]) + 1
+
+        # with transpositions, the node can be reached through several routes, and
+        # the ancestor chain of its current retron covers only the first one
+        lineage = self._lineage(node_id) if self.storage.extra_parents else None
+
+        if predicted_rules is None:
+            predicted_rules = self.policy_network.predict_reaction_rules(
+                curr_node.curr_retron, self.reaction_rules
+            )
 
+        new_nodes = []
         tmp_retrons = set()
-        for prob, rule, rule_id in self.policy_network.predict_reaction_rules(
-            curr_node.curr_retron, self.reaction_rules
-        ):
-            for products in apply_reaction_rule(curr_node.curr_retron.molecule, rule):
+        time_is_up = False
+        complete = True  # no products are skipped because of the loops
+        for prob, rule, rule_id in predicted_rules:
+            if self._time_is_up():  # the node keeps the children created so far
+                time_is_up = True
+                break
+
+            for products in self._apply_reaction_rule(
+                curr_node.curr_retron, rule, rule_id
+            ):
                 # check repeated products
                 if not products or not set(products) - tmp_retrons:
                     continue
                 tmp_retrons.update(products)
 
-                for molecule in products:
-                    molecule.meta["reactor_id"] = rule_id
-
-                new_retrons = tuple(Retron(mol) for mol in products)
+                new_retrons = tuple(
+                    Retron(mol, table=self.retron_table) for mol in products
+                )
                 scaled_prob = prob * len(
                     list(filter(lambda x: len(x) > self.config.min_mol_size, products))
                 )
 
-                if set(prev_retrons).isdisjoint(new_retrons):
+                if lineage is None:
+                    no_loops = prev_retrons.isdisjoint(new_retrons)
+                else:
+                    no_loops = lineage.isdisjoint(str(x) for x in new_retrons)
+
+                if no_loops:
                     retrons_to_expand = (
                         *curr_node.next_retrons,
-                        *(
-                            x
-                            for x in new_retrons
-                            if not x.is_building_block(
-                                self.building_blocks, self.config.min_mol_size
-                            )
-                        ),
+                        *(x for x in new_retrons if not self._is_building_block(x)),
                     )
 
+                    if self.retron_memo is not None:
+                        remaining_depth = self.config.max_depth - child_depth
+                        if any(
+                            self.retron_memo.is_dead(str(x), remaining_depth)
+                            for x in retrons_to_expand
+                        ):
+                            self.memo_dead_hits += 1
+                            continue
+
+                    if self.transpositions is not None and retrons_to_expand:
+                        transposition_id = self.transpositions.get(
+                            self._node_key(retrons_to_expand, child_depth)
+                        )
+                        if transposition_id is not None:
+                            if not self._add_transposition(node_id, transposition_id):
+                                complete = False
+                            continue
+
                     child_node = Node(
                         retrons_to_expand=retrons_to_expand, new_retrons=new_retrons
                     )
 
                     for new_retron in new_retrons:
-                        new_retron.prev_retrons = [new_retron, *prev_retrons]
+                        new_retron.prev_retrons = RetronChain(new_retron, prev_retrons)
+
+                    child_id = self._add_node(node_id, child_node, scaled_prob, rule_id)
+                    if self.transpositions is not None and retrons_to_expand:
+                        self.transpositions[
+                            self._node_key(retrons_to_expand, child_depth)
+                        ] = child_id
+                    new_nodes.append(child_id)
+
+                    # the nodes at the maximum depth are not expanded
+                    if (
+                        self.retron_memo is not None
+                        and retrons_to_expand
+                        and child_depth >= self.config.max_depth
+                    ):
+                        self.dead_nodes.add(child_id)
+                else:
+                    complete = False
+
+        if not time_is_up and self.retron_memo is not None:
+            # the retron is dead if no reaction rule can be applied to it
+            if not tmp_retrons:
+                self.retron_memo.mark_dead(
+                    str(curr_node.curr_retron),
+                    self.config.max_depth - int(self.storage.depths[node_id]),
+                )
+            if complete:
+                self.complete_nodes.add(node_id)
+                self._update_dead_nodes(node_id)
 
-                    self._add_node(node_id, child_node, scaled_prob, rule_id)
+        # the children are evaluated after all of them are created
+        if new_nodes:
+            self._init_nodes_values(new_nodes)
+
+    def _is_building_block(self, retron: Retron) -> bool:
+        """Checks if the retron is a building block or is already solved in the
+        previous searches (if the retron memo is used).
+
+        :param retron: The retron.
+        :return: True if the retron does not need to be expanded.
+        """
+
+        if retron.is_building_block(self.building_blocks, self.config.min_mol_size):
+            return True
+
+        if self.retron_memo is not None and self.retron_memo.is_solved(str(retron)):
+            self.memo_solved_hits += 1
+            return True
+
+        return False
+
+    @staticmethod
+    def _node_key(
+        retrons_to_expand: Iterable[Retron], depth: int
+    ) -> Tuple[int, Tuple[str, ...]]:
+        """Returns the key of the node in the transposition table: the depth
+        of the node and the sorted SMILES of the retrons to expand. The nodes
+        reached with different sequences of reaction rules of the same length
+        and with the same retrons to expand have the same key (the nodes at
+        different depths are not merged, since their depth limits differ).
+
+        :param retrons_to_expand: The retrons to expand of the node.
+        :param depth: The depth of the node.
+        :return: The key of the node.
+        """
+        return depth, tuple(sorted(str(retron) for retron in retrons_to_expand))
+
+    def _lineage(self, node_id: int) -> Set[str]:
+        """Returns the SMILES of the current retron of the node and of all the
+        retrons from which it was obtained, over all the routes from the root
+        node to the node (the node has several parents with transpositions).
+        The products of the expansion of the node must not be in it, so the
+        routes have no loops.
+
+        :param node_id: The id of the node.
+        :return: The set of the SMILES of the retrons.
+        """
+
+        storage = self.storage
+        item = (node_id, str(storage.nodes[node_id].curr_retron))
+        lineage, visited, stack = set(), {item}, [item]
+        while stack:
+            node_id, retron = stack.pop()
+            lineage.add(retron)
+            for parent_id in storage.parent_ids(node_id):
+                parent = storage.nodes[parent_id]
+                if any(retron == str(x) for x in parent.next_retrons):
+                    item = (parent_id, retron)  # not expanded in the parent
+                else:  # obtained from the current retron of the parent
+                    item = (parent_id, str(parent.curr_retron))
+                if item not in visited:
+                    visited.add(item)
+                    stack.append(item)
+
+        return lineage
+
+    def _add_transposition(self, node_id: int, transposition_id: int) -> bool:
+        """Links the existing node with the same retrons to expand as the new
+        child node (transposition) to the expanded node instead of creating
+        the new child node. The expansion and statistics of the existing node
+        are shared by all its parents. The link is not added if the existing
+        node is already the child or the ancestor of the expanded node (the
+        search graph must remain acyclic).
+
+        :param node_id: The id of the expanded node.
+        :param transposition_id: The id of the existing node.
+        :return: False if the link is not added because it makes a loop.
+        """
+
+        if transposition_id in self.storage.ancestors(node_id):
+            return False
+        if transposition_id in self.storage.children(node_id):
+            return True
+
+        self.storage.add_parent(node_id, transposition_id)
+        self.transposition_hits += 1
+        return True
+
+    def _update_dead_nodes(self, node_id: int) -> None:
+        """Marks the completely expanded node as dead if all its children are
+        dead (or it has no children), and propagates the dead status to its
+        parents. The current retron of the dead node with no other retrons to
+        expand is marked dead in the retron memo at the remaining depth of the
+        node (it can not be solved with this number of reactions).
+
+        :param node_id: The id of the expanded node.
+        :return: None.
+        """
+
+        stack = [node_id]
+        while stack:
+            node_id = stack.pop()
+            if node_id in self.dead_nodes or node_id not in self.complete_nodes:
+                continue
+            if any(
+                child_id not in self.dead_nodes
+                for child_id in self.storage.children(node_id).tolist()
+            ):
+                continue
+
+            self.dead_nodes.add(node_id)
+            node = self.storage.nodes[node_id]
+            if len(node.retrons_to_expand) == 1:
+                self.retron_memo.mark_dead(
+                    str(node.curr_retron),
+                    self.config.max_depth - int(self.storage.depths[node_id]),
+                )
+            stack.extend(self.storage.parent_ids(node_id))
 
     def _add_node(
         self,
@@ -329,7 +784,7 @@ class Tree:
         new_node: Node,
         policy_prob: float = None,
         rule_id: int = None,
-    ) -> None:
+    ) -> int:
         """Adds a new node to the tree with probability of reaction rules
         predicted by policy function and applied to the parent node of the new
         node.
@@ -338,28 +793,40 @@ class Tree:
         :param new_node: The new node to be added.
         :param policy_prob: The probability of reaction rules predicted
             by policy function for thr parent node.
-        :return: None.
+        :return: The id of the new node.
         """
 
-        new_node_id = self.curr_tree_size
+        new_node_id = self.storage.add_node(
+            new_node,
+            parent_id=node_id,
+            prob=policy_prob,
+            rule_id=rule_id,
+            depth=self.storage.depths[node_id] + 1,
+        )
+
+        return new_node_id
 
-        self.nodes[new_node_id] = new_node
-        self.parents[new_node_id] = node_id
-        self.children[node_id].add(new_node_id)
-        self.children[new_node_id] = set()
-        self.nodes_visit[new_node_id] = 0
-        self.nodes_prob[new_node_id] = policy_prob
-        self.nodes_rules[new_node_id] = rule_id
-        self.nodes_depth[new_node_id] = self.nodes_depth[node_id] + 1
-        self.curr_tree_size += 1
+    def _init_nodes_values(self, nodes_ids: List[int]) -> None:
+        """Sets the initial values of the new nodes. In the evaluation first
+        and best-first search with the value network, the nodes are evaluated
+        with a single value network call.
 
-        if self.config.search_strategy == "evaluation_first":
-            node_value = self._get_node_value(new_node_id)
+        :param nodes_ids: The ids of the new nodes.
+        :return: None.
+        """
+
+        if self.config.search_strategy in ("evaluation_first", "best_first"):
+            if self.config.evaluation_type == "gcn":
+                nodes_values = self.value_network.predict_values(
+                    [self.storage.nodes[node_id].new_retrons for node_id in nodes_ids]
+                )
+            else:
+                nodes_values = [self._get_node_value(node_id) for node_id in nodes_ids]
         elif self.config.search_strategy == "expansion_first":
-            node_value = self.config.init_node_value
+            nodes_values = [self.config.init_node_value] * len(nodes_ids)
 
-        self.nodes_init_value[new_node_id] = node_value
-        self.nodes_total_value[new_node_id] = node_value
+        self.storage.init_values[nodes_ids] = nodes_values
+        self.storage.total_values[nodes_ids] = nodes_values
 
     def _get_node_value(self, node_id: int) -> float:
         """Calculates the value for the given node (for example with rollout or
@@ -369,7 +836,7 @@ class Tree:
         :return: The estimated value of the node.
         """
 
-        node = self.nodes[node_id]
+        node = self.storage.nodes[node_id]
 
         if self.config.evaluation_type == "random":
             node_value = uniform(0, 1)
@@ -377,7 +844,9 @@ class Tree:
         elif self.config.evaluation_type == "rollout":
             node_value = min(
                 (
-                    self._rollout_node(retron, current_depth=self.nodes_depth[node_id])
+                    self._rollout_node(
+                        retron, current_depth=int(self.storage.depths[node_id])
+                    )
                     for retron in node.retrons_to_expand
                 ),
                 default=1.0,
@@ -389,32 +858,34 @@ class Tree:
         return node_value
 
     def _update_visits(self, node_id: int) -> None:
-        """Updates the number of visits from the current node to the root node.
+        """Updates the number of visits from the current node to the root node
+        (of all the ancestors of the node, if it has several parents).
 
         :param node_id: The id of the current node.
         :return: None.
         """
 
-        while node_id:
-            self.nodes_visit[node_id] += 1
-            node_id = self.parents[node_id]
+        for node_id in self.storage.ancestors(node_id):
+            self.storage.visits[node_id] += 1
 
     def _backpropagate(self, node_id: int, value: float) -> None:
-        """Backpropagates the value through the tree from the current.
+        """Backpropagates the value through the tree from the current node to
+        the root node. If the node has several parents (transpositions), the
+        value is backpropagated once to each ancestor of the node.
 
         :param node_id: The id of the node from which to backpropagate
             the value.
         :param value: The value to backpropagate.
         :return: None.
         """
-        while node_id:
+        total_values, visits = self.storage.total_values, self.storage.visits
+        for node_id in self.storage.ancestors(node_id):
             if self.config.backprop_type == "muzero":
-                self.nodes_total_value[node_id] = (
-                    self.nodes_total_value[node_id] * self.nodes_visit[node_id] + value
-                ) / (self.nodes_visit[node_id] + 1)
+                total_values[node_id] = (
+                    total_values[node_id] * visits[node_id] + value
+                ) / (visits[node_id] + 1)
             elif self.config.backprop_type == "cumulative":
-                self.nodes_total_value[node_id] += value
-            node_id = self.parents[node_id]
+                total_values[node_id] += value
 
     def _rollout_node(self, retron: Retron, current_depth: int = None) -> float:
         """Performs a rollout simulation from a given node in the tree. Given
@@ -442,7 +913,7 @@ class Tree:
         max_depth = self.config.max_depth - current_depth
 
         # retron checking
-        if retron.is_building_block(self.building_blocks, self.config.min_mol_size):
+        if self._is_building_block(retron):
             return 1.0
 
         if max_depth == 0:
@@ -457,7 +928,7 @@ class Tree:
             # Iterate through reactors and pick first successful reaction.
             # Check products of the reaction if you can find them in in-building_blocks data
             # If not, then add missed products to retrons_to_expand and try to decompose them
-            if len(history) >= max_depth:
+            if len(history) >= max_depth or self._time_is_up():
                 reward = -0.5
                 return reward
 
@@ -465,12 +936,18 @@ class Tree:
             history[rollout_depth]["target"] = current_retron
             occurred_retrons.add(current_retron)
 
+            if self.retron_memo is not None and self.retron_memo.is_dead(
+                str(current_retron), max_depth - rollout_depth
+            ):
+                self.memo_dead_hits += 1
+                return -1.0
+
             # Pick the first successful reaction while iterating through reactors
             reaction_rule_applied = False
-            for prob, rule, rule_id in self.policy_network.predict_reaction_rules(
-                current_retron, self.reaction_rules
-            ):
-                for products in apply_reaction_rule(current_retron.molecule, rule):
+            for rule, rule_id in self._rollout_rules(current_retron):
+                for products in self._apply_reaction_rule(
+                    current_retron, rule, rule_id
+                ):
                     if products:
                         reaction_rule_applied = True
                         break
@@ -480,10 +957,18 @@ class Tree:
                     break
 
             if not reaction_rule_applied:
+                # the retron is dead only if none of the reaction rules of the
+                # expansion policy can be applied (not only the popular ones)
+                if self.retron_memo is not None and self.rollout_rules is None:
+                    self.retron_memo.mark_dead(
+                        str(current_retron), max_depth - rollout_depth
+                    )
                 reward = -1.0
                 return reward
 
-            products = tuple(Retron(product) for product in products)
+            products = tuple(
+                Retron(product, table=self.retron_table) for product in products
+            )
             history[rollout_depth]["products"] = products
 
             # check loops
@@ -496,19 +981,47 @@ class Tree:
             if occurred_retrons.isdisjoint(products):
                 # added number of atoms check
                 retrons_to_expand.extend(
-                    [
-                        x
-                        for x in products
-                        if not x.is_building_block(
-                            self.building_blocks, self.config.min_mol_size
-                        )
-                    ]
+                    [x for x in products if not self._is_building_block(x)]
                 )
                 rollout_depth += 1
 
         reward = 1.0
         return reward
 
+    def _popular_rules(self, top_rules: int) -> List[int]:
+        """Returns the ids of the most popular reaction rules. The popularity is
+        taken from the compiled reaction rules, otherwise the reaction rules
+        are expected to be sorted by popularity (as after the extraction).
+
+        :param top_rules: The number of the reaction rules.
+        :return: The ids of the reaction rules sorted by popularity.
+        """
+
+        popularity = getattr(self.reaction_rules, "popularity", None)
+        if popularity is None:
+            return list(range(min(top_rules, len(self.reaction_rules))))
+
+        rules_ids = sorted(range(len(popularity)), key=lambda i: -popularity[i])
+        return rules_ids[:top_rules]
+
+    def _rollout_rules(self, retron: Retron) -> Iterator[Tuple[Reactor, int]]:
+        """Yields the reaction rules to be tried in the rollout in the order
+        given by the rollout policy.
+
+        :param retron: The retron to which the reaction rules are
+            applied.
+        :return: The reaction rules and their ids.
+        """
+
+        if self.rollout_rules is None:
+            for _, rule, rule_id in self.policy_network.predict_reaction_rules(
+                retron, self.reaction_rules
+            ):
+                yield rule, rule_id
+        else:
+            for rule_id in self.rollout_rules:
+                yield self.reaction_rules[rule_id], rule_id
+
     def report(self) -> str:
         """Returns the string representation of the tree."""
 
@@ -519,6 +1032,52 @@ class Tree:
             f"Number of iterations: {self.curr_iteration}\n"
             f"Number of visited nodes: {len(self.visited_nodes)}\n"
             f"Number of found routes: {len(self.winning_nodes)}"
+            + (
+                f"\nNumber of iterations to the first route: "
+                f"{self.first_solution_iteration}"
+                if self.first_solution_iteration is not None
+                else ""
+            )
+            + (
+                f"\nPolicy batches fill: {round(self.batch_fill(), 3)}"
+                if self.policy_batches
+                else ""
+            )
+            + (
+                f"\nReaction rules cache hits/misses: "
+                f"{self.reaction_cache.hits}/{self.reaction_cache.misses}"
+                if self.reaction_cache is not None
+                else ""
+            )
+            + (
+                f"\nTranspositions: {self.transposition_hits}"
+                if self.transpositions is not None
+                else ""
+            )
+            + (
+                f"\nRetron memo solved/dead hits: "
+                f"{self.memo_solved_hits}/{self.memo_dead_hits}"
+                if self.retron_memo is not None
+                else ""
+            )
+            + (
+                f"\nReaction rules prefilter skips: "
+                f"{self.prefilter_skips}/{self.prefilter_checks}"
+                if self.rules_requirements is not None
+                else ""
+            )
+        )
+
+    def batch_fill(self) -> float:
+        """Returns how full the batches of leaves expanded with a single policy
+        network call were on average (1.0 means that all the batches had
+        search_batch_size leaves)."""
+
+        if not self.policy_batches:
+            return 0.0
+
+        return sum(self.policy_batches) / (
+            len(self.policy_batches) * self.config.search_batch_size
         )
 
     def route_score(self, node_id: int) -> float:
@@ -534,8 +1093,8 @@ class Tree:
         while node_id:
             route_length += 1
 
-            cumulated_nodes_value += self.nodes_total_value[node_id]
-            node_id = self.parents[node_id]
+            cumulated_nodes_value += float(self.storage.total_values[node_id])
+            node_id = self.storage.parents[node_id]
 
         return cumulated_nodes_value / (route_length**2)
 
@@ -550,8 +1109,8 @@ class Tree:
         nodes = []
         while node_id:
             nodes.append(node_id)
-            node_id = self.parents[node_id]
-        return [self.nodes[node_id] for node_id in reversed(nodes)]
+            node_id = self.storage.parents[node_id]
+        return [self.storage.nodes[node_id] for node_id in reversed(nodes)]
 
     def synthesis_route(self, node_id: int) -> Tuple[Reaction,]:
         """Given a node_id, return a tuple of reactions that represent the
@@ -602,10 +1161,13 @@ class Tree:
             visited_nodes.add(current_node_id)
             if self.children[current_node_id]:
                 # Nodes
+                # the nodes linked to several parents (transpositions) are
+                # rendered only once, as the children of their first parent
                 children = [
                     child
                     for child in list(self.children[current_node_id])
                     if self.nodes_visit[child] >= visits_threshold
+                    and self.parents[child] == current_node_id
                 ]
                 children_strings = [newick_render_node(child) for child in children]
                 children_strings = ",".join(children_strings)
@@ -0,0 +1,320 @@
+"""Module containing functions for the conversion of molecules to the graphs
+(featurization) used as the input of the policy and value networks."""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from CGRtools.containers import MoleculeContainer
+from CGRtools.exceptions import InvalidAromaticRing
+from CGRtools.periodictable import Element
+from torch_geometric.data import Batch
+from torch_geometric.data.data import Data
+
+MENDEL_INFO = {
+    "Ag": (5, 11, 1, 1),
+    "Al": (3, 13, 2, 1),
+    "Ar": (3, 18, 2, 6),
+    "As": (4, 15, 2, 3),
+    "B": (2, 13, 2, 1),
+    "Ba": (6, 2, 1, 2),
+    "Bi": (6, 15, 2, 3),
+    "Br": (4, 17, 2, 5),
+    "C": (2, 14, 2, 2),
+    "Ca": (4, 2, 1, 2),
+    "Ce": (6, None, 1, 2),
+    "Cl": (3, 17, 2, 5),
+    "Cr": (4, 6, 1, 1),
+    "Cs": (6, 1, 1, 1),
+    "Cu": (4, 11, 1, 1),
+    "Dy": (6, None, 1, 2),
+    "Er": (6, None, 1, 2),
+    "F": (2, 17, 2, 5),
+    "Fe": (4, 8, 1, 2),
+    "Ga": (4, 13, 2, 1),
+    "Gd": (6, None, 1, 2),
+    "Ge": (4, 14, 2, 2),
+    "Hg": (6, 12, 1, 2),
+    "I": (5, 17, 2, 5),
+    "In": (5, 13, 2, 1),
+    "K": (4, 1, 1, 1),
+    "La": (6, 3, 1, 2),
+    "Li": (2, 1, 1, 1),
+    "Mg": (3, 2, 1, 2),
+    "Mn": (4, 7, 1, 2),
+    "N": (2, 15, 2, 3),
+    "Na": (3, 1, 1, 1),
+    "Nd": (6, None, 1, 2),
+    "O": (2, 16, 2, 4),
+    "P": (3, 15, 2, 3),
+    "Pb": (6, 14, 2, 2),
+    "Pd": (5, 10, 3, 10),
+    "Pr": (6, None, 1, 2),
+    "Rb": (5, 1, 1, 1),
+    "S": (3, 16, 2, 4),
+    "Sb": (5, 15, 2, 3),
+    "Se": (4, 16, 2, 4),
+    "Si": (3, 14, 2, 2),
+    "Sm": (6, None, 1, 2),
+    "Sn": (5, 14, 2, 2),
+    "Sr": (5, 2, 1, 2),
+    "Te": (5, 16, 2, 4),
+    "Ti": (4, 4, 1, 2),
+    "Tl": (6, 13, 2, 1),
+    "Yb": (6, None, 1, 2),
+    "Zn": (4, 12, 1, 2),
+}
+
+
+def _mendel_table() -> Tuple[np.ndarray, np.ndarray]:
+    """Converts MENDEL_INFO to the lookup table indexed by the atomic number.
+
+    :return: The table of the period, group, shell and electrons of the
+        elements, and the status of the elements (0 - the element is not
+        in MENDEL_INFO, 1 - the element properties are known, 2 - some
+        element properties are unknown).
+    """
+
+    numbers = {
+        symbol: Element.from_symbol(symbol)().atomic_number for symbol in MENDEL_INFO
+    }
+    table = np.zeros((max(numbers.values()) + 1, 4), dtype=np.int16)
+    status = np.zeros(len(table), dtype=np.int8)
+    for symbol, properties in MENDEL_INFO.items():
+        if None in properties:
+            status[numbers[symbol]] = 2
+        else:
+            status[numbers[symbol]] = 1
+            table[numbers[symbol]] = properties
+
+    return table, status
+
+
+MENDEL_TABLE, MENDEL_STATUS = _mendel_table()
+
+
+def mol_to_arrays(molecule: MoleculeContainer) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts the prepared (kekulized) molecule to the atoms features matrix
+    and the undirected edge index. Each row of the features matrix contains:
+
+    1. Atomic number
+    2. Period
+    3. Group
+    4. Number of electrons + atom's charge
+    5. Shell
+    6. Total number of hydrogens
+    7. Whether the atom is in a ring
+    8. Number of neighbors
+    9-11. The number of single, double and triple bonds of the atom
+
+    The atoms are numbered in the order of the molecule atoms, and the
+    edge index contains both directions of each bond sorted by the source
+    and the target atom.
+
+    :param molecule: The kekulized molecule.
+    :return: The atoms features matrix (uint8) of shape (num_atoms, 11)
+        and the edge index (int64) of shape (2, 2 * num_bonds).
+    """
+
+    atoms_index = {}
+    atoms = []
+    for i, (n, atom) in enumerate(molecule.atoms()):
+        atoms_index[n] = i
+        atoms.append(
+            (
+                atom.atomic_number,
+                atom.charge,
+                atom.total_hydrogens,
+                atom.in_ring,
+                atom.neighbors,
+            )
+        )
+    atoms = np.array(atoms, dtype=np.int16).reshape(-1, 5)
+    atomic_numbers = atoms[:, 0]
+
+    # the same errors as for the MENDEL_INFO lookup of the atomic symbols
+    status = MENDEL_STATUS[np.minimum(atomic_numbers, len(MENDEL_STATUS) - 1)]
+    status[atomic_numbers >= len(MENDEL_STATUS)] = 0
+    if (status != 1).any():
+        atomic_number = int(atomic_numbers[np.argmax(status != 1)])
+        symbol = Element.from_atomic_number(atomic_number).__name__
+        if status[np.argmax(status != 1)] == 0:
+            raise KeyError(symbol)
+        raise TypeError(f"Properties of {symbol} are not known.")
+
+    x = np.zeros((len(atoms), 11), dtype=np.int16)
+    x[:, 0] = atomic_numbers
+    x[:, 1:3] = MENDEL_TABLE[atomic_numbers, :2]  # period and group
+    x[:, 3] = MENDEL_TABLE[atomic_numbers, 3] + atoms[:, 1]  # electrons + charge
+    x[:, 4] = MENDEL_TABLE[atomic_numbers, 2]  # shell
+    x[:, 5:8] = atoms[:, 2:5]
+
+    bonds = np.array(
+        [
+            (atoms_index[n], atoms_index[m], int(bond))
+            for n, m, bond in molecule.bonds()
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    if ((bonds[:, 2] < 1) | (bonds[:, 2] > 3)).any():
+        raise IndexError("Only single, double and triple bonds are supported.")
+
+    source = np.concatenate((bonds[:, 0], bonds[:, 1]))
+    target = np.concatenate((bonds[:, 1], bonds[:, 0]))
+    np.add.at(x, (source, 7 + np.concatenate((bonds[:, 2], bonds[:, 2]))), 1)
+
+    order = np.lexsort((target, source))
+    edge_index = np.stack((source[order], target[order]))
+
+    return x.astype(np.uint8), edge_index
+
+
+def prepare_molecule(
+    molecule: MoleculeContainer, canonicalize: bool = True
+) -> Optional[MoleculeContainer]:
+    """Prepares the copy of the molecule for the conversion to the graph.
+
+    :param molecule: The molecule.
+    :param canonicalize: If True, the molecule is canonicalized.
+    :return: The canonicalized and kekulized copy of the molecule, or
+        None if the molecule can not be kekulized or has wrong valences.
+    """
+
+    tmp_molecule = molecule.copy()
+    try:
+        if canonicalize:
+            tmp_molecule.canonicalize()
+        tmp_molecule.kekule()
+        if tmp_molecule.check_valence():
+            return None
+    except InvalidAromaticRing:
+        return None
+
+    return tmp_molecule
+
+
+def mol_to_pyg(
+    molecule: MoleculeContainer, canonicalize: bool = True
+) -> Optional[Data]:
+    """Converts the molecule to the PyTorch Geometric graph with the atoms
+    features matrix and undirected edges (see mol_to_arrays).
+
+    :param molecule: The molecule to be converted to PyTorch Geometric
+        graph.
+    :param canonicalize: If True, the input molecule is canonicalized.
+    :return: The PyTorch Geometric graph, or None if the molecule can not
+        be converted.
+    """
+
+    if len(molecule) == 1:  # to avoid a Retron to be a single atom
+        return None
+
+    tmp_molecule = prepare_molecule(molecule, canonicalize)
+    if tmp_molecule is None:
+        return None
+
+    x, edge_index = mol_to_arrays(tmp_molecule)
+    return Data(x=torch.from_numpy(x), edge_index=torch.from_numpy(edge_index))
+
+
+def mols_to_batch_arrays(
+    molecules: List[MoleculeContainer], canonicalize: bool = True
+) -> Tuple[Optional[Tuple[np.ndarray, ...]], List[int]]:
+    """Converts the list of molecules to the arrays of the batch of graphs:
+    the atoms features matrix and the edges (see mol_to_arrays) of all the
+    graphs concatenated (the edges are shifted by the number of atoms of
+    the previous graphs), the graph index of each atom and the pointers to
+    the first atom of each graph.
+
+    :param molecules: The molecules to be converted.
+    :param canonicalize: If True, the input molecules are canonicalized.
+    :return: The arrays x, edge_index, batch and ptr of the batch of
+        graphs (None if no molecule was converted) and the indices of the
+        converted molecules in the list.
+    """
+
+    graphs, molecules_ids = [], []
+    for i, molecule in enumerate(molecules):
+        if len(molecule) == 1:
+            continue
+        tmp_molecule = prepare_molecule(molecule, canonicalize)
+        if tmp_molecule is not None:
+            graphs.append(mol_to_arrays(tmp_molecule))
+            molecules_ids.append(i)
+
+    if not graphs:
+        return None, molecules_ids
+
+    return graphs_to_batch_arrays([[graph] for graph in graphs]), molecules_ids
+
+
+def graphs_to_batch_arrays(
+    graphs_list: List[List[Tuple[np.ndarray, np.ndarray]]]
+) -> Tuple[np.ndarray, ...]:
+    """Converts the lists of the graph arrays (see mol_to_arrays) to the arrays
+    of the batch of graphs (see mols_to_batch_arrays). The graphs of each list
+    are concatenated into one graph of the batch (the disjoint union of the
+    graphs, the same graph as for the molecule composed of the molecules of
+    the graphs).
+
+    :param graphs_list: The lists of the atoms features matrices and the
+        edge indices of the graphs (one list per graph of the batch).
+    :return: The arrays x, edge_index, batch and ptr of the batch of
+        graphs.
+    """
+
+    graphs = [graph for graphs in graphs_list for graph in graphs]
+    offsets = np.cumsum([0] + [len(x) for x, _ in graphs[:-1]])
+    x = np.concatenate([x for x, _ in graphs])
+    edge_index = np.concatenate(
+        [edge_index + offset for (_, edge_index), offset in zip(graphs, offsets)],
+        axis=1,
+    )
+
+    num_atoms = np.array(
+        [sum(len(x) for x, _ in graphs) for graphs in graphs_list], dtype=np.int64
+    )
+    ptr = np.concatenate(([0], np.cumsum(num_atoms)))
+    batch = np.repeat(np.arange(len(graphs_list), dtype=np.int64), num_atoms)
+
+    return x, edge_index, batch, ptr
+
+
+def mols_to_pyg_batch(
+    molecules: List[MoleculeContainer], canonicalize: bool = True
+) -> Tuple[Optional[Batch], List[int]]:
+    """Converts the list of molecules directly to the batch of PyTorch
+    Geometric graphs (the same graphs as produced by mol_to_pyg).
+
+    :param molecules: The molecules to be converted.
+    :param canonicalize: If True, the input molecules are canonicalized.
+    :return: The batch of graphs (None if no molecule was converted)
+        and the indices of the converted molecules in the list.
+    """
+
+    arrays, molecules_ids = mols_to_batch_arrays(molecules, canonicalize)
+    if arrays is None:
+        return None, molecules_ids
+
+    return arrays_to_pyg_batch(*arrays), molecules_ids
+
+
+def arrays_to_pyg_batch(
+    x: np.ndarray, edge_index: np.ndarray, batch: np.ndarray, ptr: np.ndarray
+) -> Batch:
+    """Converts the arrays of the batch of graphs (see mols_to_batch_arrays) to
+    the batch of PyTorch Geometric graphs.
+
+    :param x: The atoms features matrix of the batch.
+    :param edge_index: The edge index of the batch.
+    :param batch: The graph index of each atom.
+    :param ptr: The pointers to the first atom of each graph.
+    :return: The batch of graphs.
+    """
+
+    return Batch(
+        x=torch.from_numpy(x),
+        edge_index=torch.from_numpy(edge_index),
+        batch=torch.from_numpy(batch),
+        ptr=torch.from_numpy(ptr),
+    )
@@ -0,0 +1,261 @@
+"""Module containing the plain PyTorch implementation of the policy and value
+networks used for the inference, and functions for the export of the trained
+networks to TorchScript and the loading of the exported networks.
+
+The module does not depend on PyTorch Lightning and PyTorch Geometric, so
+the exported networks are loaded and run without them.
+"""
+
+import json
+import zipfile
+from typing import Any, Dict, List, Tuple
+
+import torch
+from torch import Tensor
+from torch.ao.quantization import per_channel_dynamic_qconfig, quantize_dynamic
+from torch.nn import Linear, Module, ModuleDict, ModuleList, Parameter
+from torch.nn.functional import gelu, relu
+
+EXPORT_META_FILE = "syntool.json"
+
+
+class GCNLayer(Module):
+    """Graph convolutional layer with the same weights and output as GCNConv
+    of PyTorch Geometric 2.4 (used for training) with improved=True. Since
+    the graphs have no edge weights, the self-loops are added with the
+    weight 1 despite improved=True."""
+
+    def __init__(self, in_dim: int, out_dim: int) -> None:
+        """Initializes the graph convolutional layer.
+
+        :param in_dim: The dimensionality of the input atom vectors.
+        :param out_dim: The dimensionality of the output atom vectors.
+        """
+
+        super().__init__()
+        self.lin = Linear(in_dim, out_dim, bias=False)
+        self.bias = Parameter(torch.zeros(out_dim))
+
+    def forward(
+        self,
+        atoms: Tensor,
+        source: Tensor,
+        target: Tensor,
+        edge_weight: Tensor,
+        loop_weight: Tensor,
+    ) -> Tensor:
+        """Performs the graph convolution with the normalized edge weights
+        (calculated once for all the layers, see ExportedNetwork).
+
+        :param atoms: The atom vectors.
+        :param source: The source atoms of the edges.
+        :param target: The target atoms of the edges.
+        :param edge_weight: The normalized weights of the edges.
+        :param loop_weight: The normalized weights of the self-loops.
+        :return: The new atom vectors.
+        """
+
+        atoms = self.lin(atoms)
+        out = atoms * loop_weight.unsqueeze(-1)
+        out = out.index_add(0, target, atoms[source] * edge_weight.unsqueeze(-1))
+        return out + self.bias
+
+
+class ExportedNetwork(Module):
+    """Plain PyTorch implementation of the policy and value networks (graph
+    embedding and the output layers) used for the inference. The graphs are
+    given as the tensors of the atoms features, edges and graph indices of
+    the atoms (as produced by mols_to_batch_arrays)."""
+
+    def __init__(
+        self,
+        vector_dim: int,
+        num_conv_layers: int,
+        num_outputs: List[int],
+        gcn_concat: bool = False,
+        softmax: bool = False,
+    ) -> None:
+        """Initializes the network.
+
+        :param vector_dim: The dimensionality of the graph embedding.
+        :param num_conv_layers: The number of graph convolutional layers.
+        :param num_outputs: The dimensionality of each output layer.
+        :param gcn_concat: Whether the graph embedding is the
+            concatenation of the outputs of all the convolutional layers
+            (as in GraphEmbeddingConcat).
+        :param softmax: Whether the softmax is applied to the outputs
+            (otherwise, the sigmoid is applied).
+        """
+
+        super().__init__()
+        gcn_dim = vector_dim // num_conv_layers if gcn_concat else vector_dim
+
+        self.gcn_concat = gcn_concat
+        self.softmax = softmax
+        self.embedding_dim = gcn_dim * num_conv_layers if gcn_concat else vector_dim
+
+        self.expansion = Linear(11, gcn_dim)
+        self.gcn_convs = ModuleList(
+            [GCNLayer(gcn_dim, gcn_dim) for _ in range(num_conv_layers)]
+        )
+        self.predictors = ModuleList(
+            [Linear(self.embedding_dim, num) for num in num_outputs]
+        )
+
+    def forward(
+        self, x: Tensor, edge_index: Tensor, batch: Tensor, num_graphs: int
+    ) -> List[Tensor]:
+        """Predicts the outputs for the batch of graphs.
+
+        :param x: The atoms features matrix.
+        :param edge_index: The edges of the graphs.
+        :param batch: The graph index of each atom.
+        :param num_graphs: The number of graphs in the batch.
+        :return: The list of the predicted outputs (the reaction rules
+            probabilities and, for the filtering policy, the priority
+            reaction rules probabilities, or the synthesisability).
+        """
+
+        atoms = self.expansion(torch.log(x.float() + 1))
+
+        # the normalization of GCNConv is the same for all the layers
+        source, target = edge_index[0], edge_index[1]
+        degree = torch.ones(atoms.size(0), dtype=atoms.dtype)  # self-loops
+        degree = degree.index_add(0, target, torch.ones_like(target, dtype=atoms.dtype))
+        degree_inv_sqrt = degree.pow(-0.5)
+        edge_weight = degree_inv_sqrt[source] * degree_inv_sqrt[target]
+        loop_weight = degree_inv_sqrt * degree_inv_sqrt
+
+        collected_atoms: List[Tensor] = []
+        for gcn_conv in self.gcn_convs:
+            out = gcn_conv(atoms, source, target, edge_weight, loop_weight)
+            if self.gcn_concat:
+                atoms = gelu(out)
+                collected_atoms.append(atoms)
+            else:
+                atoms = atoms + relu(out)
+
+        if self.gcn_concat:
+            atoms = torch.cat(collected_atoms, dim=-1)
+
+        embedding = torch.zeros(num_graphs, self.embedding_dim, dtype=atoms.dtype)
+        embedding = embedding.index_add(0, batch, atoms)
+
+        outputs: List[Tensor] = []
+        for predictor in self.predictors:
+            y = predictor(embedding)
+            outputs.append(
+                torch.softmax(y, dim=-1) if self.softmax else torch.sigmoid(y)
+            )
+
+        return outputs
+
+
+def quantize_output_layers(network: Module, layer_names: List[str]) -> Module:
+    """Quantizes the weights of the given linear layers of the network to int8
+    with per-channel scales (dynamic quantization, the activations are
+    quantized on the fly). The output layers of the policy network have one
+    channel per reaction rule, so they dominate the size and the time of the
+    network for the large sets of reaction rules.
+
+    :param network: The network (in the evaluation mode).
+    :param layer_names: The names of the linear layers (or modules
+        containing them) to be quantized.
+    :return: The network with the quantized layers.
+    """
+
+    return quantize_dynamic(
+        network,
+        qconfig_spec={name: per_channel_dynamic_qconfig for name in layer_names},
+        dtype=torch.qint8,
+        inplace=True,
+    )
+
+
+def export_network(network: Module, output_file: str, quantize: bool = False) -> str:
+    """Exports the trained policy or value network to the TorchScript file,
+    which is loaded with load_exported_network.
+
+    :param network: The trained policy network (PolicyNetwork) or value
+        network (ValueNetwork).
+    :param output_file: The path to the file where the exported network
+        will be stored.
+    :param quantize: If True, the weights of the output layers are
+        quantized to int8 (see quantize_output_layers).
+    :return: The path to the file with the exported network.
+    """
+
+    embedder = network.embedder
+    gcn_concat = isinstance(embedder.gcn_convs[0], ModuleDict)
+    convs = [conv["gcn"] if gcn_concat else conv for conv in embedder.gcn_convs]
+
+    if hasattr(network, "y_predictor"):
+        meta = {"network_type": "policy", "policy_type": network.policy_type}
+        predictors = [network.y_predictor]
+        if network.policy_type == "filtering":
+            predictors.append(network.priority_predictor)
+    else:
+        meta = {"network_type": "value"}
+        predictors = [network.predictor]
+
+    exported = ExportedNetwork(
+        vector_dim=embedder.expansion.out_features * (len(convs) if gcn_concat else 1),
+        num_conv_layers=len(convs),
+        num_outputs=[predictor.out_features for predictor in predictors],
+        gcn_concat=gcn_concat,
+        softmax=meta.get("policy_type") == "ranking",
+    )
+
+    with torch.no_grad():
+        exported.expansion.load_state_dict(embedder.expansion.state_dict())
+        for exported_conv, conv in zip(exported.gcn_convs, convs):
+            exported_conv.lin.weight.copy_(conv.lin.weight)
+            exported_conv.bias.copy_(conv.bias)
+        for exported_predictor, predictor in zip(exported.predictors, predictors):
+            exported_predictor.load_state_dict(predictor.state_dict())
+
+    exported.eval()
+    if quantize:
+        exported = quantize_output_layers(exported, ["predictors"])
+    meta["quantized"] = quantize
+
+    torch.jit.save(
+        torch.jit.script(exported),
+        output_file,
+        _extra_files={EXPORT_META_FILE: json.dumps(meta)},
+    )
+
+    return output_file
+
+
+def is_exported_network(weights_path: str) -> bool:
+    """Checks if the file is the network exported with export_network (and
+    not the PyTorch Lightning checkpoint).
+
+    :param weights_path: The path to the network weights file.
+    :return: True if the file is the exported network.
+    """
+
+    if not zipfile.is_zipfile(weights_path):
+        return False
+
+    with zipfile.ZipFile(weights_path) as archive:
+        return any(
+            name.endswith(f"/extra/{EXPORT_META_FILE}") for name in archive.namelist()
+        )
+
+
+def load_exported_network(weights_path: str) -> Tuple[Module, Dict[str, Any]]:
+    """Loads the network exported with export_network.
+
+    :param weights_path: The path to the exported network file.
+    :return: The network (in the evaluation mode) and its description
+        (the network type, whether the output layers are quantized and,
+        for the policy network, the policy type).
+    """
+
+    extra_files = {EXPORT_META_FILE: ""}
+    network = torch.jit.load(
+        weights_path, map_location=torch.device("cpu"), _extra_files=extra_files
+    )
+    return network.eval(), json.loads(extra_files[EXPORT_META_FILE])
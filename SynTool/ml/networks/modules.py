@@ -149,6 +149,17 @@ class MCTSNetwork(LightningModule, ABC):
         self.batch_size = batch_size
         self.lr = learning_rate
 
+    def embed(self, batch: Batch) -> Tensor:
+        """Calculates the embeddings of the molecular graphs of the batch.
+
+        :param batch: The batch of molecular graphs (or a single graph).
+        :return: The graph embeddings (one row per graph).
+        """
+
+        # the batch is pooled by its own number of graphs, since the batches collated
+        # at inference can be of any size (not the training batch size)
+        return self.embedder(batch, getattr(batch, "num_graphs", 1))
+
     @abstractmethod
     def forward(self, batch: Batch) -> Tensor:
         """The forward function takes a batch of input data and performs
@@ -53,7 +53,7 @@ class PolicyNetwork(MCTSNetwork, LightningModule, ABC):
             of successful application of regular and priority reaction
             rules.
         """
-        x = self.embedder(batch, self.batch_size)
+        x = self.embed(batch)
         y = self.y_predictor(x)
 
         if self.policy_type == "ranking":
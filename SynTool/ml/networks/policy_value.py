@@ -0,0 +1,151 @@
+"""Module containing main class for the combined policy and value network."""
+
+from abc import ABC
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+from pytorch_lightning import LightningModule
+from torch import Tensor
+from torch.nn import Linear
+from torch.nn.functional import (binary_cross_entropy_with_logits,
+                                 cross_entropy, one_hot)
+from torch_geometric.data.batch import Batch
+from torchmetrics.functional.classification import (binary_recall,
+                                                    binary_specificity, recall,
+                                                    specificity)
+
+from SynTool.ml.networks.modules import MCTSNetwork
+
+
+class PolicyValueNetwork(MCTSNetwork, LightningModule, ABC):
+    """Policy and value network with the shared graph embedding."""
+
+    def __init__(
+        self,
+        *args: Any,
+        n_rules: int,
+        vector_dim: int,
+        policy_type: str = "ranking",
+        **kwargs: Any
+    ) -> None:
+        """Initializes the combined policy and value network with one graph
+        embedding, and creates linear layers for predicting the regular and
+        priority reaction rules (policy heads) and the synthesisability of the
+        retron (value head).
+
+        :param n_rules: The number of reaction rules in the policy
+            network.
+        :param vector_dim: The dimensionality of the graph embedding.
+        :param policy_type: The type of the policy network, "ranking" or
+            "filtering".
+        """
+        super().__init__(vector_dim, *args, **kwargs)
+        self.save_hyperparameters()
+        self.policy_type = policy_type
+        self.n_rules = n_rules
+        self.y_predictor = Linear(vector_dim, n_rules)
+
+        if self.policy_type == "filtering":
+            self.priority_predictor = Linear(vector_dim, n_rules)
+
+        self.value_predictor = Linear(vector_dim, 1)
+
+    def predict_policy(self, x: Tensor) -> Tuple[Tensor, Optional[Tensor]]:
+        """Predicts the reaction rules from the graph embeddings.
+
+        :param x: The graph embeddings.
+        :return: The probabilities of the reaction rules (given by
+            softmax for the ranking policy and by sigmoid for the filtering
+            policy) and the probabilities of the priority reaction rules
+            (None for the ranking policy).
+        """
+
+        if self.policy_type == "ranking":
+            return torch.softmax(self.y_predictor(x), dim=-1), None
+
+        return (
+            torch.sigmoid(self.y_predictor(x)),
+            torch.sigmoid(self.priority_predictor(x)),
+        )
+
+    def predict_value(self, x: Tensor) -> Tensor:
+        """Predicts the synthesisability from the graph embeddings.
+
+        :param x: The graph embeddings.
+        :return: The predicted synthesisability (between 0 and 1).
+        """
+        return torch.sigmoid(self.value_predictor(x))
+
+    def forward(self, batch: Batch) -> Tuple[Tensor, Optional[Tensor], Tensor]:
+        """Takes a batch of molecular graphs, applies a graph convolution once
+        and predicts both the reaction rules and the synthesisability.
+
+        :param batch: The batch of molecular graphs.
+        :return: The probabilities of the regular and priority (None for
+            the ranking policy) reaction rules, and the predicted
+            synthesisability.
+        """
+
+        x = self.embed(batch)
+        probs, priority = self.predict_policy(x)
+        return probs, priority, self.predict_value(x)
+
+    def freeze_policy(self) -> None:
+        """Freezes the graph embedding and the policy heads, so only the value
+        head is trained (used in the reinforcement tuning of the value head,
+        which must not change the policy).
+
+        :return: None.
+        """
+
+        for name, parameter in self.named_parameters():
+            if not name.startswith("value_predictor."):
+                parameter.requires_grad_(False)
+
+    def _get_loss(self, batch: Batch) -> Dict[str, Tensor]:
+        """Calculates the loss and the balanced accuracy for a given batch.
+        The policy loss is calculated for the batches of the policy network
+        dataset (with the reaction rules labels), and the value loss for the
+        batches of the value network dataset (with the synthesisability
+        labels).
+
+        :param batch: The batch of molecular graphs.
+        :return: The dictionary with loss value and balanced accuracy of
+            reaction rules and synthesisability prediction.
+        """
+
+        x = self.embedder(batch, self.batch_size)
+        metrics, loss = {}, 0.0
+
+        if getattr(batch, "y_rules", None) is not None:
+            true_y = batch.y_rules.long()
+            pred_y = self.y_predictor(x)
+            if self.policy_type == "ranking":
+                true_one_hot = one_hot(true_y, num_classes=self.n_rules)
+                loss = loss + cross_entropy(pred_y, true_one_hot.float())
+                task, num = "multiclass", {"num_classes": self.n_rules}
+            else:
+                loss = loss + binary_cross_entropy_with_logits(pred_y, true_y.float())
+                loss = loss + binary_cross_entropy_with_logits(
+                    self.priority_predictor(x), batch.y_priority.float()
+                )
+                task, num = "multilabel", {"num_labels": self.n_rules}
+
+            metrics["balanced_accuracy_y"] = (
+                recall(pred_y, true_y, task=task, **num)
+                + specificity(pred_y, true_y, task=task, **num)
+            ) / 2
+
+        if getattr(batch, "y", None) is not None:
+            true_value = torch.unsqueeze(batch.y.float(), -1)
+            pred_value = self.value_predictor(x)
+            loss = loss + binary_cross_entropy_with_logits(pred_value, true_value)
+
+            true_value = true_value.long()
+            metrics["balanced_accuracy"] = (
+                binary_recall(pred_value, true_value)
+                + binary_specificity(pred_value, true_value)
+            ) / 2
+
+        metrics["loss"] = loss
+        return metrics
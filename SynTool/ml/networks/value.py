@@ -40,7 +40,7 @@ class ValueNetwork(MCTSNetwork, LightningModule, ABC):
         :return: The predicted synthesisability (between 0 and 1).
         """
 
-        x = self.embedder(batch, self.batch_size)
+        x = self.embed(batch)
         x = torch.sigmoid(self.predictor(x))
         return x
 
@@ -0,0 +1,132 @@
+"""Module containing a class RuleIndex for the approximate search of the
+reaction rules with the highest logits of the policy network output layer."""
+
+from typing import Tuple
+
+import torch
+from torch import Tensor
+
+
+class RuleIndex:
+    """Approximate maximum inner product index over the rows of the output layer
+    of the policy network. The rows (weights and bias of each reaction rule)
+    are clustered with k-means, and for the given graph embedding only the
+    reaction rules of the clusters with the highest centroid logits are scored.
+    With the number of clusters close to the square root of the number of
+    reaction rules, the time of the search grows sublinearly with the number
+    of reaction rules.
+
+    The centroid logit is the mean logit of the reaction rules of the
+    cluster, so the log-sum-exp of the logits of the reaction rules out of
+    the probed clusters is estimated from below by the log-sum-exp of the
+    centroid logits shifted by the logarithms of the cluster sizes (Jensen's
+    inequality). It is used to normalize the probabilities of the candidate
+    reaction rules.
+    """
+
+    def __init__(
+        self,
+        weight: Tensor,
+        bias: Tensor,
+        num_clusters: int,
+        num_probes: int,
+        num_iterations: int = 10,
+        seed: int = 42,
+    ) -> None:
+        """Builds the index of the output layer.
+
+        :param weight: The weight matrix of the output layer (one row per
+            reaction rule).
+        :param bias: The bias of the output layer.
+        :param num_clusters: The number of clusters of the reaction
+            rules.
+        :param num_probes: The number of clusters with the highest
+            centroid logits scored for each graph embedding.
+        :param num_iterations: The number of k-means iterations.
+        :param seed: The random seed of the k-means initialization.
+        """
+
+        self.weight = weight.detach().float()
+        self.bias = bias.detach().float()
+        self.num_probes = num_probes
+
+        # the rows augmented with the bias, so the logit is the inner product with [x, 1]
+        rows = torch.cat((self.weight, self.bias.unsqueeze(1)), dim=1)
+        num_clusters = min(num_clusters, len(rows))
+
+        generator = torch.Generator().manual_seed(seed)
+        centroids = rows[torch.randperm(len(rows), generator=generator)[:num_clusters]]
+        for _ in range(num_iterations):
+            clusters = self._assign(rows, centroids)
+            counts = torch.bincount(clusters, minlength=num_clusters)
+            sums = torch.zeros_like(centroids).index_add_(0, clusters, rows)
+            not_empty = counts > 0  # the empty clusters keep their centroids
+            centroids[not_empty] = sums[not_empty] / counts[not_empty].unsqueeze(1)
+
+        clusters = self._assign(rows, centroids)
+        counts = torch.bincount(clusters, minlength=num_clusters)
+        sums = torch.zeros_like(centroids).index_add_(0, clusters, rows)
+        not_empty = counts > 0  # the centroids are the means of the final clusters
+        centroids[not_empty] = sums[not_empty] / counts[not_empty].unsqueeze(1)
+
+        self.centroids = centroids
+        self.log_counts = torch.log(counts.float())  # -inf for the empty clusters
+        self.members = torch.argsort(clusters, stable=True)
+        self.offsets = torch.cat(
+            (torch.zeros(1, dtype=torch.long), torch.cumsum(counts, 0))
+        ).tolist()
+
+    @staticmethod
+    def _assign(rows: Tensor, centroids: Tensor, chunk_size: int = 8192) -> Tensor:
+        """Assigns the rows to the nearest centroids.
+
+        :param rows: The rows of the output layer.
+        :param centroids: The centroids of the clusters.
+        :param chunk_size: The number of rows assigned at once.
+        :return: The cluster of each row.
+        """
+
+        centroids_norm = (centroids * centroids).sum(dim=1)
+        return torch.cat(
+            [
+                (centroids_norm - 2 * chunk @ centroids.T).argmin(dim=1)
+                for chunk in torch.split(rows, chunk_size)
+            ]
+        )
+
+    def candidates(self, x: Tensor, min_candidates: int) -> Tuple[Tensor, Tensor]:
+        """Returns the reaction rules of the clusters with the highest centroid
+        logits for the graph embedding. More clusters are taken if the probed
+        clusters contain less than min_candidates reaction rules.
+
+        :param x: The graph embedding.
+        :param min_candidates: The minimal number of the returned
+            reaction rules.
+        :return: The ids of the candidate reaction rules and the
+            estimated log-sum-exp of the logits of the other reaction
+            rules (-inf if there are no other reaction rules).
+        """
+
+        scores = self.centroids[:, :-1] @ x + self.centroids[:, -1]
+        order = torch.argsort(scores, descending=True)
+        members, num_candidates, num_probed = [], 0, 0
+        for cluster in order.tolist():
+            if num_probed >= self.num_probes and num_candidates >= min_candidates:
+                break
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            members.append(self.members[start:end])
+            num_candidates += end - start
+            num_probed += 1
+
+        rest = order[num_probed:]
+        rest_logsumexp = torch.logsumexp(scores[rest] + self.log_counts[rest], -1)
+        return torch.cat(members), rest_logsumexp
+
+    def logits(self, x: Tensor, rule_ids: Tensor) -> Tensor:
+        """Calculates the logits of the given reaction rules.
+
+        :param x: The graph embedding.
+        :param rule_ids: The ids of the reaction rules.
+        :return: The logits of the reaction rules.
+        """
+        return self.weight[rule_ids] @ x + self.bias[rule_ids]
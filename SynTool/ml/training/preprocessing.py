@@ -11,17 +11,16 @@ import ray
 import torch
 from CGRtools import smiles
 from CGRtools.containers import MoleculeContainer
-from CGRtools.exceptions import InvalidAromaticRing
 from CGRtools.reactor import Reactor
 from ray.util.queue import Empty, Queue
 from torch import Tensor
 from torch_geometric.data import InMemoryDataset
 from torch_geometric.data.data import Data
 from torch_geometric.data.makedirs import makedirs
-from torch_geometric.transforms import ToUndirected
 from tqdm import tqdm
 
 from SynTool.chem.utils import unite_molecules
+from SynTool.ml.featurization import MENDEL_INFO, mol_to_pyg
 from SynTool.utils.files import ReactionReader
 from SynTool.utils.loading import load_reaction_rules
 
@@ -420,106 +419,3 @@ def mol_to_matrix(molecule: MoleculeContainer) -> Tensor:
         atoms_vectors[n - 1][8:] = bonds_to_vector(molecule, n)
 
     return atoms_vectors
-
-
-def mol_to_pyg(
-    molecule: MoleculeContainer, canonicalize: bool = True
-) -> Optional[Data]:
-    """Takes a list of molecules and returns a list of PyTorch Geometric
-    graphs, a one- hot encoded vectors of the atoms, and a matrices of the
-    bonds.
-
-    :param molecule: The molecule to be converted to PyTorch Geometric
-        graph.
-    :param canonicalize: If True, the input molecule is canonicalized.
-    :return: The list of PyGraph objects.
-    """
-
-    if len(molecule) == 1:  # to avoid a Retron to be a single atom
-        return None
-
-    tmp_molecule = molecule.copy()
-    try:
-        if canonicalize:
-            tmp_molecule.canonicalize()
-        tmp_molecule.kekule()
-        if tmp_molecule.check_valence():
-            return None
-    except InvalidAromaticRing:
-        return None
-
-    # remapping target for torch_geometric because
-    # it is necessary that the elements in edge_index only hold nodes_idx in the range { 0, ..., num_nodes - 1}
-    new_mappings = {n: i for i, (n, _) in enumerate(tmp_molecule.atoms(), 1)}
-    tmp_molecule.remap(new_mappings)
-
-    # get edge indexes from target mapping
-    edge_index = []
-    for atom, neighbour, bond in tmp_molecule.bonds():
-        edge_index.append([atom - 1, neighbour - 1])
-    edge_index = torch.tensor(edge_index, dtype=torch.long)
-
-    #
-    x = mol_to_matrix(tmp_molecule)
-
-    mol_pyg_graph = Data(x=x, edge_index=edge_index.t().contiguous())
-    mol_pyg_graph = ToUndirected()(mol_pyg_graph)
-
-    assert mol_pyg_graph.is_undirected()
-
-    return mol_pyg_graph
-
-
-MENDEL_INFO = {
-    "Ag": (5, 11, 1, 1),
-    "Al": (3, 13, 2, 1),
-    "Ar": (3, 18, 2, 6),
-    "As": (4, 15, 2, 3),
-    "B": (2, 13, 2, 1),
-    "Ba": (6, 2, 1, 2),
-    "Bi": (6, 15, 2, 3),
-    "Br": (4, 17, 2, 5),
-    "C": (2, 14, 2, 2),
-    "Ca": (4, 2, 1, 2),
-    "Ce": (6, None, 1, 2),
-    "Cl": (3, 17, 2, 5),
-    "Cr": (4, 6, 1, 1),
-    "Cs": (6, 1, 1, 1),
-    "Cu": (4, 11, 1, 1),
-    "Dy": (6, None, 1, 2),
-    "Er": (6, None, 1, 2),
-    "F": (2, 17, 2, 5),
-    "Fe": (4, 8, 1, 2),
-    "Ga": (4, 13, 2, 1),
-    "Gd": (6, None, 1, 2),
-    "Ge": (4, 14, 2, 2),
-    "Hg": (6, 12, 1, 2),
-    "I": (5, 17, 2, 5),
-    "In": (5, 13, 2, 1),
-    "K": (4, 1, 1, 1),
-    "La": (6, 3, 1, 2),
-    "Li": (2, 1, 1, 1),
-    "Mg": (3, 2, 1, 2),
-    "Mn": (4, 7, 1, 2),
-    "N": (2, 15, 2, 3),
-    "Na": (3, 1, 1, 1),
-    "Nd": (6, None, 1, 2),
-    "O": (2, 16, 2, 4),
-    "P": (3, 15, 2, 3),
-    "Pb": (6, 14, 2, 2),
-    "Pd": (5, 10, 3, 10),
-    "Pr": (6, None, 1, 2),
-    "Rb": (5, 1, 1, 1),
-    "S": (3, 16, 2, 4),
-    "Sb": (5, 15, 2, 3),
-    "Se": (4, 16, 2, 4),
-    "Si": (3, 14, 2, 2),
-    "Sm": (6, None, 1, 2),
-    "Sn": (5, 14, 2, 2),
-    "Sr": (5, 2, 1, 2),
-    "Te": (5, 16, 2, 4),
-    "Ti": (4, 4, 1, 2),
-    "Tl": (6, 13, 2, 1),
-    "Yb": (6, None, 1, 2),
-    "Zn": (4, 12, 1, 2),
-}
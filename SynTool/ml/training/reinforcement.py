@@ -3,6 +3,7 @@ tuning approach."""
 
 import os
 import random
+import shutil
 from collections import defaultdict
 from pathlib import Path
 from random import shuffle
@@ -15,9 +16,9 @@ from torch.utils.data import random_split
 from torch_geometric.data.lightning import LightningDataset
 
 from SynTool.chem.retron import compose_retrons
-from SynTool.mcts.evaluation import ValueNetworkFunction
-from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.search import load_search_functions
 from SynTool.mcts.tree import Tree
+from SynTool.ml.networks.policy_value import PolicyValueNetwork
 from SynTool.ml.networks.value import ValueNetwork
 from SynTool.ml.training.preprocessing import ValueNetworkDataset
 from SynTool.utils.config import (PolicyNetworkConfig, ReinforcementConfig,
@@ -109,8 +110,9 @@ def run_tree_search(
     """
 
     # policy and value function loading
-    policy_function = PolicyNetworkFunction(policy_config=policy_config)
-    value_function = ValueNetworkFunction(weights_path=value_config.weights_path)
+    policy_function, value_function = load_search_functions(
+        tree_config, policy_config, value_config.weights_path
+    )
     reaction_rules = load_reaction_rules(reaction_rules_path)
     building_blocks = load_building_blocks(building_blocks_path)
 
@@ -210,18 +212,31 @@ def create_tuning_set(
 
 
 def tune_value_network(
-    datamodule: LightningDataset, value_config: ValueNetworkConfig
+    datamodule: LightningDataset,
+    value_config: ValueNetworkConfig,
+    value_head: bool = False,
 ) -> None:
     """Trains the value network using a given tuning data and saves the trained
     neural network.
 
     :param datamodule: The tuning dataset (LightningDataset).
     :param value_config: The value network configuration.
+    :param value_head: If True, the value network is the value head of
+        the policy and value network. Only the value head is trained, so
+        the policy is not changed.
     :return: None.
     """
 
     current_weights = value_config.weights_path
-    value_network = load_value_net(ValueNetwork, current_weights)
+    if value_head:
+        value_network = PolicyValueNetwork.load_from_checkpoint(
+            current_weights,
+            map_location=torch.device("cpu"),
+            batch_size=value_config.batch_size,
+        )
+        value_network.freeze_policy()
+    else:
+        value_network = load_value_net(ValueNetwork, current_weights)
 
     with DisableLogger(), HiddenPrints():
         trainer = Trainer(
@@ -257,13 +272,17 @@ def tune_value_network(
 
 
 def run_training(
-    extracted_retrons: Dict[str, float] = None, value_config: ValueNetworkConfig = None
+    extracted_retrons: Dict[str, float] = None,
+    value_config: ValueNetworkConfig = None,
+    value_head: bool = False,
 ) -> None:
     """Runs the training stage in reinforcement value network tuning.
 
     :param extracted_retrons: The retrons extracted from the planing
         simulations.
     :param value_config: The value network configuration.
+    :param value_head: If True, the value head of the policy and value
+        network is tuned.
     :return: None.
     """
 
@@ -273,7 +292,9 @@ def run_training(
     )
 
     # retrain value network
-    tune_value_network(datamodule=training_set, value_config=value_config)
+    tune_value_network(
+        datamodule=training_set, value_config=value_config, value_head=value_head
+    )
 
 
 #
@@ -405,8 +426,15 @@ def run_reinforcement_tuning(
         targets = list(targets)
 
     # create value neural network
-    value_config.weights_path = os.path.join(results_root, "value_network.ckpt")
-    create_value_network(value_config)
+    if policy_config.value_head:  # the value head of the policy network is tuned
+        value_config.weights_path = os.path.join(
+            results_root, "policy_value_network.ckpt"
+        )
+        shutil.copyfile(policy_config.weights_path, value_config.weights_path)
+        policy_config.weights_path = value_config.weights_path
+    else:
+        value_config.weights_path = os.path.join(results_root, "value_network.ckpt")
+        create_value_network(value_config)
 
     # create targets batch
     targets_batch_list = create_targets_batch(
@@ -431,4 +459,8 @@ def run_reinforcement_tuning(
         extracted_retrons = extract_tree_retrons(tree_list)
 
         # train value network for extracted retrons
-        run_training(extracted_retrons=extracted_retrons, value_config=value_config)
+        run_training(
+            extracted_retrons=extracted_retrons,
+            value_config=value_config,
+            value_head=policy_config.value_head,
+        )
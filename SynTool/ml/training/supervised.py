@@ -14,6 +14,7 @@ from torch.utils.data import random_split
 from torch_geometric.data.lightning import LightningDataset
 
 from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.networks.policy_value import PolicyValueNetwork
 from SynTool.ml.training.preprocessing import (FilteringPolicyDataset,
                                                RankingPolicyDataset)
 from SynTool.utils.config import PolicyNetworkConfig
@@ -87,7 +88,9 @@ def run_policy_training(
     accelerator: str = "gpu",
 ) -> None:
     """Trains a policy network using a given datamodule and training
-    configuration.
+    configuration. If config.value_head is True, the policy and value network
+    (PolicyValueNetwork) is trained, and its value head is trained later in
+    the reinforcement tuning.
 
     :param datamodule: A PyTorch Lightning `DataModule` class instance. It is responsible for
      loading, processing, and preparing the training data for the model.
@@ -104,7 +107,8 @@ def run_policy_training(
 
     with DisableLogger():
 
-        network = PolicyNetwork(
+        network_class = PolicyValueNetwork if config.value_head else PolicyNetwork
+        network = network_class(
             vector_dim=config.vector_dim,
             n_rules=datamodule.train_dataset.dataset.num_classes,
             batch_size=config.batch_size,
@@ -0,0 +1,216 @@
+"""Module containing a class BuildingBlocksIndex that stores the building blocks
+on disk as the memory-mapped array of their hashes."""
+
+import os
+import pickle
+from bisect import bisect_left
+from hashlib import blake2b
+from math import ceil, log
+from typing import Iterable, Optional, Set
+
+import numpy as np
+from tqdm.auto import tqdm
+
+from SynTool.utils.files import MoleculeReader
+
+
+def hash_building_block(smiles: str) -> int:
+    """Returns the 64-bit hash of the building block SMILES used as the key in
+    the building blocks index.
+
+    :param smiles: The canonical SMILES of the building block.
+    :return: The 64-bit hash of the SMILES.
+    """
+    return int.from_bytes(
+        blake2b(smiles.encode(), digest_size=8).digest(), byteorder="little"
+    )
+
+
+def bloom_path(index_path: str) -> str:
+    """Returns the path to the file with the Bloom filter of the building blocks
+    index.
+
+    :param index_path: The path to the building blocks index file.
+    :return: The path to the Bloom filter file.
+    """
+    return f"{os.path.splitext(index_path)[0]}.bloom.npy"
+
+
+def bloom_num_hashes(num_bits: int, num_keys: int) -> int:
+    """Returns the optimal number of hash functions of the Bloom filter.
+
+    :param num_bits: The number of bits in the Bloom filter.
+    :param num_keys: The number of keys stored in the Bloom filter.
+    :return: The number of hash functions.
+    """
+    return max(1, round(num_bits / max(num_keys, 1) * log(2)))
+
+
+def read_building_blocks(building_blocks_path: str) -> Iterable[str]:
+    """Reads the SMILES of the building blocks from the SMILES/SDF file or from
+    the pickled set of SMILES.
+
+    :param building_blocks_path: The path to the file containing the
+        building blocks.
+    :return: The SMILES of the building blocks.
+    """
+
+    if building_blocks_path.split(".")[-1] == "pickle":
+        with open(building_blocks_path, "rb") as f:
+            yield from pickle.load(f)
+        return
+
+    with MoleculeReader(building_blocks_path) as molecules:
+        for mol in molecules:
+            yield str(mol)
+
+
+def build_building_blocks_index(
+    input_file: str, output_file: str, bloom_fpr: Optional[float] = 0.01
+) -> str:
+    """Builds the building blocks index: the sorted unique 64-bit hashes of the
+    building blocks SMILES saved as .npy file, and optionally the Bloom filter
+    of them saved next to it.
+
+    :param input_file: The path to the file with the canonicalized
+        building blocks (SMILES/SDF file or pickled set of SMILES).
+    :param output_file: The path to the .npy file where the index will
+        be stored.
+    :param bloom_fpr: The false positive rate of the Bloom filter. If
+        None or 0, the Bloom filter is not built.
+    :return: The path to the building blocks index file.
+    """
+
+    if os.path.splitext(output_file)[1] != ".npy":
+        raise ValueError("The building blocks index file must have .npy extension.")
+
+    keys = np.fromiter(
+        (
+            hash_building_block(smiles)
+            for smiles in tqdm(
+                read_building_blocks(input_file),
+                desc="Number of building blocks indexed: ",
+                bar_format="{desc}{n} [{elapsed}]",
+            )
+        ),
+        dtype=np.uint64,
+    )
+    keys = np.unique(keys)  # sorted
+
+    if bloom_fpr:
+        num_bits = max(64, ceil(-len(keys) * log(bloom_fpr) / log(2) ** 2))
+        num_bits = 8 * ceil(num_bits / 8)
+        num_hashes = bloom_num_hashes(num_bits, len(keys))
+
+        bits = np.zeros(num_bits, dtype=bool)
+        h1, h2 = keys & 0xFFFFFFFF, (keys >> np.uint64(32)) | np.uint64(1)
+        for i in range(num_hashes):  # the same bits as in __contains__
+            bits[(h1 + np.uint64(i) * h2) % np.uint64(num_bits)] = True
+        _save_array(bloom_path(output_file), np.packbits(bits, bitorder="little"))
+    elif os.path.exists(bloom_path(output_file)):
+        os.remove(bloom_path(output_file))
+
+    _save_array(output_file, keys)
+
+    return output_file
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    """Saves the array to the .npy file atomically, so that the processes
+    reading the old file are not affected.
+
+    :param path: The path to the .npy file.
+    :param array: The array to be saved.
+    :return: None.
+    """
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class BuildingBlocksIndex:
+    """Read-only set of the building blocks stored on disk as the sorted array
+    of 64-bit hashes of their canonical SMILES, optionally with the Bloom
+    filter in front of it.
+
+    The files are memory-mapped, so the index is opened instantly and
+    all the processes opening it share one page-cached copy. The
+    probability of the hash collision is negligible (about 3e-6 for 10
+    million building blocks).
+    """
+
+    def __init__(self, index_path: str) -> None:
+        """Opens the building blocks index.
+
+        :param index_path: The path to the building blocks index file
+            created with build_building_blocks_index.
+        """
+
+        self.index_path = index_path
+        # memoryviews of the memory maps return python ints, which are much
+        # faster to compare and to search with bisect than the numpy scalars
+        self.keys = memoryview(np.load(index_path, mmap_mode="r"))
+
+        self.bloom = None
+        if os.path.exists(bloom_path(index_path)):
+            self.bloom = memoryview(np.load(bloom_path(index_path), mmap_mode="r"))
+            self._bloom_bits = 8 * len(self.bloom)
+            self._bloom_hashes = bloom_num_hashes(self._bloom_bits, len(self.keys))
+
+        # building blocks excluded from the index in this process
+        self.removed: Set[str] = set()
+
+    def __reduce__(self):
+        """Pickles the index as the path to its file, so it is not copied
+        between the processes."""
+        return self.__class__, (self.index_path,), {"removed": self.removed}
+
+    def __len__(self) -> int:
+        """Returns the number of building blocks in the index."""
+        return len(self.keys)
+
+    def __contains__(self, smiles: str) -> bool:
+        """Checks if the building block is in the index.
+
+        :param smiles: The canonical SMILES of the building block.
+        :return: True if the building block is in the index.
+        """
+
+        if smiles in self.removed:
+            return False
+
+        key = hash_building_block(smiles)
+        if self.bloom is not None:  # double hashing of the halves of the key
+            h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+            for i in range(self._bloom_hashes):
+                position = (h1 + i * h2) % self._bloom_bits
+                if not self.bloom[position >> 3] >> (position & 7) & 1:
+                    return False
+
+        position = bisect_left(self.keys, key)
+        return position < len(self.keys) and self.keys[position] == key
+
+    def remove(self, smiles: str) -> None:
+        """Excludes the building block from the index in the current process
+        (the index file is not changed).
+
+        :param smiles: The canonical SMILES of the building block.
+        :return: None.
+        """
+
+        if smiles not in self:
+            raise KeyError(smiles)
+        self.removed.add(smiles)
+
+    def discard(self, smiles: str) -> None:
+        """Excludes the building block from the index in the current process
+        if it is present.
+
+        :param smiles: The canonical SMILES of the building block.
+        :return: None.
+        """
+
+        if smiles in self:
+            self.removed.add(smiles)
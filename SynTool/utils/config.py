@@ -243,6 +243,25 @@ class PolicyNetworkConfig(ConfigABC):
     :param num_epoch: Number of training epochs.
     :param policy_type: Mode of operation, either 'filtering' or
         'ranking'.
+    :param cache_size: The maximum number of retrons for which the
+        predicted reaction rules are cached in the tree search. If 0,
+        the cache is disabled.
+    :param cache_path: The path to the file where the cached
+        predictions are saved after the tree search and loaded from
+        before it, so they can be shared between runs.
+    :param quantize: If True, the weights of the output layers (reaction
+        rules predictors) are quantized to int8 with per-channel scales
+        for the faster inference in the tree search.
+    :param mips_clusters: The number of clusters of the reaction rules
+        in the approximate index of the policy network output layer, in
+        which only the reaction rules of the most promising clusters are
+        scored. If 0, the index is not used and all the reaction rules
+        are scored.
+    :param mips_probes: The number of clusters scored for each retron
+        with the reaction rules index.
+    :param value_head: If True, the policy network has the value head
+        sharing its graph embedding (PolicyValueNetwork), which is used
+        for the node evaluation instead of the separate value network.
     """
 
     policy_type: str = "ranking"
@@ -259,6 +278,18 @@ class PolicyNetworkConfig(ConfigABC):
     rule_prob_threshold: float = 0.0
     top_rules: int = 50
 
+    # prediction cache
+    cache_size: int = 10000
+    cache_path: str = None
+
+    # inference
+    quantize: bool = False
+    mips_clusters: int = 0
+    mips_probes: int = 8
+
+    # combined policy and value network
+    value_head: bool = False
+
     @staticmethod
     def from_dict(config_dict: Dict[str, Any]) -> "PolicyNetworkConfig":
         return PolicyNetworkConfig(**config_dict)
@@ -317,6 +348,24 @@ class PolicyNetworkConfig(ConfigABC):
         if not isinstance(params["top_rules"], int) or params["top_rules"] <= 0:
             raise ValueError("top_rules must be a positive integer.")
 
+        if not isinstance(params["cache_size"], int) or params["cache_size"] < 0:
+            raise ValueError("cache_size must be a non-negative integer.")
+
+        if not isinstance(params["quantize"], bool):
+            raise ValueError("quantize must be a boolean.")
+
+        if not isinstance(params["mips_clusters"], int) or params["mips_clusters"] < 0:
+            raise ValueError("mips_clusters must be a non-negative integer.")
+
+        if not isinstance(params["mips_probes"], int) or params["mips_probes"] <= 0:
+            raise ValueError("mips_probes must be a positive integer.")
+
+        if params["quantize"] and params["mips_clusters"]:
+            raise ValueError("quantize can not be used with mips_clusters.")
+
+        if not isinstance(params["value_head"], bool):
+            raise ValueError("value_head must be a boolean.")
+
 
 @dataclass
 class TreeConfig(ConfigABC):
@@ -327,6 +376,9 @@ class TreeConfig(ConfigABC):
     :param max_tree_size: The maximum number of nodes in the tree.
     :param max_time: The time limit (in seconds) for the algorithm to
         run.
+    :param max_routes: The number of found routes after which the
+        search is stopped. If 0, the search is not stopped by the number
+        of routes.
     :param max_depth: The maximum depth of the tree.
     :param ucb_type: Type of UCB used in the search algorithm. Options
         are "puct", "uct", "value", defaults to "uct".
@@ -335,13 +387,23 @@ class TreeConfig(ConfigABC):
     :param backprop_type: Type of backpropagation algorithm. Options are
         "muzero", "cumulative", defaults to "muzero".
     :param search_strategy: The strategy used for tree search. Options
-        are "expansion_first", "evaluation_first".
+        are "expansion_first", "evaluation_first" (MCTS) and "best_first"
+        (the nodes are expanded in the order of the estimated cost of
+        the route through them, the heuristic is given by the
+        evaluation function).
     :param exclude_small: Whether to exclude small molecules during the
         search.
     :param evaluation_agg: Method for aggregating evaluation scores.
         Options are "max", "average", defaults to "max".
     :param evaluation_type: The method used for evaluating nodes.
         Options are "random", "rollout", "gcn".
+    :param rollout_policy: The order in which the reaction rules are
+        tried in the rollout (when evaluation_type is "rollout").
+        Options are "policy" (the reaction rules predicted by the policy
+        network) and "popularity" (the most popular reaction rules
+        first, no policy network call is made).
+    :param rollout_top_rules: The number of the most popular reaction
+        rules tried in the rollout with the "popularity" rollout policy.
     :param init_node_value: Initial value for a new node.
     :param epsilon: A parameter in the epsilon-greedy search strategy
         representing the chance of random selection of reaction rules
@@ -354,11 +416,37 @@ class TreeConfig(ConfigABC):
         the threshold for considering larger molecules in the search,
         defaults to 6.
     :param silent: Whether to suppress progress output.
+    :param search_batch_size: The number of leaves selected in one round
+        of the tree search and expanded with a single batched policy
+        network call (each expanded leaf is counted as an iteration). If
+        1, the leaves are expanded one by one.
+    :param virtual_loss: The virtual loss applied to the routes to the
+        leaves already selected in the current round of the batched tree
+        search, needed to diversify the selection of leaves.
+    :param reaction_cache_size: The maximum number of (retron, reaction
+        rule) pairs whose products of reaction rule application are
+        cached and reused in node expansion and rollout. If 0, the
+        cache is disabled.
+    :param transpositions: Whether the nodes with the same retrons to
+        expand reached with different sequences of reaction rules of the
+        same length are merged into one node (the tree becomes a directed acyclic graph),
+        so that they are expanded and evaluated only once.
+    :param retron_table_size: The maximum number of molecules in the
+        intern table of the canonical retrons, with which the identical
+        retrons share one canonical molecule and are canonicalized only
+        once. If 0, the table is disabled.
+    :param graph_cache_size: The maximum number of retrons whose graphs
+        are cached and reused by the value network in the node
+        evaluation. If 0, the cache is disabled.
+    :param search_engine: The search engine used for planning. Options
+        are "tree" (Monte-Carlo tree search) and "and_or" (AND-OR graph
+        search, in which each molecule is expanded once).
     """
 
     max_iterations: int = 100
     max_tree_size: int = 1000000
     max_time: float = 600
+    max_routes: int = 0
     max_depth: int = 6
     ucb_type: str = "uct"
     c_ucb: float = 0.1
@@ -367,10 +455,19 @@ class TreeConfig(ConfigABC):
     exclude_small: bool = True
     evaluation_agg: str = "max"
     evaluation_type: str = "gcn"
+    rollout_policy: str = "policy"
+    rollout_top_rules: int = 50
     init_node_value: float = 0.0
     epsilon: float = 0.0
     min_mol_size: int = 6
     silent: bool = False
+    search_batch_size: int = 1
+    virtual_loss: float = 1.0
+    reaction_cache_size: int = 10000
+    transpositions: bool = False
+    retron_table_size: int = 10000
+    graph_cache_size: int = 10000
+    search_engine: str = "tree"
 
     @staticmethod
     def from_dict(config_dict: Dict[str, Any]) -> "TreeConfig":
@@ -395,6 +492,15 @@ class TreeConfig(ConfigABC):
             raise ValueError(
                 "Invalid evaluation_type. Allowed values are 'random', 'rollout', 'gcn'."
             )
+        if params["rollout_policy"] not in ["policy", "popularity"]:
+            raise ValueError(
+                "Invalid rollout_policy. Allowed values are 'policy', 'popularity'."
+            )
+        if (
+            not isinstance(params["rollout_top_rules"], int)
+            or params["rollout_top_rules"] < 1
+        ):
+            raise ValueError("rollout_top_rules must be a positive integer.")
         if params["evaluation_agg"] not in ["max", "average"]:
             raise ValueError(
                 "Invalid evaluation_agg. Allowed values are 'max', 'average'."
@@ -412,14 +518,51 @@ class TreeConfig(ConfigABC):
             raise ValueError("max_iterations must be a positive integer.")
         if not isinstance(params["max_time"], int) or params["max_time"] < 1:
             raise ValueError("max_time must be a positive integer.")
+        if not isinstance(params["max_routes"], int) or params["max_routes"] < 0:
+            raise ValueError("max_routes must be a non-negative integer.")
         if not isinstance(params["silent"], bool):
             raise TypeError("silent must be a boolean.")
         if not isinstance(params["init_node_value"], float):
             raise TypeError("init_node_value must be a float if provided.")
-        if params["search_strategy"] not in ["expansion_first", "evaluation_first"]:
+        if params["search_strategy"] not in [
+            "expansion_first",
+            "evaluation_first",
+            "best_first",
+        ]:
             raise ValueError(
                 f"Invalid search_strategy: {params['search_strategy']}: "
-                f"Allowed values are 'expansion_first', 'evaluation_first'"
+                f"Allowed values are 'expansion_first', 'evaluation_first', 'best_first'"
+            )
+        if (
+            not isinstance(params["search_batch_size"], int)
+            or params["search_batch_size"] < 1
+        ):
+            raise ValueError("search_batch_size must be a positive integer.")
+        if (
+            not isinstance(params["virtual_loss"], (int, float))
+            or params["virtual_loss"] < 0
+        ):
+            raise ValueError("virtual_loss must be a non-negative number.")
+        if (
+            not isinstance(params["reaction_cache_size"], int)
+            or params["reaction_cache_size"] < 0
+        ):
+            raise ValueError("reaction_cache_size must be a non-negative integer.")
+        if not isinstance(params["transpositions"], bool):
+            raise TypeError("transpositions must be a boolean.")
+        if (
+            not isinstance(params["retron_table_size"], int)
+            or params["retron_table_size"] < 0
+        ):
+            raise ValueError("retron_table_size must be a non-negative integer.")
+        if (
+            not isinstance(params["graph_cache_size"], int)
+            or params["graph_cache_size"] < 0
+        ):
+            raise ValueError("graph_cache_size must be a non-negative integer.")
+        if params["search_engine"] not in ["tree", "and_or"]:
+            raise ValueError(
+                "Invalid search_engine. Allowed values are 'tree', 'and_or'."
             )
 
 
@@ -4,20 +4,24 @@ retrosynthetic models."""
 import functools
 import pickle
 from abc import ABCMeta
-from typing import List, Set
+from typing import List, Set, Union
 
 from CGRtools.reactor.reactor import Reactor
 from torch import device
 
+from SynTool.chem.reaction_rules.compiling import (CompiledReactionRules,
+                                                   is_compiled_reaction_rules)
 from SynTool.ml.networks.policy import PolicyNetwork
 from SynTool.ml.networks.value import ValueNetwork
+from SynTool.utils.building_blocks import BuildingBlocksIndex
 from SynTool.utils.files import MoleculeReader
 
 
 @functools.lru_cache(maxsize=None)
-def load_reaction_rules(file: str) -> List[Reactor]:
+def load_reaction_rules(file: str) -> Union[List[Reactor], CompiledReactionRules]:
     """Loads the reaction rules from a pickle file and converts them into a
-    list of Reactor objects if necessary.
+    list of Reactor objects if necessary. If the file is the compiled planning
+    bundle, the Reactor objects are built lazily when requested.
 
     :param file: The path to the pickle file that stores the reaction
         rules.
@@ -27,6 +31,9 @@ def load_reaction_rules(file: str) -> List[Reactor]:
     with open(file, "rb") as f:
         reaction_rules = pickle.load(f)
 
+    if is_compiled_reaction_rules(reaction_rules):
+        return CompiledReactionRules(reaction_rules)
+
     if not isinstance(reaction_rules[0][0], Reactor):
         reaction_rules = [Reactor(x) for x, _ in reaction_rules]
 
@@ -34,15 +41,22 @@ def load_reaction_rules(file: str) -> List[Reactor]:
 
 
 @functools.lru_cache(maxsize=None)
-def load_building_blocks(building_blocks_path: str) -> Set[str]:
+def load_building_blocks(
+    building_blocks_path: str,
+) -> Union[Set[str], BuildingBlocksIndex]:
     """Loads building blocks data from a file and returns a frozen set of
-    building blocks.
+    building blocks. If the file is the building blocks index (.npy), it is
+    opened without loading the building blocks into memory.
 
     :param building_blocks_path: The path to the file containing the
         building blocks.
-    :return: The frozen set loaded building blocks.
+    :return: The frozen set loaded building blocks or the building
+        blocks index.
     """
 
+    if building_blocks_path.split(".")[-1] == "npy":
+        return BuildingBlocksIndex(building_blocks_path)
+
     # TODO remove later
     if building_blocks_path.split(".")[-1] == "pickle":
         with open(building_blocks_path, "rb") as f:
@@ -0,0 +1,244 @@
+"""Module containing a class RetronMemo that stores the retrons solved or
+proven dead in the previous tree searches in the SQLite database shared
+between the planning processes and runs."""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class RetronMemo:
+    """Persistent memo of the retrons. For each retron (canonical SMILES) it
+    stores the known solved route (in the format of extract_routes), or the
+    depth at which the retron is proven dead (it can not be solved with this
+    or the smaller number of remaining reactions).
+
+    The memo is valid only for the same reaction rules, building blocks
+    and policy network, so the settings of the search are stored in the
+    database, and the records are removed when the memo is opened with other
+    settings. The database is opened in the write-ahead logging mode, so
+    several processes can read and write it at the same time. The new
+    records are written in one transaction with flush.
+    """
+
+    def __init__(
+        self,
+        memo_path: str,
+        timeout: float = 60.0,
+        settings: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Opens (or creates) the retron memo.
+
+        :param memo_path: The path to the SQLite database file.
+        :param timeout: The time (in seconds) to wait for the database
+            locked by another process.
+        :param settings: The settings of the search the records depend
+            on (JSON serializable). If they differ from the settings
+            stored in the database, the records are removed. If None, the
+            stored settings are not checked.
+        """
+
+        self.memo_path = memo_path
+        self.timeout = timeout
+        self.settings = settings
+
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+        # the records read or written in this process (route JSON, dead depth)
+        self._records: Dict[str, Tuple[Optional[str], Optional[int]]] = {}
+        self._pending_routes: Dict[str, str] = {}
+        self._pending_dead: Dict[str, int] = {}
+
+    def __reduce__(self):
+        """Pickles the memo as the path to its file, so each process opens its
+        own connection."""
+        return self.__class__, (self.memo_path, self.timeout, self.settings)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection to the database opened in the current
+        process."""
+
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.memo_path, timeout=self.timeout)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS retrons "
+                "(smiles TEXT PRIMARY KEY, route TEXT, dead_depth INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS settings (settings TEXT)"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+            if self.settings is not None:
+                self._check_settings()
+
+        return self._connection
+
+    def _check_settings(self) -> None:
+        """Removes the records obtained with other settings and stores the
+        current settings in the database.
+
+        :return: None.
+        """
+
+        settings = json.dumps(self.settings, sort_keys=True)
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")  # other processes can check them too
+        try:
+            stored = connection.execute("SELECT settings FROM settings").fetchall()
+            if stored != [(settings,)]:
+                connection.execute("DELETE FROM retrons")
+                connection.execute("DELETE FROM settings")
+                connection.execute(
+                    "INSERT INTO settings (settings) VALUES (?)", (settings,)
+                )
+                self._records.clear()
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def __len__(self) -> int:
+        """Returns the number of retrons in the memo."""
+        return self.connection.execute("SELECT COUNT(*) FROM retrons").fetchone()[0]
+
+    def _record(self, smiles: str) -> Tuple[Optional[str], Optional[int]]:
+        """Returns the record of the retron.
+
+        :param smiles: The canonical SMILES of the retron.
+        :return: The JSON of the solved route and the dead depth of the
+            retron (None if not known).
+        """
+
+        record = self._records.get(smiles)
+        if record is None:
+            record = self.connection.execute(
+                "SELECT route, dead_depth FROM retrons WHERE smiles = ?", (smiles,)
+            ).fetchone()
+            if record is None:  # not cached, it can be added by other processes
+                return None, None
+            self._records[smiles] = record
+
+        return record
+
+    def is_solved(self, smiles: str) -> bool:
+        """Checks if the route of the retron is known.
+
+        :param smiles: The canonical SMILES of the retron.
+        :return: True if the retron is solved.
+        """
+        return self._record(smiles)[0] is not None
+
+    def is_dead(self, smiles: str, depth: int) -> bool:
+        """Checks if the retron is proven dead at the given depth.
+
+        :param smiles: The canonical SMILES of the retron.
+        :param depth: The number of the remaining reactions in the
+            route.
+        :return: True if the retron can not be solved with the given
+            number of reactions.
+        """
+
+        route, dead_depth = self._record(smiles)
+        return route is None and dead_depth is not None and depth <= dead_depth
+
+    def route(self, smiles: str) -> Optional[Dict[str, Any]]:
+        """Returns the known route of the retron.
+
+        :param smiles: The canonical SMILES of the retron.
+        :return: The route in the format of extract_routes, or None if
+            the retron is not solved.
+        """
+
+        route = self._record(smiles)[0]
+        return json.loads(route) if route is not None else None
+
+    def add_route(self, smiles: str, route: Dict[str, Any]) -> None:
+        """Adds the solved route of the retron (if it is not known yet).
+
+        :param smiles: The canonical SMILES of the retron.
+        :param route: The route in the format of extract_routes.
+        :return: None.
+        """
+
+        if self.is_solved(smiles):
+            return
+
+        route = json.dumps(route)
+        self._records[smiles] = (route, None)
+        self._pending_routes[smiles] = route
+
+    def add_routes(self, routes: Iterable[Dict[str, Any]]) -> None:
+        """Adds the routes of all the solved retrons in the routes extracted
+        from the tree (the retrons decomposed by the reactions in the
+        routes).
+
+        :param routes: The routes in the format of extract_routes.
+        :return: None.
+        """
+
+        molecules: List[Dict[str, Any]] = list(routes)
+        while molecules:
+            molecule = molecules.pop()
+            if not molecule.get("children"):  # building block or not solved
+                continue
+
+            self.add_route(molecule["smiles"], molecule)
+            for reaction in molecule["children"]:
+                molecules.extend(reaction["children"])
+
+    def mark_dead(self, smiles: str, depth: int) -> None:
+        """Marks the retron as proven dead at the given depth.
+
+        :param smiles: The canonical SMILES of the retron.
+        :param depth: The number of the remaining reactions with which
+            the retron can not be solved.
+        :return: None.
+        """
+
+        route, dead_depth = self._record(smiles)
+        if route is not None or (dead_depth is not None and dead_depth >= depth):
+            return
+
+        self._records[smiles] = (None, depth)
+        self._pending_dead[smiles] = depth
+
+    def flush(self) -> None:
+        """Writes the new records to the database in one transaction.
+
+        :return: None.
+        """
+
+        if not self._pending_routes and not self._pending_dead:
+            return
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO retrons (smiles, route) VALUES (?, ?) "
+                "ON CONFLICT(smiles) DO UPDATE SET route = COALESCE(route, excluded.route)",
+                self._pending_routes.items(),
+            )
+            self.connection.executemany(
+                "INSERT INTO retrons (smiles, dead_depth) VALUES (?, ?) "
+                "ON CONFLICT(smiles) DO UPDATE SET dead_depth = "
+                "MAX(COALESCE(dead_depth, 0), excluded.dead_depth)",
+                self._pending_dead.items(),
+            )
+
+        self._pending_routes.clear()
+        self._pending_dead.clear()
+
+    def close(self) -> None:
+        """Writes the new records and closes the connection to the database.
+
+        :return: None.
+        """
+
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -2,10 +2,12 @@
 tree."""
 
 from itertools import count, islice
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Union
 
 from CGRtools.containers.molecule import MoleculeContainer
 
+from SynTool.chem.retron import Retron
+from SynTool.mcts.andor import AndOrGraph
 from SynTool.mcts.tree import Tree
 
 
@@ -38,22 +40,34 @@ def get_child_nodes(
         node = get_child_nodes(tree, retron, graph)
         if node:
             temp_obj["children"] = [node]
+        elif (
+            not temp_obj["in_stock"]
+            and tree.retron_memo is not None
+            and tree.retron_memo.is_solved(str(retron))
+        ):
+            # the route of the retron solved in the previous searches
+            temp_obj["children"] = tree.retron_memo.route(str(retron))["children"]
         nodes.append(temp_obj)
     return {"type": "reaction", "children": nodes}
 
 
-def extract_routes(tree: Tree, extended: bool = False) -> List[Dict[str, Any]]:
+def extract_routes(
+    tree: Union[Tree, AndOrGraph], extended: bool = False
+) -> List[Dict[str, Any]]:
     """Takes the target and the dictionary of successors and predecessors and
     returns a list of dictionaries that contain the target and the list of
     successors.
 
-    :param tree: The built tree.
+    :param tree: The built tree (or AND-OR graph).
     :param extended: If True, generates the extended route
         representation.
     :return: A list of dictionaries. Each dictionary contains a target,
         a list of children, and a boolean indicating whether the target
         is in building_blocks.
     """
+    if isinstance(tree, AndOrGraph):
+        return tree.extract_routes()
+
     target = tree.nodes[1].retrons_to_expand[0].molecule
     target_in_stock = tree.nodes[1].curr_retron.is_building_block(tree.building_blocks)
 
@@ -98,6 +112,20 @@ def extract_routes(tree: Tree, extended: bool = False) -> List[Dict[str, Any]]:
     return routes_block
 
 
+def is_route_leaf(tree: Tree, retron: Retron) -> bool:
+    """Checks if the retron is not expanded further in the route: it is a
+    building block or it was solved in the previous searches (its route is
+    stored in the retron memo of the tree).
+
+    :param tree: The built tree.
+    :param retron: The retron in the route.
+    :return: True if the retron is the leaf of the route.
+    """
+    return retron.is_building_block(tree.building_blocks) or (
+        tree.retron_memo is not None and tree.retron_memo.is_solved(str(retron))
+    )
+
+
 def get_route_svg(tree: Tree, node_id: int) -> str:
     """Visualizes the retrosynthesis route.
 
@@ -111,9 +139,7 @@ def get_route_svg(tree: Tree, node_id: int) -> str:
     for n in nodes:
         for retron in n.new_retrons:
             retron.molecule.meta["status"] = (
-                "instock"
-                if retron.is_building_block(tree.building_blocks)
-                else "mulecule"
+                "instock" if is_route_leaf(tree, retron) else "mulecule"
             )
     nodes[0].curr_retron.molecule.meta["status"] = "target"
     # Box colors
@@ -131,9 +157,7 @@ def get_route_svg(tree: Tree, node_id: int) -> str:
     ]
     pred = {x: 0 for x in range(1, len(columns[1]) + 1)}
     cx = [
-        n
-        for n, x in enumerate(nodes[1].new_retrons, 1)
-        if not x.is_building_block(tree.building_blocks)
+        n for n, x in enumerate(nodes[1].new_retrons, 1) if not is_route_leaf(tree, x)
     ]
     size = len(cx)
     nodes = iter(nodes[2:])
@@ -145,15 +169,15 @@ def get_route_svg(tree: Tree, node_id: int) -> str:
             for x in s.new_retrons:
                 layer.append(x)
                 m = next(cy)
-                if not x.is_building_block(tree.building_blocks):
+                if not is_route_leaf(tree, x):
                     cx.append(m)
                 pred[m] = n
         size = len(cx)
         columns.append([x.molecule for x in layer])
 
-    columns = [
-        columns[::-1] for columns in columns[::-1]
-    ]  # Reverse array to make retrosynthetic graph
+    # Reverse array to make retrosynthetic graph. The molecules are copied,
+    # since the same (interned) molecule can occur in the route several times
+    columns = [[m.copy() for m in column[::-1]] for column in columns[::-1]]
     pred = tuple(  # Change dict to tuple to make multiple retrons_to_expand available
         (abs(source - len(pred)), abs(target - len(pred)))
         for target, source in pred.items()
@@ -0,0 +1,158 @@
+"""Benchmark of the int8 quantization of the policy network output layers.
+
+Predicts the reaction rules for the held-out part (validation split of
+create_policy_dataset) of the policy network dataset with the float and the
+quantized output layers, and compares the top-k recall of the reaction rules,
+the agreement of the top-k reaction rules, the size of the output layers and
+the prediction time.
+
+Usage: python benchmark/quantization_benchmark.py POLICY_WEIGHTS DATASET
+    [POLICY_TYPE] [BATCH_SIZE]
+"""
+
+import copy
+import io
+import sys
+from time import perf_counter
+from typing import Dict, List
+
+import torch
+from torch.utils.data import random_split
+from torch_geometric.loader import DataLoader
+
+from SynTool.ml.networks.exported import quantize_output_layers
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.training.preprocessing import (FilteringPolicyDataset,
+                                               RankingPolicyDataset)
+
+TOP_K = (1, 5, 10, 50)
+
+
+def output_layers_size(network: PolicyNetwork) -> int:
+    """Calculates the size of the serialized output layers of the policy
+    network.
+
+    :param network: The policy network.
+    :return: The size of the output layers (in bytes).
+    """
+
+    size = 0
+    for name in ("y_predictor", "priority_predictor"):
+        if hasattr(network, name):
+            buffer = io.BytesIO()
+            torch.save(getattr(network, name).state_dict(), buffer)
+            size += buffer.getbuffer().nbytes
+    return size
+
+
+def evaluate(network: PolicyNetwork, loader: DataLoader) -> Dict[str, object]:
+    """Predicts the reaction rules for the dataset and calculates the top-k
+    recall of the true reaction rules (the reaction rule extracted from the
+    reaction for the ranking policy, the applicable reaction rules for the
+    filtering policy).
+
+    :param network: The policy network.
+    :param loader: The loader of the held-out dataset.
+    :return: The top-k recalls, the top-k predicted reaction rules and the
+        prediction time.
+    """
+
+    recall = {k: 0.0 for k in TOP_K}
+    top_rules: List[torch.Tensor] = []
+    num_graphs, pred_time = 0, 0.0
+    for batch in loader:
+        start = perf_counter()
+        with torch.no_grad():
+            probs = network.forward(batch)
+        pred_time += perf_counter() - start
+
+        if network.policy_type == "filtering":
+            probs = probs[0]
+            true_rules = batch.y_rules.view(probs.shape).bool()
+        else:
+            true_rules = torch.zeros_like(probs, dtype=torch.bool)
+            true_rules[torch.arange(probs.size(0)), batch.y_rules.view(-1)] = True
+
+        ranked = probs.argsort(dim=-1, descending=True)
+        top_rules.append(ranked[:, : max(TOP_K)])
+        num_true = true_rules.sum(dim=-1).clamp(min=1)
+        for k in TOP_K:
+            found = true_rules.gather(1, ranked[:, :k]).sum(dim=-1)
+            recall[k] += (found / num_true.clamp(max=k)).sum().item()
+
+        num_graphs += probs.size(0)
+
+    return {
+        "recall": {k: value / num_graphs for k, value in recall.items()},
+        "top_rules": torch.cat(top_rules),
+        "time": pred_time,
+    }
+
+
+def main(
+    weights_path: str,
+    dataset_path: str,
+    policy_type: str = "ranking",
+    batch_size: int = 100,
+) -> None:
+    """Prints the accuracy and speed of the policy network with the float and
+    the quantized output layers.
+
+    :param weights_path: The path to the policy network weights.
+    :param dataset_path: The path to the policy network dataset created
+        with create_policy_dataset.
+    :param policy_type: The type of the policy network ("ranking" or
+        "filtering").
+    :param batch_size: The number of molecules predicted at once.
+    :return: None.
+    """
+
+    if policy_type == "filtering":
+        dataset = FilteringPolicyDataset(None, None, dataset_path, num_cpus=1)
+    else:
+        dataset = RankingPolicyDataset(None, None, dataset_path)
+
+    # the same validation split as in create_policy_dataset
+    train_size = int(0.8 * len(dataset))
+    _, val_dataset = random_split(
+        dataset,
+        [train_size, len(dataset) - train_size],
+        torch.Generator().manual_seed(42),
+    )
+    loader = DataLoader(val_dataset, batch_size=batch_size)
+
+    network = PolicyNetwork.load_from_checkpoint(
+        weights_path, map_location=torch.device("cpu"), batch_size=1, dropout=0
+    ).eval()
+    quantized = quantize_output_layers(
+        copy.deepcopy(network), ["y_predictor", "priority_predictor"]
+    )
+
+    results = {"float": evaluate(network, loader), "int8": evaluate(quantized, loader)}
+    sizes = {
+        "float": output_layers_size(network),
+        "int8": output_layers_size(quantized),
+    }
+
+    print(f"held-out molecules: {len(val_dataset)}, reaction rules: {network.n_rules}")
+    print(
+        f"{'weights':>7} {'size, MB':>8} {'time, s':>8} "
+        + " ".join(f"{f'recall@{k}':>10}" for k in TOP_K)
+    )
+    for name, result in results.items():
+        print(
+            f"{name:>7} {sizes[name] / 2 ** 20:>8.2f} {result['time']:>8.2f} "
+            + " ".join(f"{result['recall'][k]:>10.4f}" for k in TOP_K)
+        )
+
+    for k in TOP_K:
+        float_top = results["float"]["top_rules"][:, :k]
+        int8_top = results["int8"]["top_rules"][:, :k]
+        agreement = (
+            (float_top.unsqueeze(-1) == int8_top.unsqueeze(-2)).any(-1).float().mean()
+        )
+        print(f"top-{k} agreement of the predicted reaction rules: {agreement:.4f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4], *map(int, sys.argv[4:5]))
@@ -0,0 +1,107 @@
+"""Benchmark of the rollout policies in the tree search.
+
+Plans the target molecules with the rollout evaluation using the reaction
+rules predicted by the policy network ("policy" rollout policy) and the most
+popular reaction rules ("popularity" rollout policy), and compares the number
+of solved targets and the planning time.
+
+Usage: python benchmark/rollout_benchmark.py TARGETS POLICY_WEIGHTS
+    REACTION_RULES BUILDING_BLOCKS [NUM_TARGETS]
+"""
+
+import sys
+from time import perf_counter
+from typing import Dict, List
+
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.tree import Tree
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.files import MoleculeReader
+from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+
+
+def plan_targets(
+    targets: List[str],
+    rollout_policy: str,
+    policy_function: PolicyNetworkFunction,
+    reaction_rules,
+    building_blocks,
+    max_iterations: int = 100,
+) -> Dict[str, float]:
+    """Plans the target molecules with the given rollout policy.
+
+    :param targets: The SMILES of the target molecules.
+    :param rollout_policy: The rollout policy ("policy" or
+        "popularity").
+    :param policy_function: The policy network function used in the
+        expansion.
+    :param reaction_rules: The reaction rules.
+    :param building_blocks: The building blocks.
+    :param max_iterations: The number of iterations of each tree search.
+    :return: The number of solved targets and the planning time.
+    """
+
+    tree_config = TreeConfig(
+        max_iterations=max_iterations,
+        max_depth=9,
+        init_node_value=0.5,
+        evaluation_type="rollout",
+        rollout_policy=rollout_policy,
+        silent=True,
+    )
+
+    solved, start = 0, perf_counter()
+    for target in targets:
+        tree = Tree(
+            target=target,
+            config=tree_config,
+            reaction_rules=reaction_rules,
+            building_blocks=building_blocks,
+            expansion_function=policy_function,
+        )
+        _ = list(tree)
+        solved += bool(tree.winning_nodes)
+
+    return {"solved": solved, "time": perf_counter() - start}
+
+
+def main(
+    targets_path: str,
+    policy_weights_path: str,
+    reaction_rules_path: str,
+    building_blocks_path: str,
+    num_targets: int = 50,
+) -> None:
+    """Prints the number of solved targets and the planning time with both
+    rollout policies.
+
+    :param targets_path: The path to the file with the target molecules.
+    :param policy_weights_path: The path to the policy network weights.
+    :param reaction_rules_path: The path to the reaction rules.
+    :param building_blocks_path: The path to the building blocks.
+    :param num_targets: The number of planned target molecules.
+    :return: None.
+    """
+
+    with MoleculeReader(targets_path) as molecules:
+        targets = [str(mol) for _, mol in zip(range(num_targets), molecules)]
+
+    policy_config = PolicyNetworkConfig(weights_path=policy_weights_path)
+    reaction_rules = load_reaction_rules(reaction_rules_path)
+    building_blocks = load_building_blocks(building_blocks_path)
+
+    print(f"{'rollout':>10} {'solved':>9} {'time, s':>9} {'per target, s':>13}")
+    for rollout_policy in ("policy", "popularity"):
+        # a new policy function, so the predictions are not cached between runs
+        policy_function = PolicyNetworkFunction(policy_config=policy_config)
+        results = plan_targets(
+            targets, rollout_policy, policy_function, reaction_rules, building_blocks
+        )
+        print(
+            f"{rollout_policy:>10} {results['solved']:>4}/{len(targets):<4} "
+            f"{results['time']:>9.1f} {results['time'] / len(targets):>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:5], *map(int, sys.argv[5:6]))
@@ -0,0 +1,96 @@
+"""Benchmark of the reaction rules scoring in the policy function.
+
+Compares the time of the selection of the top reaction rules from the
+outputs of the synthetic policy network output layer: the full sort of the
+probabilities, the top-k selection on the logits (PolicyNetworkFunction
+._rank_rules) and the top-k selection with the reaction rules index (RuleIndex),
+for which the recall of the exact top reaction rules is also reported.
+
+Usage: python benchmark/rule_scoring_benchmark.py
+"""
+
+from timeit import timeit
+from typing import Tuple
+
+import torch
+from torch import Tensor
+
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.ml.rule_index import RuleIndex
+from SynTool.utils.config import PolicyNetworkConfig
+
+
+def output_layer(
+    num_rules: int, vector_dim: int, num_groups: int = 300, seed: int = 42
+) -> Tuple[Tensor, Tensor, Tensor]:
+    """Creates the synthetic output layer, in which the reaction rules form
+    the groups of similar weight rows (as the reaction rules applied to the
+    similar molecules).
+
+    :param num_rules: The number of reaction rules.
+    :param vector_dim: The dimensionality of the graph embedding.
+    :param num_groups: The number of groups of the reaction rules.
+    :param seed: The random seed.
+    :return: The weight matrix, the bias and the centers of the groups.
+    """
+
+    generator = torch.Generator().manual_seed(seed)
+    centers = torch.randn(num_groups, vector_dim, generator=generator)
+    groups = torch.randint(num_groups, (num_rules,), generator=generator)
+    noise = torch.randn(num_rules, vector_dim, generator=generator)
+    weight = (centers[groups] + 0.5 * noise) / vector_dim**0.5
+    bias = 0.1 * torch.randn(num_rules, generator=generator)
+    return weight, bias, centers
+
+
+def main(vector_dim: int = 256, top_rules: int = 50, number: int = 50) -> None:
+    """Prints the time of the selection of the top reaction rules for the
+    growing number of reaction rules.
+
+    :param vector_dim: The dimensionality of the graph embedding.
+    :param top_rules: The number of selected reaction rules.
+    :param number: The number of timed selections.
+    :return: None.
+    """
+
+    policy_function = PolicyNetworkFunction.__new__(PolicyNetworkFunction)
+    policy_function.config = PolicyNetworkConfig(top_rules=top_rules)
+    policy_function.policy_type = "ranking"
+
+    print(
+        f"{'rules':>7} {'sort, ms':>9} {'top-k, ms':>9} "
+        f"{'index, ms':>9} {'recall':>6}"
+    )
+    for num_rules in (10000, 50000, 100000, 200000):
+        weight, bias, centers = output_layer(num_rules, vector_dim)
+        index = RuleIndex(weight, bias, num_clusters=int(num_rules**0.5), num_probes=8)
+        x = centers[0] + 0.5 * torch.randn(vector_dim)
+
+        def full_sort():
+            probs = torch.softmax(weight @ x + bias, -1).double()
+            return torch.sort(probs, descending=True)[1][:top_rules]
+
+        def top_k():
+            return policy_function._rank_rules(weight @ x + bias)
+
+        def indexed():
+            rule_ids, rest_logsumexp = index.candidates(x, top_rules)
+            return policy_function._rank_rules(
+                index.logits(x, rule_ids),
+                rule_ids=rule_ids,
+                rest_logsumexp=rest_logsumexp,
+            )
+
+        exact = set(full_sort().tolist())
+        recall = len(exact & {rule_id for _, rule_id in indexed()}) / top_rules
+
+        print(
+            f"{num_rules:>7} {1000 * timeit(full_sort, number=number) / number:>9.2f} "
+            f"{1000 * timeit(top_k, number=number) / number:>9.2f} "
+            f"{1000 * timeit(indexed, number=number) / number:>9.2f} "
+            f"{recall:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Benchmark of the child node selection in the tree search.
+
+Compares the vectorized UCB selection of Tree._select_node on the tree
+storage with the baseline selection (before the tree storage was introduced),
+which keeps the statistics of the nodes in the dictionaries and scores the
+children one by one, on the synthetic deep trees.
+
+Usage: python benchmark/selection_benchmark.py
+"""
+
+from math import sqrt
+from random import Random
+from timeit import timeit
+from typing import Callable, Dict, Set
+
+from SynTool.mcts.storage import TreeStorage
+from SynTool.mcts.tree import Tree
+from SynTool.utils.config import TreeConfig
+
+
+def build_tree(depth: int, width: int, ucb_type: str, seed: int = 42) -> Tree:
+    """Builds the synthetic tree in which the nodes of the main route are
+    expanded to the given number of children with random statistics.
+
+    :param depth: The depth of the main route of the tree.
+    :param width: The number of children of the expanded nodes.
+    :param ucb_type: The type of UCB used in the selection.
+    :param seed: The random seed.
+    :return: The synthetic tree.
+    """
+
+    rng = Random(seed)
+
+    tree = Tree.__new__(Tree)
+    tree.config = TreeConfig(ucb_type=ucb_type, silent=True)
+    tree.storage = TreeStorage()
+
+    node_id = tree.storage.add_node(None)
+    tree.storage.visits[node_id] = 10 * depth * width
+    for curr_depth in range(1, depth + 1):
+        children = []
+        for _ in range(width):
+            child_id = tree.storage.add_node(
+                None, parent_id=node_id, prob=rng.random(), depth=curr_depth
+            )
+            tree.storage.visits[child_id] = rng.randint(1, 100)
+            tree.storage.init_values[child_id] = rng.uniform(-1, 1)
+            tree.storage.total_values[child_id] = rng.uniform(-1, 1)
+            children.append(child_id)
+
+        # the expanded child has the highest UCB, so the descents reach the leaf
+        node_id = rng.choice(children)
+        tree.storage.init_values[node_id] = tree.storage.total_values[node_id] = 100.0
+
+    return tree
+
+
+class BaselineSelection:
+    """The child node selection of the tree search before the tree storage
+    was introduced: the statistics of the nodes are kept in the dictionaries,
+    and the children are scored one by one."""
+
+    def __init__(self, tree: Tree) -> None:
+        """Copies the statistics of the nodes of the tree to the dictionaries.
+
+        :param tree: The tree.
+        """
+
+        storage = tree.storage
+        node_ids = range(1, storage.size)
+
+        self.config = tree.config
+        self.parents: Dict[int, int] = {i: int(storage.parents[i]) for i in node_ids}
+        self.children: Dict[int, Set[int]] = {
+            i: set(storage.children(i).tolist()) for i in node_ids
+        }
+        self.nodes_visit = {i: int(storage.visits[i]) for i in node_ids}
+        self.nodes_prob = {i: float(storage.probs[i]) for i in node_ids}
+        self.nodes_init_value = {i: float(storage.init_values[i]) for i in node_ids}
+        self.nodes_total_value = {i: float(storage.total_values[i]) for i in node_ids}
+
+    def _ucb(self, node_id: int) -> float:
+        """Calculates the Upper Confidence Bound (UCB) statistics for a given
+        node.
+
+        :param node_id: The id of the node.
+        :return: The calculated UCB.
+        """
+
+        prob = self.nodes_prob[node_id]  # predicted by policy network score
+        visit = self.nodes_visit[node_id]
+
+        if self.config.ucb_type == "puct":
+            u = (
+                self.config.c_ucb * prob * sqrt(self.nodes_visit[self.parents[node_id]])
+            ) / (visit + 1)
+            ucb_value = self.nodes_total_value[node_id] + u
+
+        if self.config.ucb_type == "uct":
+            u = (
+                self.config.c_ucb
+                * sqrt(self.nodes_visit[self.parents[node_id]])
+                / (visit + 1)
+            )
+            ucb_value = self.nodes_total_value[node_id] + u
+
+        if self.config.ucb_type == "value":
+            ucb_value = self.nodes_init_value[node_id] / (visit + 1)
+
+        return ucb_value
+
+    def _select_node(self, node_id: int) -> int:
+        """Selects a node based on its UCB value and returns the id of the node
+        with the highest UCB.
+
+        :param node_id: The id of the node.
+        :return: The id of the node with the highest UCB.
+        """
+
+        best_score, best_children = None, []
+        for child_id in self.children[node_id]:
+            score = self._ucb(child_id)
+            if best_score is None or score > best_score:
+                best_score, best_children = score, [child_id]
+            elif score == best_score:
+                best_children.append(child_id)
+
+        return best_children[0]
+
+
+def descend(select: Callable[[int], int], has_children: Callable[[int], bool]) -> int:
+    """Descends from the root node to the leaf selecting the child nodes.
+
+    :param select: The child node selection function.
+    :param has_children: The function checking if the node has
+        children.
+    :return: The id of the reached leaf.
+    """
+
+    node_id = 1
+    while has_children(node_id):
+        node_id = select(node_id)
+    return node_id
+
+
+def main(depth: int = 9, number: int = 200) -> None:
+    """Prints the time of the tree descents with both selection
+    implementations.
+
+    :param depth: The depth of the synthetic trees.
+    :param number: The number of timed descents.
+    :return: None.
+    """
+
+    print(
+        f"{'ucb':>5} {'width':>5} {'baseline, ms':>12} {'vector, ms':>10} {'speedup':>7}"
+    )
+    for ucb_type in ("uct", "puct", "value"):
+        for width in (5, 20, 50, 100):
+            tree = build_tree(depth, width, ucb_type)
+            baseline = BaselineSelection(tree)
+
+            def baseline_descend():
+                return descend(baseline._select_node, baseline.children.__getitem__)
+
+            def vector_descend():
+                return descend(tree._select_node, tree.storage.child_counts.__getitem__)
+
+            assert baseline_descend() == vector_descend()
+
+            baseline_time = timeit(baseline_descend, number=number)
+            vector_time = timeit(vector_descend, number=number)
+            print(
+                f"{ucb_type:>5} {width:>5} {1000 * baseline_time / number:>12.3f} "
+                f"{1000 * vector_time / number:>10.3f} "
+                f"{baseline_time / vector_time:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Fixtures shared by the tests: the small reaction rules, building blocks and
+policy network for the planning of the test target molecules."""
+
+import pickle
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+import torch
+from CGRtools import smiles
+from pytorch_lightning import Trainer
+
+from SynTool.chem.reaction_rules.extraction import extract_rules, sort_rules
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.utils.config import RuleExtractionConfig
+
+CONFIGS_PATH = Path(__file__).parents[1] / "configs"
+
+REACTIONS = [
+    "[CH3:1][C:2](=[O:3])[OH:4].[NH2:5][c:6]1[cH:7][cH:8][cH:9][cH:10][cH:11]1"
+    ">>[CH3:1][C:2](=[O:3])[NH:5][c:6]1[cH:7][cH:8][cH:9][cH:10][cH:11]1",
+    "[CH3:1][CH2:2][C:3](=[O:4])[OH:5].[NH2:6][CH2:7][c:8]1[cH:9][cH:10][cH:11]"
+    "[cH:12][cH:13]1>>[CH3:1][CH2:2][C:3](=[O:4])[NH:6][CH2:7][c:8]1[cH:9][cH:10]"
+    "[cH:11][cH:12][cH:13]1",
+    "[c:1]1[cH:2][cH:3][cH:4][cH:5][cH:6]1[C:7](=[O:8])[OH:9].[CH3:10][OH:11]"
+    ">>[c:1]1[cH:2][cH:3][cH:4][cH:5][cH:6]1[C:7](=[O:8])[O:11][CH3:10]",
+]
+
+BUILDING_BLOCKS = [
+    "CC(=O)O",
+    "Nc1ccccc1",
+    "CCC(=O)O",
+    "NCc1ccccc1",
+    "OC(=O)c1ccccc1",
+    "CO",
+]
+
+TARGETS = [
+    "CC(=O)Nc1ccccc1",
+    "CCC(=O)NCc1ccccc1",
+    "COC(=O)c1ccccc1",
+    "Cc1ccc(-c2ccccc2)cc1",
+    "CC(=O)Nc1ccc(C(=O)OC)cc1",
+    "CC(=O)Nc1ccc(NC(C)=O)cc1",
+]
+
+
+def save_checkpoint(network, checkpoint_path):
+    """Saves the network as the PyTorch Lightning checkpoint."""
+
+    trainer = Trainer(logger=False, enable_checkpointing=False)
+    trainer.strategy.connect(network)
+    trainer.save_checkpoint(checkpoint_path)
+    return checkpoint_path
+
+
+@pytest.fixture(scope="session")
+def planning_data(tmp_path_factory):
+    """The paths to the reaction rules, building blocks, target molecules and
+    ranking policy network checkpoint for the planning."""
+
+    data_path = tmp_path_factory.mktemp("planning_data")
+
+    config = RuleExtractionConfig.from_yaml(str(CONFIGS_PATH / "extraction.yaml"))
+    rules_stats = defaultdict(list)
+    for i, reaction in enumerate(REACTIONS):
+        for rule in extract_rules(config, smiles(reaction)):
+            rules_stats[rule].append(i)
+    reaction_rules = sort_rules(rules_stats, 1, True)
+
+    reaction_rules_path = data_path / "reaction_rules.pickle"
+    with open(reaction_rules_path, "wb") as f:
+        pickle.dump(reaction_rules, f)
+
+    building_blocks_path = data_path / "building_blocks.smi"
+    building_blocks_path.write_text(
+        "".join(f"{str(smiles(smi))}\n" for smi in BUILDING_BLOCKS)
+    )
+
+    targets_path = data_path / "targets.smi"
+    targets_path.write_text("".join(f"{smi}\n" for smi in TARGETS))
+
+    torch.manual_seed(0)
+    network = PolicyNetwork(
+        n_rules=len(reaction_rules), vector_dim=16, batch_size=1, num_conv_layers=4
+    )
+    policy_path = save_checkpoint(network, str(data_path / "policy.ckpt"))
+
+    return {
+        "reaction_rules": str(reaction_rules_path),
+        "building_blocks": str(building_blocks_path),
+        "targets": str(targets_path),
+        "policy": policy_path,
+    }
@@ -0,0 +1,115 @@
+"""Tests of the AND-OR graph search engine."""
+
+from CGRtools import smiles
+
+from SynTool.chem.retron import Retron
+from SynTool.mcts.andor import AndOrGraph, ReactionNode
+from SynTool.mcts.search import extract_tree_stats, search_target
+from SynTool.utils.config import TreeConfig
+
+BUILDING_BLOCK_TARGET = "CCC(=O)OC"
+
+
+def test_building_block_target_routes():
+    config = TreeConfig(search_engine="and_or", silent=True)
+    graph = AndOrGraph(BUILDING_BLOCK_TARGET, config, [], set(), None)
+    list(graph)
+
+    assert not graph.solved
+    assert graph.extract_routes() == [
+        {
+            "type": "mol",
+            "smiles": str(graph.molecules[0].retron),
+            "in_stock": True,
+            "children": [],
+        }
+    ]
+
+
+def test_building_block_target_search():
+    config = TreeConfig(search_engine="and_or", silent=True)
+    stats, routes, solved = search_target(
+        0, BUILDING_BLOCK_TARGET, config, [], set(), policy_function=None
+    )
+
+    assert not solved
+    assert stats["debug_info"] == "NOT_SOLVED"
+    assert routes[0]["in_stock"] and routes[0]["children"] == []
+
+
+def add_reaction(graph, parent_id, children_smiles, prob):
+    """Adds the solved reaction to the molecule node as the expansion of the
+    graph would do."""
+
+    parent = graph.molecules[parent_id]
+    children = tuple(
+        graph._add_molecule(Retron(smiles(x)), parent.depth + 1)
+        for x in children_smiles
+    )
+    reaction_id = len(graph.reactions)
+    graph.reactions.append(ReactionNode(parent_id, children, 0, prob))
+    parent.reactions.append(reaction_id)
+    parent.expanded = True
+    for child_id in set(children):
+        graph.molecules[child_id].parents.append(reaction_id)
+    graph._evaluate_reaction(graph.reactions[reaction_id])
+    graph._update(parent_id)
+    return children
+
+
+def shared_chain_graph(length, max_routes=0):
+    """Creates the graph, in which each molecule is decomposed by two
+    reactions into the next molecule and a building block, so the number of
+    routes of the target is 2 ** length."""
+
+    config = TreeConfig(
+        search_engine="and_or", max_depth=length + 1, max_routes=max_routes, silent=True
+    )
+    graph = AndOrGraph("C" * 8, config, [], set(), None)
+    molecule_id = 0
+    for i in range(length):
+        next_molecule = "C" * (9 + i) if i < length - 1 else "CCO"
+        add_reaction(graph, molecule_id, [next_molecule, "N"], 0.25)
+        molecule_id = add_reaction(graph, molecule_id, [next_molecule, "O"], 0.5)[0]
+    return graph
+
+
+def test_shared_subgraph_routes():
+    graph = shared_chain_graph(40)
+
+    assert graph.solved
+    assert graph.count_routes(1000) == 1000
+    routes = graph.extract_routes(max_routes=10)
+    assert len(routes) == 10
+
+    # the cheapest route uses the most probable reaction at each step
+    molecule, leaves = routes[0], []
+    while molecule.get("children"):
+        precursors = molecule["children"][0]["children"]
+        leaves.append(precursors[1]["smiles"])
+        molecule = precursors[0]
+    assert leaves == ["O"] * 40
+    assert molecule == {"smiles": "C(O)C", "type": "mol", "in_stock": False}
+
+
+def test_routes_limit():
+    graph = shared_chain_graph(3)
+    assert graph.count_routes(100) == 8
+
+    graph = shared_chain_graph(3, max_routes=5)
+    assert list(graph) == []
+    assert graph.curr_iteration == 0
+
+
+def test_routes_not_capped_by_default():
+    graph = shared_chain_graph(40)
+    assert graph.count_routes() == 2**40
+
+    graph = shared_chain_graph(7)
+    assert len(graph.extract_routes()) == graph.count_routes() == 128
+    assert extract_tree_stats(graph, "C" * 8)["num_routes"] == 128
+
+    # the routes limit of the search is used
+    graph = shared_chain_graph(7, max_routes=20)
+    assert len(graph.extract_routes()) == 20
+    assert extract_tree_stats(graph, "C" * 8)["num_routes"] == 20
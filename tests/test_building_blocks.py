@@ -0,0 +1,66 @@
+"""Tests of the building blocks index."""
+
+import pickle
+
+import pytest
+from CGRtools import smiles
+
+from SynTool.utils.building_blocks import (BuildingBlocksIndex,
+                                           build_building_blocks_index)
+from SynTool.utils.loading import load_building_blocks
+
+
+def canonical_smiles(smi):
+    return str(smiles(smi))
+
+
+BUILDING_BLOCKS = [
+    canonical_smiles("C" * n + group) for n in range(1, 41) for group in ("O", "N")
+]
+OTHER_MOLECULES = [canonical_smiles("C" * n + "S") for n in range(1, 41)]
+
+
+@pytest.fixture(params=[0.01, None], ids=["bloom", "no_bloom"])
+def building_blocks(request, tmp_path):
+    """The building blocks loaded as the set and as the index."""
+
+    building_blocks_path = tmp_path / "building_blocks.smi"
+    building_blocks_path.write_text("".join(f"{smi}\n" for smi in BUILDING_BLOCKS))
+
+    index_path = build_building_blocks_index(
+        str(building_blocks_path), str(tmp_path / "index.npy"), request.param
+    )
+    # the set loader is cached, so the set is not shared with other tests
+    building_blocks_set = load_building_blocks.__wrapped__(str(building_blocks_path))
+    return building_blocks_set, load_building_blocks(index_path)
+
+
+def test_index_matches_set(building_blocks):
+    building_blocks_set, index = building_blocks
+    assert isinstance(index, BuildingBlocksIndex)
+    assert len(index) == len(building_blocks_set)
+
+    for smi in BUILDING_BLOCKS + OTHER_MOLECULES:
+        assert (smi in index) == (smi in building_blocks_set)
+
+
+def test_index_remove_matches_set(building_blocks):
+    building_blocks_set, index = building_blocks
+
+    for smi in BUILDING_BLOCKS[::3]:
+        building_blocks_set.remove(smi)
+        index.remove(smi)
+    for smi in BUILDING_BLOCKS[1::3] + OTHER_MOLECULES:
+        building_blocks_set.discard(smi)
+        index.discard(smi)
+
+    for smi in BUILDING_BLOCKS[::3] + OTHER_MOLECULES:
+        with pytest.raises(KeyError):
+            building_blocks_set.remove(smi)
+        with pytest.raises(KeyError):
+            index.remove(smi)
+
+    # the removed building blocks are kept when the index is sent to a worker
+    for tested_index in (index, pickle.loads(pickle.dumps(index))):
+        for smi in BUILDING_BLOCKS + OTHER_MOLECULES:
+            assert (smi in tested_index) == (smi in building_blocks_set)
@@ -0,0 +1,127 @@
+"""Tests of the reaction rules compiled into the planning bundle."""
+
+import pickle
+
+import pytest
+from CGRtools import smiles
+
+from SynTool.chem.reaction import apply_reaction_rule
+from SynTool.chem.reaction_rules.compiling import (CompiledReactionRules,
+                                                   compile_reaction_rules,
+                                                   molecule_features,
+                                                   satisfies_requirements)
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.tree import Tree
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+from SynTool.utils.visualisation import extract_routes
+
+MOLECULES = [
+    "CC(=O)Nc1ccccc1",
+    "CCC(=O)NCc1ccccc1",
+    "COC(=O)c1ccccc1",
+    "CC(=O)Nc1ccc(C(=O)OC)cc1",
+    "CC(=O)Nc1ccc(NC(C)=O)cc1",
+    "CCCCC(=O)NCCc1ccncc1",
+    "Cc1ccc(-c2ccccc2)cc1",
+    "CCOC(=O)CCN",
+    "O=C1CCCN1c1ccccc1",
+]
+
+
+def molecule(smi):
+    mol = smiles(smi)
+    mol.canonicalize()
+    return mol
+
+
+def products_smiles(reaction_rule, smi):
+    return [
+        [str(mol) for mol in products] if products is not None else None
+        for products in apply_reaction_rule(molecule(smi), reaction_rule)
+    ]
+
+
+@pytest.fixture(scope="module")
+def compiled_rules_path(planning_data, tmp_path_factory):
+    bundle_path = tmp_path_factory.mktemp("compiled") / "reaction_rules.pickle"
+    return compile_reaction_rules(planning_data["reaction_rules"], str(bundle_path))
+
+
+def test_compiled_rules_match_extracted_rules(planning_data, compiled_rules_path):
+    reaction_rules = load_reaction_rules(planning_data["reaction_rules"])
+    compiled_rules = load_reaction_rules(compiled_rules_path)
+    assert isinstance(compiled_rules, CompiledReactionRules)
+    assert len(compiled_rules) == len(reaction_rules)
+
+    with open(planning_data["reaction_rules"], "rb") as f:
+        extracted_rules = pickle.load(f)
+    assert compiled_rules.ids == list(range(len(extracted_rules)))
+    assert compiled_rules.popularity == [len(ids) for _, ids in extracted_rules]
+
+    # the reactors are built on request and give the same products
+    assert all(reactor is None for reactor in compiled_rules._reactors)
+    num_products = 0
+    for rule_id, reaction_rule in enumerate(reaction_rules):
+        for smi in MOLECULES:
+            expected = products_smiles(reaction_rule, smi)
+            assert products_smiles(compiled_rules[rule_id], smi) == expected
+            num_products += len(expected)
+    assert num_products > 0
+    assert compiled_rules[0] is compiled_rules[0]
+
+    # the built reactors are not sent to the workers
+    unpickled_rules = pickle.loads(pickle.dumps(compiled_rules))
+    assert all(reactor is None for reactor in unpickled_rules._reactors)
+    assert len(unpickled_rules) == len(compiled_rules)
+
+
+def test_compiled_rules_not_compiled_again(compiled_rules_path, tmp_path):
+    with pytest.raises(ValueError):
+        compile_reaction_rules(compiled_rules_path, str(tmp_path / "again.pickle"))
+    with pytest.raises(ValueError):
+        compile_reaction_rules(compiled_rules_path, compiled_rules_path)
+
+
+def test_prefilter_never_skips_matching_rule(compiled_rules_path):
+    compiled_rules = load_reaction_rules(compiled_rules_path)
+
+    num_skipped = 0
+    for smi in MOLECULES:
+        features = molecule_features(molecule(smi))
+        for rule_id, requirements in enumerate(compiled_rules.requirements):
+            if not satisfies_requirements(features, requirements):
+                num_skipped += 1
+                assert not any(products_smiles(compiled_rules[rule_id], smi))
+    assert num_skipped > 0
+
+
+def test_prefiltered_search_matches_search(planning_data, compiled_rules_path):
+    policy_function = PolicyNetworkFunction(
+        PolicyNetworkConfig(weights_path=planning_data["policy"])
+    )
+    building_blocks = load_building_blocks(planning_data["building_blocks"])
+    config = TreeConfig(
+        max_iterations=20, max_depth=4, evaluation_type="rollout", silent=True
+    )
+
+    num_skipped = 0
+    for smi in MOLECULES:
+        trees = []
+        for rules_path in (planning_data["reaction_rules"], compiled_rules_path):
+            tree = Tree(
+                smi,
+                config,
+                load_reaction_rules(rules_path),
+                building_blocks,
+                policy_function,
+            )
+            list(tree)
+            trees.append(tree)
+
+        tree, prefiltered_tree = trees
+        assert tree.rules_requirements is None
+        assert extract_routes(prefiltered_tree) == extract_routes(tree)
+        assert len(prefiltered_tree) == len(tree)
+        num_skipped += prefiltered_tree.prefilter_skips
+    assert num_skipped > 0
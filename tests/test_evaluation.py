@@ -0,0 +1,123 @@
+"""Tests of the value functions of the node evaluation."""
+
+import pytest
+import torch
+from CGRtools import smiles
+from pytorch_lightning import Trainer
+
+from SynTool.chem.retron import Retron, compose_retrons
+from SynTool.mcts.evaluation import (PolicyValueNetworkFunction,
+                                     ValueNetworkFunction)
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.tree import Tree
+from SynTool.ml.featurization import mol_to_pyg
+from SynTool.ml.networks.exported import export_network
+from SynTool.ml.networks.policy_value import PolicyValueNetwork
+from SynTool.ml.networks.value import ValueNetwork
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+
+# the charges and the explicit hydrogens of the retrons after the first one
+# are dropped in the composed molecule, so the order of the retrons matters
+NODES = [
+    ("c1ccc2[nH]ccc2c1",),
+    ("c1ccc2[nH]ccc2c1", "CCCCCCCC(=O)[O-]"),
+    ("CCCCCCCC(=O)[O-]", "c1ccc2[nH]ccc2c1"),
+    ("C[N+](C)(C)CCCCCC", "CCCCCCCC(=O)[O-]", "O"),
+    ("CC(=O)Nc1ccccc1", "C[N+](C)(C)CCCCCC"),
+    ("O", "N"),
+    ("Cl",),
+]
+
+
+def nodes_retrons():
+    return [tuple(Retron(smiles(smi)) for smi in node) for node in NODES]
+
+
+def composed_values(network, retrons_list):
+    values = []
+    for retrons in retrons_list:
+        graph = mol_to_pyg(compose_retrons(retrons=list(retrons), exclude_small=True))
+        if graph is None:
+            values.append(-1e6)
+        else:
+            with torch.no_grad():
+                values.append(network(graph)[0, 0].item())
+    return values
+
+
+def test_value_function_matches_composed_molecule(tmp_path):
+    torch.manual_seed(0)
+    network = ValueNetwork(vector_dim=16, batch_size=4, num_conv_layers=4).eval()
+    value_function = ValueNetworkFunction(
+        export_network(network, str(tmp_path / "value.pt"))
+    )
+    retrons_list = nodes_retrons()
+
+    expected = composed_values(network, retrons_list)
+    # the second call takes the graphs of the retrons from the cache
+    for _ in range(2):
+        values = value_function.predict_values(retrons_list)
+        assert values == pytest.approx(expected, rel=1e-4)
+
+
+def test_policy_value_function_matches_composed_molecule(tmp_path):
+    torch.manual_seed(0)
+    network = PolicyValueNetwork(
+        n_rules=10, vector_dim=16, batch_size=4, num_conv_layers=4
+    ).eval()
+    checkpoint_path = str(tmp_path / "policy_value.ckpt")
+    trainer = Trainer(logger=False, enable_checkpointing=False)
+    trainer.strategy.connect(network)
+    trainer.save_checkpoint(checkpoint_path)
+
+    policy_value_function = PolicyValueNetworkFunction(
+        PolicyNetworkConfig(weights_path=checkpoint_path, value_head=True)
+    )
+    retrons_list = nodes_retrons()
+
+    expected = composed_values(lambda graph: network(graph)[2], retrons_list)
+    values = policy_value_function.predict_values(retrons_list)
+    assert values == pytest.approx(expected, rel=1e-4)
+
+
+def test_children_evaluated_in_one_batch(planning_data, tmp_path):
+    torch.manual_seed(0)
+    network = ValueNetwork(vector_dim=16, batch_size=4, num_conv_layers=4).eval()
+    value_function = ValueNetworkFunction(
+        export_network(network, str(tmp_path / "value.pt"))
+    )
+    batches = []
+    predict_values = value_function.predict_values
+    value_function.predict_values = lambda retrons_list: (
+        batches.append(len(retrons_list)) or predict_values(retrons_list)
+    )
+
+    config = TreeConfig(
+        max_iterations=10,
+        max_depth=4,
+        search_strategy="evaluation_first",
+        evaluation_type="gcn",
+        silent=True,
+    )
+    tree = Tree(
+        "CC(=O)Nc1ccc(C(=O)OC)cc1NC(C)=O",
+        config,
+        load_reaction_rules(planning_data["reaction_rules"]),
+        load_building_blocks(planning_data["building_blocks"]),
+        PolicyNetworkFunction(
+            PolicyNetworkConfig(weights_path=planning_data["policy"])
+        ),
+        value_function,
+    )
+    list(tree)
+
+    # one value network call for all the children of each expanded node
+    storage = tree.storage
+    assert len(batches) == len(tree.expanded_nodes) and max(batches) > 1
+    assert sum(batches) == storage.size - 2  # without the root and the dummy node
+    for node_id in range(2, storage.size):
+        assert storage.init_values[node_id] == pytest.approx(
+            composed_values(network, [storage.nodes[node_id].new_retrons])[0],
+            rel=1e-4,
+        )
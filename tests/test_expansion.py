@@ -0,0 +1,123 @@
+"""Tests of the policy function of the node expansion."""
+
+import pytest
+import torch
+from pytorch_lightning import Trainer
+
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.ml.networks.exported import export_network
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.rule_index import RuleIndex
+from SynTool.utils.config import PolicyNetworkConfig
+
+
+@pytest.fixture(scope="module")
+def weights_paths(tmp_path_factory):
+    """The paths to the checkpoints and the exported networks of the small
+    policy networks of both types."""
+
+    tmp_path = tmp_path_factory.mktemp("policy")
+    paths = {}
+    for policy_type in ("ranking", "filtering"):
+        torch.manual_seed(0)
+        network = PolicyNetwork(
+            n_rules=64,
+            vector_dim=16,
+            batch_size=4,
+            num_conv_layers=4,
+            policy_type=policy_type,
+        ).eval()
+
+        checkpoint_path = str(tmp_path / f"{policy_type}.ckpt")
+        trainer = Trainer(logger=False, enable_checkpointing=False)
+        trainer.strategy.connect(network)
+        trainer.save_checkpoint(checkpoint_path)
+        paths[policy_type, False] = checkpoint_path
+
+        exported_path = str(tmp_path / f"{policy_type}.pt")
+        paths[policy_type, True] = export_network(network, exported_path)
+
+    return paths
+
+
+@pytest.fixture
+def policy_function(weights_paths):
+    def create(policy_type="filtering", exported=False, **config):
+        return PolicyNetworkFunction(
+            PolicyNetworkConfig(
+                weights_path=weights_paths[policy_type, exported], **config
+            )
+        )
+
+    return create
+
+
+def test_cache_ignored_with_other_settings(tmp_path, policy_function):
+    cache_path = str(tmp_path / "cache.pickle")
+    saved = policy_function()
+    saved.cache["CCO"] = [(1.0, 0)]
+    saved.save_cache(cache_path)
+
+    loaded = policy_function()
+    loaded.load_cache(cache_path)
+    assert loaded.cache == saved.cache
+
+    for config in ({"quantize": True}, {"mips_clusters": 16}, {"top_rules": 10}):
+        loaded = policy_function(**config)
+        loaded.load_cache(cache_path)
+        assert not loaded.cache
+
+    loaded = policy_function(exported=True)
+    loaded.load_cache(cache_path)
+    assert not loaded.cache
+
+
+def test_filtering_top_rules_match_full_blend(policy_function):
+    generator = torch.Generator().manual_seed(0)
+    y = 3 * torch.randn(1000, generator=generator)
+    priority = 3 * torch.randn(1000, generator=generator)
+
+    for priority_rules_fraction in (0.0, 0.3, 1.0):
+        function = policy_function(
+            top_rules=20, priority_rules_fraction=priority_rules_fraction
+        )
+
+        probs = function._blend(y, priority, probabilities=False)
+        expected_probs, expected_ids = torch.topk(probs, 20)
+        ranked_rules = function._rank_rules(y, priority)
+
+        assert [rule_id for _, rule_id in ranked_rules] == expected_ids.tolist()
+        assert torch.allclose(
+            torch.tensor([prob for prob, _ in ranked_rules], dtype=torch.double),
+            torch.softmax(expected_probs, -1),
+        )
+
+
+def test_rule_index_probabilities_normalized_over_all_rules(policy_function):
+    generator = torch.Generator().manual_seed(0)
+    weight = torch.randn(2000, 16, generator=generator)
+    bias = torch.randn(2000, generator=generator)
+    index = RuleIndex(weight, bias, num_clusters=40, num_probes=4)
+
+    function = policy_function(policy_type="ranking", top_rules=10)
+
+    x = torch.randn(16, generator=generator)
+    rule_ids, rest_logsumexp = index.candidates(x, 10)
+    logits = weight @ x + bias
+    rest = torch.ones(len(logits), dtype=torch.bool)
+    rest[rule_ids] = False
+    assert rest_logsumexp <= torch.logsumexp(logits[rest], -1) + 1e-4
+
+    # the estimated log-sum-exp is a lower bound, so the probabilities are not
+    # lower than the exact ones and not higher than the candidates-only ones
+    candidate_logits = index.logits(x, rule_ids)
+    ranked_rules = function._rank_rules(
+        candidate_logits, rule_ids=rule_ids, rest_logsumexp=rest_logsumexp
+    )
+    exact_probs = torch.softmax(logits.double(), -1)
+    candidate_probs = {
+        rule_id: prob
+        for prob, rule_id in function._rank_rules(candidate_logits, rule_ids=rule_ids)
+    }
+    for prob, rule_id in ranked_rules:
+        assert exact_probs[rule_id] - 1e-6 <= prob < candidate_probs[rule_id]
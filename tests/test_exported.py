@@ -0,0 +1,71 @@
+"""Tests of the policy and value networks exported to TorchScript."""
+
+import pytest
+import torch
+from CGRtools import smiles
+
+from SynTool.ml.featurization import mols_to_batch_arrays, mols_to_pyg_batch
+from SynTool.ml.networks.exported import export_network, load_exported_network
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.networks.value import ValueNetwork
+
+MOLECULES = ["CC(=O)Nc1ccccc1", "COC(=O)c1ccc(Cl)cc1", "C1CCOC1", "CC(C)(C)OC(=O)N"]
+
+
+def exported_outputs(network_path, molecules):
+    exported, meta = load_exported_network(network_path)
+    arrays, _ = mols_to_batch_arrays(molecules)
+    x, edge_index, batch, _ = arrays
+    with torch.no_grad():
+        outputs = exported(
+            torch.from_numpy(x),
+            torch.from_numpy(edge_index),
+            torch.from_numpy(batch),
+            len(molecules),
+        )
+    return outputs, meta
+
+
+@pytest.mark.parametrize("gcn_concat", [False, True])
+@pytest.mark.parametrize("policy_type", ["ranking", "filtering"])
+def test_exported_policy_matches_network(tmp_path, policy_type, gcn_concat):
+    torch.manual_seed(0)
+    network = PolicyNetwork(
+        n_rules=20,
+        vector_dim=16,
+        batch_size=4,
+        num_conv_layers=4,
+        policy_type=policy_type,
+        gcn_concat=gcn_concat,
+    ).eval()
+    molecules = [smiles(smi) for smi in MOLECULES]
+
+    pyg_batch, _ = mols_to_pyg_batch(molecules)
+    with torch.no_grad():
+        expected = network(pyg_batch)
+    if policy_type == "ranking":
+        expected = (expected,)
+
+    network_path = export_network(network, str(tmp_path / "policy.pt"))
+    outputs, meta = exported_outputs(network_path, molecules)
+
+    assert meta["policy_type"] == policy_type
+    assert len(outputs) == len(expected)
+    for output, expected_output in zip(outputs, expected):
+        assert torch.allclose(output, expected_output, atol=1e-5)
+
+
+def test_exported_value_matches_network(tmp_path):
+    torch.manual_seed(0)
+    network = ValueNetwork(vector_dim=16, batch_size=4, num_conv_layers=4).eval()
+    molecules = [smiles(smi) for smi in MOLECULES]
+
+    pyg_batch, _ = mols_to_pyg_batch(molecules)
+    with torch.no_grad():
+        expected = network(pyg_batch)
+
+    network_path = export_network(network, str(tmp_path / "value.pt"))
+    outputs, meta = exported_outputs(network_path, molecules)
+
+    assert meta["network_type"] == "value"
+    assert torch.allclose(outputs[0], expected, atol=1e-5)
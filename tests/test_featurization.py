@@ -0,0 +1,77 @@
+"""Tests of the vectorized featurization of the molecules."""
+
+import torch
+from CGRtools import smiles
+from torch_geometric.data import Batch, Data
+from torch_geometric.transforms import ToUndirected
+
+from SynTool.ml.featurization import (MENDEL_INFO, mol_to_pyg,
+                                      mols_to_pyg_batch, prepare_molecule)
+
+MOLECULES = [
+    "CC(=O)Nc1ccccc1",
+    "COC(=O)c1ccc(Cl)cc1",
+    "C1CCOC1",
+    "CC(C)(C)OC(=O)N",
+    "c1ccc2[nH]ccc2c1",
+    "C[N+](C)(C)CCC(=O)[O-]",
+    "C#CCBr",
+    "O=S(=O)(N)c1ccc(I)cc1",
+    "FC(F)(F)c1ncccc1P(=O)(O)O",
+    "[Na+].[O-]C(=O)C",
+]
+
+
+def reference_graph(molecule):
+    """Converts the molecule to the graph atom by atom and bond by bond."""
+
+    tmp_molecule = prepare_molecule(molecule)
+    tmp_molecule.remap({n: i for i, (n, _) in enumerate(tmp_molecule.atoms(), 1)})
+
+    x = torch.zeros((len(tmp_molecule), 11), dtype=torch.uint8)
+    for n, atom in tmp_molecule.atoms():
+        period, group, shell, electrons = MENDEL_INFO[atom.atomic_symbol]
+        x[n - 1, :8] = torch.tensor(
+            [
+                atom.atomic_number,
+                period,
+                group,
+                electrons + atom.charge,
+                shell,
+                atom.total_hydrogens,
+                int(atom.in_ring),
+                atom.neighbors,
+            ]
+        )
+        for order in tmp_molecule._bonds[n].values():
+            x[n - 1, 7 + int(order)] += 1
+
+    edge_index = torch.tensor(
+        [[atom - 1, neighbor - 1] for atom, neighbor, _ in tmp_molecule.bonds()],
+        dtype=torch.long,
+    )
+    return ToUndirected()(Data(x=x, edge_index=edge_index.t().contiguous()))
+
+
+def sorted_edges(edge_index):
+    return sorted(map(tuple, edge_index.t().tolist()))
+
+
+def test_graphs_match_reference():
+    for smi in MOLECULES:
+        molecule = smiles(smi)
+        graph, expected = mol_to_pyg(molecule), reference_graph(molecule)
+
+        assert torch.equal(graph.x, expected.x)
+        assert sorted_edges(graph.edge_index) == sorted_edges(expected.edge_index)
+
+
+def test_batch_matches_graphs():
+    molecules = [smiles(smi) for smi in MOLECULES + ["C", "c1cccc1"]]
+    batch, molecules_ids = mols_to_pyg_batch(molecules)
+
+    graphs = [mol_to_pyg(molecule) for molecule in molecules]
+    assert molecules_ids == [i for i, graph in enumerate(graphs) if graph is not None]
+    expected = Batch.from_data_list([graphs[i] for i in molecules_ids])
+    for key in ("x", "edge_index", "batch", "ptr"):
+        assert torch.equal(batch[key], expected[key])
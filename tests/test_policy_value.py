@@ -0,0 +1,116 @@
+"""Tests of the combined policy and value network."""
+
+import pytest
+import torch
+from CGRtools import smiles
+from torch_geometric.data import Batch
+
+from SynTool.ml.featurization import mol_to_pyg
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.ml.networks.policy_value import PolicyValueNetwork
+from SynTool.ml.networks.value import ValueNetwork
+
+MOLECULES = ["CC(=O)Nc1ccccc1", "COC(=O)c1ccccc1", "CCC(=O)NCc1ccccc1", "CCCCCCO"]
+N_RULES = 5
+
+
+def labeled_batch(policy_type, rules=True, values=True):
+    """The batch of the molecular graphs with the reaction rules labels (the
+    policy network dataset) and the synthesisability labels (the value network
+    dataset)."""
+
+    graphs = []
+    for i, smi in enumerate(MOLECULES):
+        graph = mol_to_pyg(smiles(smi))
+        if rules and policy_type == "ranking":
+            graph.y_rules = torch.tensor([i % N_RULES])
+        elif rules:
+            graph.y_rules = torch.tensor([[(i + j) % 2 for j in range(N_RULES)]])
+            graph.y_priority = torch.tensor(
+                [[(i + j) % 3 == 0 for j in range(N_RULES)]]
+            )
+        if values:
+            graph.y = torch.tensor([i % 2])
+        graphs.append(graph)
+    return Batch.from_data_list(graphs)
+
+
+def create_networks(policy_type):
+    """The policy and value network and the separate policy and value networks
+    with the same weights."""
+
+    torch.manual_seed(0)
+    kwargs = {"vector_dim": 16, "batch_size": len(MOLECULES), "num_conv_layers": 4}
+    network = PolicyValueNetwork(n_rules=N_RULES, policy_type=policy_type, **kwargs)
+    policy_network = PolicyNetwork(n_rules=N_RULES, policy_type=policy_type, **kwargs)
+    value_network = ValueNetwork(**kwargs)
+
+    state_dict = network.state_dict()
+    policy_network.load_state_dict(
+        {k: v for k, v in state_dict.items() if not k.startswith("value_predictor.")}
+    )
+    value_network.load_state_dict(
+        {
+            k.replace("value_predictor.", "predictor."): v
+            for k, v in state_dict.items()
+            if k.startswith(("embedder.", "value_predictor."))
+        }
+    )
+    return network.eval(), policy_network.eval(), value_network.eval()
+
+
+@pytest.mark.parametrize("policy_type", ["ranking", "filtering"])
+def test_loss_matches_policy_and_value_networks(policy_type):
+    network, policy_network, value_network = create_networks(policy_type)
+
+    with torch.no_grad():
+        policy_batch = labeled_batch(policy_type, values=False)
+        metrics = network._get_loss(policy_batch)
+        policy_metrics = policy_network._get_loss(policy_batch)
+        assert set(metrics) == {"loss", "balanced_accuracy_y"}
+        assert metrics["loss"].item() == pytest.approx(policy_metrics["loss"].item())
+        assert metrics["balanced_accuracy_y"].item() == pytest.approx(
+            policy_metrics["balanced_accuracy_y"].item()
+        )
+
+        value_batch = labeled_batch(policy_type, rules=False)
+        metrics = network._get_loss(value_batch)
+        value_metrics = value_network._get_loss(value_batch)
+        assert set(metrics) == {"loss", "balanced_accuracy"}
+        assert metrics["loss"].item() == pytest.approx(value_metrics["loss"].item())
+        assert metrics["balanced_accuracy"].item() == pytest.approx(
+            value_metrics["balanced_accuracy"].item()
+        )
+
+        # the batch with both labels is trained on the sum of the losses
+        metrics = network._get_loss(labeled_batch(policy_type))
+        assert set(metrics) == {"loss", "balanced_accuracy_y", "balanced_accuracy"}
+        assert metrics["loss"].item() == pytest.approx(
+            policy_metrics["loss"].item() + value_metrics["loss"].item()
+        )
+
+
+@pytest.mark.parametrize("policy_type", ["ranking", "filtering"])
+def test_freeze_policy_trains_only_value_head(policy_type):
+    network, _, _ = create_networks(policy_type)
+    batch = labeled_batch(policy_type)
+    with torch.no_grad():
+        probs, priority, value = network(batch)
+
+    network.freeze_policy()
+    trained = {n for n, p in network.named_parameters() if p.requires_grad}
+    assert trained == {"value_predictor.weight", "value_predictor.bias"}
+
+    # all the parameters are given to the optimizer, as in the training
+    optimizer = torch.optim.AdamW(network.parameters(), lr=0.01, weight_decay=0.01)
+    for _ in range(3):
+        optimizer.zero_grad()
+        network._get_loss(batch)["loss"].backward()
+        optimizer.step()
+
+    with torch.no_grad():
+        new_probs, new_priority, new_value = network(batch)
+    assert torch.equal(new_probs, probs)
+    if policy_type == "filtering":
+        assert torch.equal(new_priority, priority)
+    assert not torch.allclose(new_value, value)
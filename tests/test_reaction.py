@@ -0,0 +1,98 @@
+"""Tests of the reaction rules application and its cache."""
+
+from pathlib import Path
+
+import pytest
+from CGRtools import smiles
+from CGRtools.reactor import Reactor
+
+from SynTool.chem.reaction import ReactionRuleCache, apply_reaction_rule
+from SynTool.chem.reaction_rules.extraction import extract_rules
+from SynTool.chem.retron import Retron, RetronTable
+from SynTool.utils.config import RuleExtractionConfig
+
+CONFIG_PATH = Path(__file__).parents[1] / "configs" / "extraction.yaml"
+
+MOLECULES = [
+    "CC(=O)Nc1ccccc1",
+    "CC(=O)Nc1ccc(NC(C)=O)cc1",
+    "CC(=O)Nc1ccc(NC(C)=O)cc1NC(C)=O",
+    "CCCCCCCO",
+]
+
+
+@pytest.fixture(scope="module")
+def reaction_rule():
+    reaction = smiles(
+        "[CH3:1][C:2](=[O:3])[OH:4].[NH2:5][c:6]1[cH:7][cH:8][cH:9][cH:10][cH:11]1"
+        ">>[CH3:1][C:2](=[O:3])[NH:5][c:6]1[cH:7][cH:8][cH:9][cH:10][cH:11]1"
+    )
+    config = RuleExtractionConfig.from_yaml(str(CONFIG_PATH))
+    (rule,) = extract_rules(config, reaction)
+    return Reactor(rule)
+
+
+def molecule(smi):
+    mol = smiles(smi)
+    mol.canonicalize()
+    return mol
+
+
+def products_smiles(all_products):
+    return [
+        [str(mol) for mol in products] if products is not None else None
+        for products in all_products
+    ]
+
+
+def test_cache_matches_apply_reaction_rule(reaction_rule):
+    cache = ReactionRuleCache()
+    for smi in MOLECULES:
+        expected = products_smiles(apply_reaction_rule(molecule(smi), reaction_rule))
+        for _ in range(2):  # the miss and the hit
+            all_products = cache.apply(molecule(smi), reaction_rule, 0)
+            assert products_smiles(all_products) == expected
+
+    assert cache.misses == len(MOLECULES)
+    assert cache.hits == len(MOLECULES)
+
+
+def test_cache_continues_partial_application(reaction_rule):
+    cache = ReactionRuleCache()
+    mol = molecule(MOLECULES[2])
+    expected = products_smiles(apply_reaction_rule(mol, reaction_rule))
+    assert len(expected) > 2
+
+    # only the first products are obtained, the application is not finished
+    first_products = next(iter(cache.apply(mol, reaction_rule, 0)))
+    cached_products, application = cache._cache[str(mol), 0]
+    assert len(cached_products) == 1 and application is not None
+
+    # the next iterators share the cached products and continue the application
+    first = cache.apply(mol, reaction_rule, 0)
+    second = cache.apply(mol, reaction_rule, 0)
+    assert next(iter(first)) is first_products
+    assert products_smiles(second) == expected
+    assert products_smiles(first) == expected[1:]
+    assert cache.misses == 1 and cache.hits == 2
+
+
+def test_cached_products_are_not_modified(reaction_rule):
+    cache = ReactionRuleCache()
+    mol = molecule(MOLECULES[1])
+    all_products = list(cache.apply(mol, reaction_rule, 0))
+    expected = products_smiles(all_products)
+
+    table = RetronTable()
+    for products in all_products:
+        for product in products:
+            Retron(product)
+            Retron(product, table=table)
+
+    again = list(cache.apply(mol, reaction_rule, 0))
+    assert products_smiles(again) == expected
+    assert all(
+        product is cached
+        for products, cached_products in zip(again, all_products)
+        for product, cached in zip(products, cached_products)
+    )
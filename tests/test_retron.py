@@ -0,0 +1,125 @@
+"""Tests of the retrons and their intern table."""
+
+from CGRtools import smiles
+
+from SynTool.chem.retron import Retron, RetronChain, RetronTable
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.tree import Tree
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+
+# the same molecules written with the different atom orders
+MOLECULES = [
+    ("CC(=O)Nc1ccccc1", "c1ccc(NC(C)=O)cc1"),
+    ("COC(=O)c1ccc(Cl)cc1", "Clc1ccc(cc1)C(=O)OC"),
+    ("C[N+](C)(C)CCC(=O)[O-]", "[O-]C(=O)CC[N+](C)(C)C"),
+    ("OCC1CCCCC1", "C1CCC(CO)CC1"),
+]
+
+
+def canonical_smiles(smi):
+    molecule = smiles(smi)
+    molecule.canonicalize()
+    return str(molecule)
+
+
+def test_retron_matches_canonical_molecule():
+    for smi, other_smi in MOLECULES:
+        expected = canonical_smiles(smi)
+        molecule = smiles(other_smi)
+        retron, other = Retron(smiles(smi)), Retron(molecule)
+
+        assert str(retron) == repr(retron) == str(retron.molecule) == expected
+        assert retron == other and hash(retron) == hash(other) == hash(expected)
+        assert len(retron) == len(molecule)
+
+        # the canonical molecule is not canonicalized again
+        assert str(Retron(retron.molecule, canonicalize=False)) == expected
+
+    retrons = {Retron(smiles(smi)) for pair in MOLECULES for smi in pair}
+    assert len(retrons) == len(MOLECULES)
+    assert Retron(smiles("CCO")) != "CCO"
+
+
+def test_table_shares_canonical_molecules():
+    table = RetronTable()
+    for smi, other_smi in MOLECULES:
+        retron = Retron(smiles(smi), table=table)
+        assert retron == Retron(smiles(smi))
+
+        # the identical and already canonical molecules are looked up
+        for molecule in (smiles(smi), smiles(other_smi), retron.molecule):
+            shared = Retron(molecule, table=table)
+            assert shared == retron and shared.molecule is retron.molecule
+
+    assert table.misses == len(MOLECULES)
+    assert table.hits == 3 * len(MOLECULES)
+
+
+def test_table_removes_least_recently_used():
+    table = RetronTable(max_size=2)
+    first = Retron(smiles("CCO"), table=table)
+    Retron(smiles("CCN"), table=table)
+    Retron(smiles("CCO"), table=table)
+    Retron(smiles("CCS"), table=table)
+    assert len(table) == 2
+
+    assert Retron(smiles("CCO"), table=table).molecule is first.molecule
+    assert table.misses == 3 and table.hits == 2
+
+
+def test_chain_matches_list():
+    # more retrons than the bits of the mask, so the mask matches the others too
+    retrons = [Retron(smiles("C" * n + "O"), False) for n in range(1, 101)]
+    others = [Retron(smiles("C" * n + "N"), False) for n in range(1, 101)]
+
+    chain = None
+    for i, retron in enumerate(retrons):
+        chain = RetronChain(retron, chain)
+        expected = retrons[i::-1]
+        assert len(chain) == len(expected) and list(chain) == expected
+        if i % 16:
+            continue
+
+        for other in retrons + others:
+            assert (other in chain) == (other in expected)
+            assert chain.isdisjoint([other]) == (other not in expected)
+        # the equal retron is found, not only the same object
+        assert Retron(smiles(str(retron)), False) in chain
+    assert any(chain.mask >> (hash(other) & 63) & 1 for other in others)
+
+
+def test_sibling_chains_share_parent():
+    parent = RetronChain(Retron(smiles("CC(=O)Nc1ccccc1")))
+    first = RetronChain(Retron(smiles("CC(=O)O")), parent)
+    second = RetronChain(Retron(smiles("Nc1ccccc1")), parent)
+
+    assert first.parent is second.parent is parent
+    assert len(parent) == 1 and len(first) == len(second) == 2
+    assert first.retron not in second and second.retron not in first
+    assert parent.retron in first and parent.retron in second
+
+
+def test_tree_chains_follow_parents(planning_data):
+    config = TreeConfig(
+        max_iterations=30, max_depth=4, evaluation_type="rollout", silent=True
+    )
+    tree = Tree(
+        "CC(=O)Nc1ccc(C(=O)OC)cc1NC(C)=O",
+        config,
+        load_reaction_rules(planning_data["reaction_rules"]),
+        load_building_blocks(planning_data["building_blocks"]),
+        PolicyNetworkFunction(
+            PolicyNetworkConfig(weights_path=planning_data["policy"])
+        ),
+    )
+    list(tree)
+    assert len(tree) > 2
+
+    root_chain = tree.nodes[1].curr_retron.prev_retrons
+    assert list(root_chain) == [tree.nodes[1].curr_retron]
+    for node_id in range(2, len(tree) + 1):
+        parent_chain = tree.nodes[tree.parents[node_id]].curr_retron.prev_retrons
+        for retron in tree.nodes[node_id].new_retrons:
+            assert retron.prev_retrons.retron is retron
+            assert retron.prev_retrons.parent is parent_chain
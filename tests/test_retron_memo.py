@@ -0,0 +1,114 @@
+"""Tests of the persistent retron memo and its use in the tree search."""
+
+import torch
+from CGRtools import smiles
+
+from SynTool.chem.retron import Retron
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.node import Node
+from SynTool.mcts.search import load_retron_memo
+from SynTool.mcts.tree import Tree
+from SynTool.ml.networks.exported import export_network
+from SynTool.ml.networks.policy import PolicyNetwork
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.retron_memo import RetronMemo
+
+
+def test_popularity_rollout_does_not_mark_dead(tmp_path):
+    memo = RetronMemo(str(tmp_path / "memo.sqlite"))
+    config = TreeConfig(
+        evaluation_type="rollout", rollout_policy="popularity", silent=True
+    )
+    tree = iter(Tree("C" * 8, config, [], set(), None, retron_memo=memo))
+
+    retron = Retron(smiles("CCCCCCCCO"))
+    assert tree._rollout_node(retron, current_depth=1) == -1.0
+    assert not memo.is_dead(str(retron), 0)
+
+
+def test_records_removed_with_other_settings(tmp_path):
+    memo_path = str(tmp_path / "memo.sqlite")
+    memo = RetronMemo(memo_path, settings={"top_rules": 50})
+    memo.mark_dead("CCO", 3)
+    memo.close()
+
+    memo = RetronMemo(memo_path, settings={"top_rules": 50})
+    assert memo.is_dead("CCO", 3)
+    memo.close()
+
+    memo = RetronMemo(memo_path, settings={"top_rules": 20})
+    assert not memo.is_dead("CCO", 3)
+    assert len(memo) == 0
+
+
+def test_dead_nodes_marked_at_remaining_depth(tmp_path):
+    memo = RetronMemo(str(tmp_path / "memo.sqlite"))
+    config = TreeConfig(evaluation_type="rollout", max_depth=3, silent=True)
+    tree = Tree("CCCCCCCCCC", config, [], set(), None, retron_memo=memo)
+    storage = tree.storage
+
+    a, b = Retron(smiles("CCCCCCCCO")), Retron(smiles("CCCCCCCCN"))
+    first = storage.add_node(Node((a,), (a,)), parent_id=1, depth=1)
+    second = storage.add_node(Node((b,), (b,)), parent_id=1, depth=1)
+    leaf = storage.add_node(Node((b,), (b,)), parent_id=first, depth=2)
+
+    # the leaf is not solved within the remaining depth, the second node is open
+    tree.complete_nodes.update((1, first))
+    tree.dead_nodes.add(leaf)
+    tree._update_dead_nodes(first)
+    target = str(storage.nodes[1].curr_retron)
+    assert memo.is_dead(str(a), 2) and not memo.is_dead(str(a), 3)
+    assert not memo.is_dead(target, 3)
+
+    # the second node has no children after the complete expansion
+    tree.complete_nodes.add(second)
+    tree._update_dead_nodes(second)
+    assert memo.is_dead(str(b), 2)
+    assert memo.is_dead(target, 3)
+
+
+def test_records_removed_with_other_rule_prob_threshold(tmp_path):
+    torch.manual_seed(0)
+    network = PolicyNetwork(n_rules=10, vector_dim=16, batch_size=4, num_conv_layers=4)
+    weights_path = export_network(network.eval(), str(tmp_path / "policy.pt"))
+    rules_path, bb_path = tmp_path / "rules.pickle", tmp_path / "bb.smi"
+    rules_path.write_bytes(b"")
+    bb_path.write_text("CCO\n")
+
+    def open_memo(rule_prob_threshold):
+        policy_function = PolicyNetworkFunction(
+            PolicyNetworkConfig(
+                weights_path=weights_path, rule_prob_threshold=rule_prob_threshold
+            )
+        )
+        return load_retron_memo(
+            str(tmp_path / "memo.sqlite"),
+            TreeConfig(silent=True),
+            policy_function,
+            str(rules_path),
+            str(bb_path),
+        )
+
+    memo = open_memo(0.0)
+    memo.mark_dead("CCCCCCCCO", 3)
+    memo.close()
+
+    memo = open_memo(0.0)
+    assert memo.is_dead("CCCCCCCCO", 3)
+    memo.close()
+
+    # fewer reaction rules are applied with the higher threshold
+    memo = open_memo(0.5)
+    assert not memo.is_dead("CCCCCCCCO", 3)
+    assert len(memo) == 0
+
+
+def test_unexpandable_retron_marked_at_remaining_depth(tmp_path):
+    memo = RetronMemo(str(tmp_path / "memo.sqlite"))
+    config = TreeConfig(evaluation_type="rollout", max_depth=3, silent=True)
+    tree = Tree("CCCCCCCCCC", config, [], set(), None, retron_memo=memo)
+
+    retron = Retron(smiles("CCCCCCCCO"))
+    node_id = tree.storage.add_node(Node((retron,), (retron,)), parent_id=1, depth=1)
+    tree._expand_node(node_id, predicted_rules=[])
+    assert memo.is_dead(str(retron), 2) and not memo.is_dead(str(retron), 3)
@@ -0,0 +1,65 @@
+"""Tests of the planning of the target molecules with run_search."""
+
+import csv
+import json
+
+from SynTool.mcts.search import run_search
+from SynTool.utils.config import PolicyNetworkConfig
+
+SEARCH_CONFIG = {"max_iterations": 20, "max_depth": 4, "evaluation_type": "rollout"}
+
+
+def search_results(results_root):
+    with open(results_root / "extracted_routes.jsonl", encoding="utf-8") as f:
+        routes = [json.loads(line) for line in f]
+    with open(results_root / "tree_search_stats.csv", encoding="utf-8") as f:
+        stats = [
+            {key: value for key, value in row.items() if key != "search_time"}
+            for row in csv.DictReader(f)
+        ]
+    return routes, stats
+
+
+def plan(planning_data, results_root, **kwargs):
+    run_search(
+        planning_data["targets"],
+        SEARCH_CONFIG,
+        PolicyNetworkConfig(weights_path=planning_data["policy"]),
+        planning_data["reaction_rules"],
+        planning_data["building_blocks"],
+        results_root=str(results_root),
+        **kwargs,
+    )
+    return search_results(results_root)
+
+
+def test_workers_match_sequential_search(planning_data, tmp_path):
+    routes, stats = plan(planning_data, tmp_path / "sequential")
+    assert [record["target_id"] for record in routes] == list(range(6))
+    assert any(record["solved"] for record in routes)
+
+    assert plan(planning_data, tmp_path / "parallel", num_cpus=2) == (routes, stats)
+
+
+def test_resumed_search_matches_search(planning_data, tmp_path):
+    results_root = tmp_path / "results"
+    routes, stats = plan(planning_data, results_root)
+
+    # the search interrupted while the third target was being written
+    routes_file = results_root / "extracted_routes.jsonl"
+    lines = routes_file.read_text(encoding="utf-8").splitlines(keepends=True)
+    routes_file.write_text("".join(lines[:2]) + lines[2][:10], encoding="utf-8")
+
+    stats_file = results_root / "tree_search_stats.csv"
+    with open(stats_file, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    rows[0]["debug_info"] = "COMPLETED"  # marks the row not to be searched again
+    with open(stats_file, "w", encoding="utf-8", newline="\n") as f:
+        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+        writer.writeheader()
+        writer.writerows(rows[:4])
+
+    resumed_routes, resumed_stats = plan(planning_data, results_root, resume=True)
+    assert resumed_routes == routes
+    assert resumed_stats[0]["debug_info"] == "COMPLETED"
+    assert resumed_stats[1:] == stats[1:]
@@ -0,0 +1,78 @@
+"""Tests of the array storage of the search tree."""
+
+from random import Random
+
+import numpy as np
+
+from SynTool.mcts.storage import TreeStorage
+
+
+def test_child_list_moved_to_end():
+    storage = TreeStorage()
+    root = storage.add_node(None)
+    first, second = (storage.add_node(None, parent_id=root) for _ in range(2))
+    assert storage.children_index(root) == slice(first, second + 1)
+
+    # the child list of the root is not the last one, so it is moved
+    grandchild = storage.add_node(None, parent_id=first)
+    storage.add_parent(root, grandchild)
+    assert storage.children(root).tolist() == [first, second, grandchild]
+    assert storage.children(first).tolist() == [grandchild]
+    assert storage.child_starts[root] > storage.child_starts[first]
+    assert storage.children_index(root) == slice(first, grandchild + 1)
+
+    third = storage.add_node(None, parent_id=root)
+    assert storage.children(root).tolist() == [first, second, grandchild, third]
+    assert storage.children(first).tolist() == [grandchild]
+    assert storage.children_index(root) == slice(first, third + 1)
+
+    storage.add_node(None, parent_id=second)
+    fourth = storage.add_node(None, parent_id=root)
+    assert not storage.consecutive_children[root]
+    assert storage.children_index(root).tolist() == [
+        first,
+        second,
+        grandchild,
+        third,
+        fourth,
+    ]
+
+
+def test_random_edges_match_child_lists():
+    rng = Random(42)
+    storage = TreeStorage(capacity=4)
+    root = storage.add_node(None)
+    expected = {root: []}
+
+    for _ in range(500):
+        parent_id = rng.choice(list(expected))
+        if rng.random() < 0.8:
+            child_id = storage.add_node(None, parent_id=parent_id)
+            expected[child_id] = []
+        else:  # the link to an existing node created later than the parent
+            later = [
+                i for i in expected if i > parent_id and i not in expected[parent_id]
+            ]
+            if not later:
+                continue
+            child_id = rng.choice(later)
+            storage.add_parent(parent_id, child_id)
+        expected[parent_id].append(child_id)
+
+    for node_id, children in expected.items():
+        assert storage.children(node_id).tolist() == children
+        index = storage.children_index(node_id)
+        assert np.arange(storage.size)[index].tolist() == children
+
+
+def test_ancestors_over_all_parents():
+    storage = TreeStorage()
+    root = storage.add_node(None)
+    first, second = (storage.add_node(None, parent_id=root) for _ in range(2))
+    shared = storage.add_node(None, parent_id=first)
+    assert storage.ancestors(shared) == [shared, first, root]
+
+    storage.add_parent(second, shared)
+    assert storage.parent_ids(shared) == [first, second]
+    assert storage.parent_ids(root) == []
+    assert sorted(storage.ancestors(shared)) == [root, first, second, shared]
@@ -0,0 +1,138 @@
+"""Tests of the tree search."""
+
+import pytest
+from CGRtools import smiles
+
+from SynTool.chem.retron import Retron
+from SynTool.mcts.expansion import PolicyNetworkFunction
+from SynTool.mcts.node import Node
+from SynTool.mcts.tree import Tree
+from SynTool.utils.config import PolicyNetworkConfig, TreeConfig
+from SynTool.utils.loading import load_building_blocks, load_reaction_rules
+
+
+def retron(smiles_str):
+    return Retron(smiles(smiles_str))
+
+
+def test_transposition_key_depends_on_depth():
+    retrons = (retron("CCCCCCCCO"), retron("CCCCCCCCN"))
+
+    assert Tree._node_key(retrons, 2) == Tree._node_key(retrons[::-1], 2)
+    assert Tree._node_key(retrons, 2) != Tree._node_key(retrons, 3)
+
+
+def test_lineage_over_all_parents():
+    config = TreeConfig(evaluation_type="rollout", transpositions=True, silent=True)
+    tree = Tree("CCCCCCCCCC", config, [], set(), None)
+    storage = tree.storage
+
+    a, b, c = retron("CCCCCCCCO"), retron("CCCCCCCCN"), retron("CCCCCCCCS")
+    first = storage.add_node(Node((a,), (a,)), parent_id=1, depth=1)
+    second = storage.add_node(Node((b,), (b,)), parent_id=1, depth=1)
+    shared = storage.add_node(Node((c,), (c,)), parent_id=first, depth=2)
+    storage.add_parent(second, shared)
+
+    target = str(storage.nodes[1].curr_retron)
+    assert tree._lineage(first) == {str(a), target}
+    assert tree._lineage(shared) == {str(a), str(b), str(c), target}
+
+
+def test_integer_virtual_loss():
+    config = TreeConfig.from_dict({"search_batch_size": 4, "virtual_loss": 2})
+    assert config.virtual_loss == 2
+
+    with pytest.raises(ValueError):
+        TreeConfig(virtual_loss=-1)
+
+
+class NoRulesPolicy:
+    """The policy function predicting no reaction rules for any retron."""
+
+    def predict_reaction_rules(self, retron, reaction_rules):
+        return []
+
+    def predict_reaction_rules_batch(self, retrons, reaction_rules):
+        return [[] for _ in retrons]
+
+
+def test_batch_selection_retried_after_collisions():
+    config = TreeConfig(
+        evaluation_type="rollout",
+        search_batch_size=4,
+        max_iterations=10,
+        silent=True,
+    )
+    tree = iter(Tree("CCCCCCCCCC", config, [], set(), NoRulesPolicy()))
+    storage = tree.storage
+    storage.visits[1] = 1
+
+    a, b = retron("CCCCCCCCO"), retron("CCCCCCCCN")
+    leaves = [
+        storage.add_node(Node((x,), (x,)), parent_id=1, prob=0.5, depth=1)
+        for x in (a, b)
+    ]
+
+    # the root has two leaves only, so the other selections collide and are
+    # retried, and only the expanded leaves are counted as iterations
+    found, _ = tree._next_batch()
+    assert not found
+    assert tree.policy_batches == [2]
+    assert tree.curr_iteration == 2
+    assert all(storage.visits[leaf_id] == 1 for leaf_id in leaves)
+    assert not storage.virtual_losses[: storage.size].any()
+
+
+class ConstantValueFunction:
+    """The value function estimating all the nodes as synthesizable."""
+
+    def predict_values(self, retrons_list):
+        return [1.0] * len(retrons_list)
+
+
+@pytest.mark.parametrize("search_batch_size", [1, 3])
+def test_best_first_expands_cheapest_routes_first(planning_data, search_batch_size):
+    config = TreeConfig(
+        max_iterations=30,
+        max_depth=4,
+        search_strategy="best_first",
+        evaluation_type="gcn",
+        search_batch_size=search_batch_size,
+        silent=True,
+    )
+    tree = Tree(
+        "CC(=O)Nc1ccc(C(=O)OC)cc1NC(C)=O",
+        config,
+        load_reaction_rules(planning_data["reaction_rules"]),
+        load_building_blocks(planning_data["building_blocks"]),
+        PolicyNetworkFunction(
+            PolicyNetworkConfig(weights_path=planning_data["policy"])
+        ),
+        ConstantValueFunction(),
+    )
+
+    expanded = []
+    expand_node = tree._expand_node
+    tree._expand_node = lambda node_id, *args: (
+        expanded.append(node_id) or expand_node(node_id, *args)
+    )
+    list(tree)
+
+    # with the constant heuristic the nodes are expanded in the order of the
+    # costs of the routes to them (the sum of -log of the rules probabilities)
+    costs = [tree.route_costs[node_id] for node_id in expanded]
+    assert len(costs) > 2 and costs == sorted(costs)
+    assert tree.curr_iteration == len(expanded)
+
+
+def test_best_first_stops_when_queue_is_empty():
+    config = TreeConfig(
+        max_iterations=30,
+        search_strategy="best_first",
+        evaluation_type="rollout",
+        silent=True,
+    )
+    tree = Tree("CCCCCCCCCC", config, [], set(), NoRulesPolicy())
+
+    assert list(tree) == [(False, [1])]
+    assert tree.curr_iteration == 1